@@ -34,8 +34,9 @@ options:
     provider:
         description:
             - A dict object containing connection details.
+            - Required unless the task runs over an C(ansible_connection=httpapi)
+              persistent connection, in which case that connection is used.
         version_added: 1.0.0
-        required: true
         type: dict
         suboptions:
             ip_address:
@@ -69,6 +70,8 @@ options:
                     - The serial number of a firewall to use for targeted commands.
                       If I(ip_address) is not a Panorama PAN-OS device, then
                       this param is ignored.
+                    - Over an C(ansible_connection=httpapi) connection to
+                      Panorama, this may be given without I(ip_address).
                 type: str
 """
 
@@ -77,6 +80,8 @@ options:
     provider:
         description:
             - A dict object containing connection details.
+            - If neither this nor I(ip_address) is specified, the task must run over
+              an C(ansible_connection=httpapi) persistent connection.
         version_added: 1.0.0
         type: dict
         suboptions:
@@ -110,6 +115,8 @@ options:
                     - The serial number of a firewall to use for targeted commands.
                       If I(ip_address) is not a Panorama PAN-OS device, then
                       this param is ignored.
+                    - Over an C(ansible_connection=httpapi) connection to
+                      Panorama, this may be given without I(ip_address).
                 type: str
     ip_address:
         description:
@@ -174,6 +181,24 @@ options:
             - gathered
 """
 
+    RULE_NETWORK_RESOURCE_MODULE_STATE = r"""
+options:
+    state:
+        description:
+            - The state.
+            - I(overridden) is only supported with I(config).
+        type: str
+        default: present
+        choices:
+            - present
+            - absent
+            - replaced
+            - merged
+            - deleted
+            - gathered
+            - overridden
+"""
+
     STATE = r"""
 options:
     state:
@@ -331,6 +356,27 @@ options:
         type: str
 """
 
+    RULE_ORDER = r"""
+options:
+    rule_order:
+        description:
+            - Instead of managing a single rule, place these existing rules in
+              this order.
+            - With I(location), the rules are placed as one contiguous block at
+              that location.  Without it, only their relative order is enforced.
+            - The rulebase is retrieved once and only the fewest moves needed
+              are made.  The names of the rules moved are returned as
+              I(moved), and the number of moves saved compared to moving each
+              rule as I(moves_saved).
+            - Other rules may be moved if that takes fewer moves; their
+              relative order does not change.
+            - I(audit_comment) takes one more API call for each rule moved,
+              unless I(audit_comment_moved=false).
+        type: list
+        elements: str
+        version_added: 3.5.0
+"""
+
     TARGET = r"""
 options:
     target:
@@ -353,6 +399,15 @@ options:
             - Add an audit comment to the rule being defined.
             - This is only applied if there was a change to the rule.
         type: str
+    audit_comment_moved:
+        description:
+            - Also add I(audit_comment) to rules whose only change is their
+              position.
+            - Setting this to false saves one API call for each rule only moved
+              with I(config) or I(rule_order).
+        type: bool
+        default: true
+        version_added: 3.5.0
 """
 
     GATHERED_FILTER = r"""
@@ -364,3 +419,56 @@ options:
             - Refer to the guide discussing I(gathered_filter) for more information.
         type: str
 """
+
+    BULK_CONFIG = r"""
+options:
+    config:
+        description:
+            - A list of objects to manage in a single task, instead of one object
+              per task.
+            - Each item takes the object params of this module, such as I(name).
+            - The objects currently configured are retrieved once and compared
+              locally.  New objects, and merges that only add values, are then
+              pushed with as few API calls as the request size allows.  Objects
+              that need to be replaced, and merges that replace a value such as
+              C(any), are edited with C(multi-config) API calls on PAN-OS 10.0
+              and later, or one API call each before that.
+            - Supported states are I(present), I(absent), I(merged), I(replaced)
+              and I(deleted).
+        type: list
+        elements: dict
+        version_added: 3.5.0
+"""
+
+    RULEBASE_CONFIG = r"""
+options:
+    config:
+        description:
+            - A list of rules to manage in a single task, instead of one rule per
+              task.
+            - Each item takes the rule params of this module, such as the rule
+              name.
+            - The rulebase is retrieved once and the plan is computed locally, so
+              check mode does not make any further API calls.  The plan is
+              returned as I(created), I(updated), I(deleted) and I(moved).
+            - New rules, and merges that only add values, are pushed with as few
+              API calls as the request size allows.  Replaced rules, and merges
+              that replace a value such as C(any), are edited with C(multi-config)
+              API calls on PAN-OS 10.0 and later, or one API call each before
+              that.  Deleted rules take a single API call.
+            - The rules are then put in the order of this list with the fewest
+              moves.  With I(location), they are placed as one contiguous block
+              at that location.
+            - With I(state=overridden), this list is the whole rulebase, and the
+              rules not in it are deleted.
+            - I(audit_comment) takes one more API call for each rule created,
+              updated or moved, as PAN-OS sets audit comments one rule at a time,
+              so its cost grows linearly with the number of rules changed.  Set
+              I(audit_comment_moved=false) to not comment rules that are only
+              moved.
+            - Supported states are I(present), I(absent), I(merged), I(replaced),
+              I(deleted) and I(overridden).
+        type: list
+        elements: dict
+        version_added: 3.5.0
+"""
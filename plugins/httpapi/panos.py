@@ -33,11 +33,51 @@ options:
             - Use API key for authentication instead of username and password
         vars:
             - name: ansible_api_key
+    config_cache:
+        type: bool
+        default: false
+        description:
+            - Cache candidate configuration retrieved by pan-os-python based modules
+              in the persistent connection, so later tasks on the same host can
+              reuse it instead of querying the device again.
+            - Any configuration change sent through this connection evicts the
+              affected parts of the cache.  Changes made outside of this connection
+              are only seen once the cached entry expires.
+        vars:
+            - name: ansible_panos_config_cache
+    config_cache_ttl:
+        type: int
+        default: 300
+        description:
+            - Number of seconds a cached configuration entry is valid for.
+        vars:
+            - name: ansible_panos_config_cache_ttl
+    defer_writes:
+        type: bool
+        default: false
+        description:
+            - Queue the configuration changes (set, edit and delete) of pan-os-python
+              based modules in the persistent connection instead of sending each one,
+              then send them all as one C(multi-config) request, which PAN-OS applies
+              all or nothing.
+            - The queue is sent before any request that could depend on it, which is
+              a read of an overlapping xpath, a commit, or an op command that is not
+              a C(show), so the commit modules send it first.  It is also sent by
+              M(paloaltonetworks.panos.panos_change_set).
+            - Each task that queues changes is returned a warning saying so.  Changes
+              still queued when the connection is closed are discarded with another
+              warning, so end the play with a commit or
+              M(paloaltonetworks.panos.panos_change_set).
+            - An error in the queued changes is reported by the task that sent them.
+            - Requires PAN-OS 10.0 or later.
+        vars:
+            - name: ansible_panos_defer_writes
+        version_added: 3.5.0
 """
 
+import base64
 import time
 import xml.etree.ElementTree as ET
-from datetime import datetime, timedelta
 
 from ansible.module_utils.basic import to_text
 from ansible.module_utils.six.moves import urllib
@@ -45,7 +85,11 @@ from ansible.module_utils.six.moves.urllib.error import HTTPError
 from ansible.plugins.httpapi import HttpApiBase
 from ansible.utils.display import Display
 from ansible_collections.paloaltonetworks.panos.plugins.module_utils.panos import (
+    _MULTI_CONFIG_MIN_VERSION,
+    JobPoller,
+    JobTimeoutError,
     cmd_xml,
+    multi_config_op,
 )
 
 display = Display()
@@ -80,6 +124,72 @@ _PANOS_API_ERROR_CODES = {
 }
 
 
+# Request types and config actions that never change the candidate config.
+_READ_ONLY_TYPES = ("keygen", "version", "commit", "export", "log", "report")
+_READ_ONLY_ACTIONS = ("get", "show", "complete")
+
+# Requests that never need the deferred config changes sent first.
+_NO_FLUSH_TYPES = ("keygen", "version", "log", "report")
+
+# Config writes that can be deferred, and the params they may have.
+_DEFERRED_ACTIONS = ("set", "edit", "delete")
+_DEFERRED_PARAMS = set(["type", "action", "xpath", "element", "key"])
+
+# Max size of the URL encoded changes in one multi-config request, leaving
+# room under the 5MB XML API request limit.
+_MULTI_CONFIG_MAX_SIZE = int(4e6)
+
+_DEFERRED_RESPONSE = (
+    '<response status="success" code="20"><msg>command succeeded</msg></response>'
+)
+
+
+def _xpath_segments(xpath):
+    """Splits an xpath on "/", ignoring any "/" inside predicates."""
+    segments, current, depth, quote = [], [], 0, None
+    for char in xpath:
+        if quote:
+            if char == quote:
+                quote = None
+        elif char in "'\"":
+            quote = char
+        elif char == "[":
+            depth += 1
+        elif char == "]":
+            depth -= 1
+        elif char == "/" and depth == 0:
+            segments.append("".join(current))
+            current = []
+            continue
+        current.append(char)
+    segments.append("".join(current))
+
+    return segments
+
+
+def _xpaths_overlap(first, second):
+    """
+    Returns if one xpath may select a node inside the other.
+
+    Predicates are only used to tell two xpaths apart when they are plain and
+    both present, so this errs on the side of reporting an overlap.
+    """
+    pairs = zip(_xpath_segments(first), _xpath_segments(second))
+    for num, (a, b) in enumerate(pairs):
+        a_tag, _, a_pred = a.partition("[")
+        b_tag, _, b_pred = b.partition("[")
+        if num and (not a_tag or not b_tag):
+            # "//" descendant axis.
+            return True
+        if a_tag != b_tag:
+            return False
+        if a_pred and b_pred and a_pred != b_pred:
+            if " or " not in a_pred and " or " not in b_pred:
+                return False
+
+    return True
+
+
 class PanOSAPIError(ConnectionError):
     """Exception representing a PAN-OS API error."""
 
@@ -117,6 +227,8 @@ class HttpApi(HttpApiBase):
 
         self._api_key = None
         self._device_info = None
+        self._config_cache = {}
+        self._changes = []
 
     def api_key(self):
         """
@@ -483,8 +595,13 @@ class HttpApi(HttpApiBase):
         """
         Polls for job completion.
 
+        Polls are quick at first and then back off, or follow the job's
+        progress, see JobPoller.
+
         :param job_id: ID of job to poll for.
-        :param interval: Poll interval, in seconds.
+        :param interval: Max poll interval, in seconds.
+        :param timeout: Maximum amount of time to poll (in seconds).
+        :returns: The "show jobs id" response of the finished job.
         """
         cmd = "<show><jobs><id>{0}</id></jobs></show>".format(job_id)
 
@@ -494,9 +611,9 @@ class HttpApi(HttpApiBase):
             )
         )
 
-        max_end_time = datetime.utcnow() + timedelta(seconds=timeout)
+        responses = []
 
-        while datetime.utcnow() < max_end_time:
+        def fetch(job_ids):
             result = self.op(cmd, is_xml=True)
 
             root = ET.fromstring(result)
@@ -509,12 +626,22 @@ class HttpApi(HttpApiBase):
                 "poll_for_job(): job_id {0} status = {1}".format(job_id, status.text)
             )
 
-            if status.text == "FIN":
-                return result
-            else:
-                time.sleep(interval)
+            responses.append(result)
+            return {job_ids[0]: root.find("./result/job")}
+
+        poller = JobPoller(
+            fetch,
+            timeout=timeout,
+            min_interval=min(0.5, interval),
+            max_interval=interval,
+        )
+
+        try:
+            poller.wait([job_id])
+        except JobTimeoutError:
+            raise TimedOutException("Timed out waiting for job id {0}".format(job_id))
 
-        raise TimedOutException("Timed out waiting for job id {0}".format(job_id))
+        return responses[-1]
 
     def is_panorama(self):
         """
@@ -577,6 +704,8 @@ class HttpApi(HttpApiBase):
         if len(data.encode("utf-8")) > int(5e6):
             raise ConnectionError("Data too large for XML API request")
 
+        self._evict_config_cache(urllib.parse.parse_qs(data))
+
         headers.update(
             {
                 "Content-Type": "application/x-www-form-urlencoded",
@@ -597,6 +726,262 @@ class HttpApi(HttpApiBase):
         except HTTPError as e:
             return e.code, e.read()
 
+    def xapi_request(self, data):
+        """
+        Sends a raw XML API request on behalf of pan-os-python.
+
+        Unlike send_request(), the content headers are returned as well, as
+        pan-python needs them to tell XML, text and file export responses
+        apart.  Bodies that are not text are base64 encoded so they survive
+        the trip over the persistent connection socket.
+
+        :param data: URL encoded request data.
+        :returns: Dict with the HTTP code, content headers and body.
+        """
+        if len(data.encode("utf-8")) > int(5e6):
+            raise ConnectionError("Data too large for XML API request")
+
+        query = urllib.parse.parse_qs(data)
+        if self._defer_change(query):
+            display.vvvv("xapi_request(): deferred {0}".format(query["action"][0]))
+            return {
+                "code": 200,
+                "content_type": "application/xml; charset=UTF-8",
+                "content_disposition": None,
+                "encoding": "text",
+                "body": _DEFERRED_RESPONSE,
+                "deferred": self.pending_changes(),
+            }
+        elif self._needs_flush(query):
+            self.flush_changes()
+
+        cache_key = self._config_cache_key(query)
+        if cache_key is not None:
+            cached = self._config_cache.get(cache_key)
+            if cached is not None and time.time() < cached[0]:
+                display.vvvv("xapi_request(): cache hit for {0}".format(cache_key))
+                return cached[1]
+        else:
+            self._evict_config_cache(query)
+
+        headers = {
+            "Content-Type": "application/x-www-form-urlencoded",
+            "Content-Length": len(data),
+        }
+
+        try:
+            response, response_data = self.connection.send(
+                "/api/", data, method="POST", headers=headers
+            )
+            code, body = response.getcode(), response_data.getvalue()
+        except HTTPError as e:
+            response = e
+            code, body = e.code, e.read()
+
+        content_type = response.headers.get("Content-Type") or ""
+        ans = {
+            "code": code,
+            "content_type": content_type,
+            "content_disposition": response.headers.get("Content-Disposition"),
+        }
+
+        if "xml" in content_type or (
+            "text/plain" in content_type and not ans["content_disposition"]
+        ):
+            ans.update({"encoding": "text", "body": to_text(body)})
+        else:
+            ans.update({"encoding": "base64", "body": to_text(base64.b64encode(body))})
+
+        display.vvvv("xapi_request(): response code = {0}".format(code))
+
+        if cache_key is not None and code == 200 and 'status="success"' in ans["body"]:
+            expires = time.time() + self.get_option("config_cache_ttl")
+            self._config_cache[cache_key] = (expires, ans)
+
+        return ans
+
+    def _defer_change(self, query):
+        """
+        Queues a config write if writes are deferred, returning if it was.
+
+        :param query: Request data, as returned by parse_qs().
+        """
+        if not self.get_option("defer_writes"):
+            return False
+        elif query.get("type") != ["config"] or not set(query) <= _DEFERRED_PARAMS:
+            return False
+
+        action = query.get("action", [None])[0]
+        xpath = query.get("xpath", [None])[0]
+        if action not in _DEFERRED_ACTIONS or xpath is None:
+            return False
+
+        sw_version = self.version()["sw-version"] or ""
+        version = tuple(int(x.split("-")[0]) for x in sw_version.split(".")[:3])
+        if version < _MULTI_CONFIG_MIN_VERSION:
+            raise ConnectionError(
+                "defer_writes requires PAN-OS 10.0 or later, not {0}".format(sw_version)
+            )
+
+        self._evict_config_cache(query)
+        self._changes.append((action, xpath, query.get("element", [""])[0]))
+
+        return True
+
+    def _needs_flush(self, query):
+        """
+        Returns if the deferred changes must be sent before a request.
+
+        :param query: Request data, as returned by parse_qs().
+        """
+        if not self._changes:
+            return False
+
+        req_type = query.get("type", [None])[0]
+        if req_type in _NO_FLUSH_TYPES:
+            return False
+        elif req_type == "op":
+            cmd = query.get("cmd", [""])[0].lstrip()
+            return not cmd.startswith("<show>") or cmd.startswith("<show><config>")
+        elif req_type == "config":
+            action = query.get("action", [None])[0]
+            xpath = query.get("xpath", [None])[0]
+            if action in _READ_ONLY_ACTIONS and xpath is not None:
+                return any(_xpaths_overlap(x[1], xpath) for x in self._changes)
+
+        return True
+
+    def pending_changes(self):
+        """
+        Returns how many config changes are deferred.
+        """
+        return len(self._changes)
+
+    def discard_changes(self):
+        """
+        Drops the deferred config changes without sending them.
+
+        :returns: How many changes were dropped.
+        """
+        count = len(self._changes)
+        self._changes = []
+
+        return count
+
+    def flush_changes(self):
+        """
+        Sends the deferred config changes as multi-config requests.
+
+        Each request is applied all or nothing by PAN-OS.  Only more changes
+        than fit in one request are split over several.
+
+        :returns: How many changes were sent.
+        """
+        changes, self._changes = self._changes, []
+        if not changes:
+            return 0
+
+        chunks, chunk, size = [], [], 0
+        for num, (action, xpath, element) in enumerate(changes, 1):
+            if action == "delete":
+                element = None
+            xml = multi_config_op(num, action, xpath, element)
+            xml_size = len(urllib.parse.quote(xml))
+            if chunk and size + xml_size > _MULTI_CONFIG_MAX_SIZE:
+                chunks.append(chunk)
+                chunk, size = [], 0
+            chunk.append(xml)
+            size += xml_size
+        chunks.append(chunk)
+
+        sent = 0
+        for chunk in chunks:
+            params = {
+                "type": "config",
+                "key": self.api_key(),
+                "action": "multi-config",
+                "element": "<multi-config>{0}</multi-config>".format("".join(chunk)),
+            }
+
+            data = urllib.parse.urlencode(params)
+            code, response = self.send_request(data)
+            try:
+                self._validate_response(code, response)
+            except ConnectionError as e:
+                raise ConnectionError(
+                    "Failed to apply {0} deferred config changes: {1}".format(
+                        len(changes) - sent, e
+                    )
+                )
+            sent += len(chunk)
+
+        display.vvvv("flush_changes(): sent {0} changes".format(sent))
+
+        return sent
+
+    def logout(self):
+        """
+        Discards any deferred config changes before the connection is closed.
+
+        They are not sent, as an error could no longer be reported by a task.
+        """
+        if self._changes:
+            display.warning(
+                "Discarded {0} deferred config changes that were not sent by "
+                "a commit or panos_change_set".format(self.discard_changes())
+            )
+
+    def _config_cache_key(self, query):
+        """
+        Returns the config cache key for a request, or None if the request
+        should not be served from the cache.
+
+        :param query: Request data, as returned by parse_qs().
+        """
+        if not self.get_option("config_cache"):
+            return None
+
+        if query.get("type") != ["config"] or query.get("action") != ["get"]:
+            return None
+
+        return (
+            query.get("target", [None])[0],
+            query.get("vsys", [None])[0],
+            query.get("xpath", [""])[0],
+        )
+
+    def _evict_config_cache(self, query):
+        """
+        Evicts the cached config that a request may change.
+
+        Config writes evict every cached xpath overlapping the one written,
+        while other requests that may change the candidate config (such as
+        op commands other than "show" or imports) clear the whole cache.
+
+        :param query: Request data, as returned by parse_qs().
+        """
+        if not self._config_cache:
+            return
+
+        req_type = query.get("type", [None])[0]
+        if req_type in _READ_ONLY_TYPES:
+            return
+        elif req_type == "op":
+            if query.get("cmd", [""])[0].lstrip().startswith("<show>"):
+                return
+        elif req_type == "config":
+            action = query.get("action", [None])[0]
+            xpath = query.get("xpath", [None])[0]
+            if action in _READ_ONLY_ACTIONS:
+                return
+            elif xpath is not None and action != "multi-config":
+                for key in list(self._config_cache.keys()):
+                    if _xpaths_overlap(key[2], xpath):
+                        del self._config_cache[key]
+                return
+
+        self._config_cache.clear()
+
     @staticmethod
     def _validate_response(http_code, http_response):
 
@@ -29,17 +29,53 @@ from __future__ import absolute_import, division, print_function
 
 __metaclass__ = type
 
+import base64
+import bisect
+import copy
+import gzip
+import hashlib
+import json
+import os
+import random
+import select
 import re
 import shlex
+import socket
 import sys
+import tempfile
 import time
 from functools import reduce
 import importlib
+import io
+import ipaddress
+import xml.etree.ElementTree as ET
+from xml.sax.saxutils import quoteattr
 
 from ansible.module_utils.basic import AnsibleModule
-from ansible.module_utils.connection import Connection
+from ansible.module_utils.common.arg_spec import ArgumentSpecValidator
+from ansible.module_utils.common.text.converters import to_text
+from ansible.module_utils.common.warnings import warn
+from ansible.module_utils.connection import Connection, ConnectionError
+from ansible.module_utils.six.moves import http_client, urllib
 
 _MIN_VERSION_ERROR = "{0} version ({1}) < minimum version ({2})"
+
+# Max size of the element sent in a single bulk `set` API call, leaving room
+# for URL encoding under the 5MB XML API request limit.
+_BULK_REQUEST_MAX_SIZE = int(1.5e6)
+
+# First PAN-OS version with the multi-config API, below which (or when the
+# version is unknown) merged updates are sent one param at a time.
+_MULTI_CONFIG_MIN_VERSION = (10, 0, 0)
+
+# Retry policy used by get_pandevice_parent() when a timeout is given: the
+# delay between attempts doubles from the base up to the cap, with jitter,
+# and retries first check that the API port accepts TCP connections within
+# the probe timeout before attempting the API login again.
+_CONNECT_BACKOFF_BASE = 1
+_CONNECT_BACKOFF_MAX = 30
+_CONNECT_PROBE_TIMEOUT = 5
+
 HAS_PANDEVICE = True
 try:
     import panos
@@ -47,7 +83,7 @@ try:
     from panos.device import Vsys
     from panos.errors import PanCommitNotNeeded, PanDeviceError, PanObjectMissing
     from panos.firewall import Firewall
-    from panos.panorama import DeviceGroup, Template, TemplateStack
+    from panos.panorama import DeviceGroup, Panorama, Template, TemplateStack
     from panos.policies import PostRulebase, PreRulebase, Rulebase
 except ImportError:
     try:
@@ -60,7 +96,12 @@ except ImportError:
             PanObjectMissing,
         )
         from pandevice.firewall import Firewall
-        from pandevice.panorama import DeviceGroup, Template, TemplateStack
+        from pandevice.panorama import (
+            DeviceGroup,
+            Panorama,
+            Template,
+            TemplateStack,
+        )
         from pandevice.policies import PostRulebase, PreRulebase, Rulebase
     except ImportError:
         HAS_PANDEVICE = False
@@ -82,9 +123,17 @@ def eltostr(obj):
         return obj.element_str()
 
 
+# Classes found by to_sdk_cls(), by (pkg_name, cls_name).
+_SDK_CLS_CACHE = {}
+
+
 def to_sdk_cls(pkg_name, cls_name):
     sdk_names = ("panos", "pandevice")
 
+    cls = _SDK_CLS_CACHE.get((pkg_name, cls_name))
+    if cls is not None:
+        return cls
+
     for sdk_name in ("panos", "pandevice"):
         try:
             mod = importlib.import_module("{0}.{1}".format(sdk_name, pkg_name))
@@ -92,7 +141,9 @@ def to_sdk_cls(pkg_name, cls_name):
             continue
         else:
             try:
-                return getattr(mod, cls_name)
+                cls = getattr(mod, cls_name)
+                _SDK_CLS_CACHE[(pkg_name, cls_name)] = cls
+                return cls
             except AttributeError:
                 raise Exception(
                     "{0}.{1}.{2} does not exist".format(sdk_name, pkg_name, cls_name)
@@ -101,6 +152,127 @@ def to_sdk_cls(pkg_name, cls_name):
     raise Exception("Couldn't find any sdk package named {0}".format(pkg_name))
 
 
+class _HttpApiResponse(object):
+    """Minimal urllib response look-alike built from `xapi_request()` output."""
+
+    def __init__(self, ans):
+        self._headers = {
+            "content-type": ans.get("content_type"),
+            "content-disposition": ans.get("content_disposition"),
+        }
+        if ans.get("encoding") == "base64":
+            self._body = io.BytesIO(base64.b64decode(ans["body"]))
+        else:
+            self._body = io.BytesIO((ans["body"] or "").encode("utf-8"))
+
+    def read(self, amt=None):
+        return self._body.read(amt)
+
+    def close(self):
+        self._body.close()
+
+    def getheader(self, name, default=None):
+        return self._headers.get(name.lower()) or default
+
+    def info(self):
+        return self._headers
+
+
+_DEFERRED_WARNING = (
+    "Config changes of this task were queued by defer_writes ({0} pending in the "
+    "connection).  They are only sent by a commit or panos_change_set later in "
+    "the play, and are discarded if the connection is closed first."
+)
+
+# Set once the deferred changes warning was given to this task.
+_DEFERRED_WARNING_SENT = []
+
+
+if HAS_PANDEVICE:
+
+    class HttpApiXapi(PanDevice.XapiWrapper):
+        """pan-python transport for the httpapi persistent connection.
+
+        Every XML API request is sent through the httpapi plugin's
+        `xapi_request()`, so the connection's session and API key are
+        reused across tasks instead of opening a new connection each time.
+        """
+
+        def __init__(self, *args, **kwargs):
+            self.connection = kwargs.pop("connection")
+            super(HttpApiXapi, self).__init__(*args, **kwargs)
+
+        def _PanXapi__api_request(self, query):
+            try:
+                ans = self.connection.xapi_request(urllib.parse.urlencode(query))
+            except ConnectionError as e:
+                self.status_detail = "URLError: reason: {0}".format(e)
+                return False
+
+            # Mirror urlopen(), which raises on HTTP errors.
+            if ans["code"] >= 400:
+                self.status_detail = "URLError: code: {0} reason: {1}".format(
+                    ans["code"], http_client.responses.get(ans["code"], "")
+                )
+                return False
+
+            # Tell the task that its changes are only queued, as they are
+            # lost if nothing sends them before the connection is closed.
+            if ans.get("deferred") and not _DEFERRED_WARNING_SENT:
+                _DEFERRED_WARNING_SENT.append(True)
+                warn(_DEFERRED_WARNING.format(ans["deferred"]))
+
+            return _HttpApiResponse(ans)
+
+
+def xapi_stream(xapi, query):
+    """
+    Sends an XML API request, returning the response unread.
+
+    pan-python reads and parses each response as a whole, so large exports
+    or op outputs would be held in memory.  This sends the request with the
+    transport of xapi instead, either pan-python's or the httpapi
+    connection's, and leaves reading the response to the caller.  The API
+    key and the target serial number of xapi are added to the query.
+
+    Args:
+        xapi: The pan-python xapi of the device, as in `device.xapi`.
+        query(dict): The request params, such as `type` and `cmd`.
+
+    Returns:
+        A file-like response, to be closed by the caller.
+
+    Raises:
+        PanDeviceError: If the request failed.
+    """
+    query = dict(query, key=xapi.api_key)
+    if xapi.serial is not None:
+        query["target"] = xapi.serial
+
+    response = xapi._PanXapi__api_request(query)
+    if not response:
+        raise PanDeviceError(xapi.status_detail)
+
+    return response
+
+
+class _ItemModule(object):
+    """The module as seen by the per object hooks for one `config` item.
+
+    The object params (sdk_params and extra_params) are those of the item,
+    and everything else is delegated to the module.
+    """
+
+    def __init__(self, module, object_params, item_params):
+        self._module = module
+        self.params = dict(module.params)
+        self.params.update((x, None) for x in object_params)
+        self.params.update(item_params)
+
+    def __getattr__(self, name):
+        return getattr(self._module, name)
+
+
 class ConnectionHelper(object):
     def __init__(
         self,
@@ -150,6 +322,10 @@ class ConnectionHelper(object):
         self.with_audit_comment = False
         self.with_import_support = False
         self.with_gathered_filter = False
+        self._gathered_filters = {}
+        self._sdk_cls_meta = {}
+        self.with_bulk_config = False
+        self.bulk_config_spec = {}
         self.with_update_in_apply_state = False
         self.zone_mode = None
         self.default_zone_mode = None
@@ -165,7 +341,11 @@ class ConnectionHelper(object):
         # The PAN-OS device.
         self.device = None
 
-    def get_pandevice_parent(self, module, timeout=0):
+        # Connection telemetry, set by get_pandevice_parent().
+        self.connection_attempts = 0
+        self.connection_elapsed = 0
+
+    def get_pandevice_parent(self, module, timeout=0, max_attempts=None):
         """Builds the pandevice object tree, returning the parent object.
 
         If pandevice is not installed, then module.fail_json() will be
@@ -174,6 +354,12 @@ class ConnectionHelper(object):
         Arguments:
             * module(AnsibleModule): the ansible module.
             * timeout(int): Number of seconds to retry opening the connection to PAN-OS.
+            * max_attempts(int): Max number of connection attempts when retrying,
+              or None to only be bound by the timeout.
+
+        The number of connection attempts made and the seconds spent connecting
+        are saved as `connection_attempts` and `connection_elapsed`, and are
+        also returned if connecting fails.
 
         Returns:
             * The parent pandevice object based on the spec given to
@@ -264,24 +450,65 @@ class ConnectionHelper(object):
             module.deprecate(
                 msg, version="4.0.0", collection_name="paloaltonetworks.panos"
             )
-        else:
+            if module.params["password"] is None and module.params["api_key"] is None:
+                module.fail_json(msg='Param "password" or "api_key" is required.')
+        elif getattr(module, "_socket_path", None) is None:
             module.fail_json(msg="Provider params are required.")
+        elif module.params["provider"]:
+            # Firewall via Panorama over the httpapi connection.
+            serial_number = module.params["provider"]["serial_number"]
 
         # Create the connection object.
         if not isinstance(timeout, int):
             raise ValueError("Timeout must be an int")
         elif timeout < 0:
             raise ValueError("Timeout must greater than or equal to 0")
-        end_time = time.time() + timeout
+        if max_attempts is not None and max_attempts < 1:
+            raise ValueError("Max attempts must be greater than 0")
+        start_time = time.time()
+        end_time = start_time + timeout
+        self.connection_attempts = 0
         while True:
+            self.connection_attempts += 1
             try:
-                self.device = PanDevice.create_from_device(*pan_device_auth)
-            except PanDeviceError as e:
+                if pan_device_auth is None:
+                    self.device = self.device_from_connection(module)
+                else:
+                    if self.connection_attempts > 1:
+                        self._probe_port(pan_device_auth, end_time)
+                    self.device = PanDevice.create_from_device(*pan_device_auth)
+            except (PanDeviceError, ConnectionError, socket.error) as e:
+                self.connection_elapsed = time.time() - start_time
                 if timeout == 0:
-                    module.fail_json(msg="Failed connection: {0}".format(e))
-                elif time.time() >= end_time:
-                    module.fail_json(msg="Connection timeout: {0}".format(e))
+                    module.fail_json(
+                        msg="Failed connection: {0}".format(e),
+                        connection_attempts=self.connection_attempts,
+                        connection_elapsed=self.connection_elapsed,
+                    )
+
+                delay = self._backoff_delay(self.connection_attempts)
+                if time.time() + delay >= end_time:
+                    module.fail_json(
+                        msg="Connection timeout after {0} attempts: {1}".format(
+                            self.connection_attempts, e
+                        ),
+                        connection_attempts=self.connection_attempts,
+                        connection_elapsed=self.connection_elapsed,
+                    )
+                elif (
+                    max_attempts is not None
+                    and self.connection_attempts >= max_attempts
+                ):
+                    module.fail_json(
+                        msg="Connection failed after {0} attempts: {1}".format(
+                            self.connection_attempts, e
+                        ),
+                        connection_attempts=self.connection_attempts,
+                        connection_elapsed=self.connection_elapsed,
+                    )
+                time.sleep(delay)
             else:
+                self.connection_elapsed = time.time() - start_time
                 break
 
         # Verify PAN-OS minimum version.
@@ -299,6 +526,18 @@ class ConnectionHelper(object):
         if hasattr(self.device, "refresh_devices") and serial_number:
             fw = Firewall(serial=serial_number)
             self.device.add(fw)
+            conn = getattr(self.device._xapi_private, "connection", None)
+            if conn is not None:
+                # Keep proxying through Panorama over the httpapi connection.
+                fw._xapi_private = HttpApiXapi(
+                    api_key=self.device.api_key,
+                    hostname=self.device.hostname,
+                    port=self.device.port,
+                    timeout=fw.timeout,
+                    serial=serial_number,
+                    pan_device=fw,
+                    connection=conn,
+                )
             self.device = fw
 
         parent = self.device
@@ -442,6 +681,70 @@ class ConnectionHelper(object):
         # Done.
         return parent
 
+    def _backoff_delay(self, attempt):
+        """Returns the seconds to wait after the given failed attempt.
+
+        This is exponential backoff with "equal jitter": half of the delay is
+        fixed and the other half random, so that many hosts retrying against
+        the same Panorama or the same rebooting firewall spread out.
+        """
+        delay = min(_CONNECT_BACKOFF_MAX, _CONNECT_BACKOFF_BASE * 2 ** (attempt - 1))
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def _probe_port(self, pan_device_auth, end_time):
+        """Checks that the API port accepts TCP connections.
+
+        This is a cheap check done before retrying, so that a device that is
+        still down fails fast instead of waiting for the socket timeout of
+        pan-python (20 minutes by default) or doing a TLS handshake each time.
+        """
+        hostname, port = pan_device_auth[0], pan_device_auth[4]
+        probe_timeout = max(0.1, min(_CONNECT_PROBE_TIMEOUT, end_time - time.time()))
+        sock = socket.create_connection(
+            (hostname.strip("[]"), int(port or 443)), timeout=probe_timeout
+        )
+        sock.close()
+
+    def device_from_connection(self, module):
+        """Builds the PanDevice on top of the httpapi persistent connection.
+
+        The API key and the version / model / serial number cached by the
+        httpapi plugin are reused, so unlike `PanDevice.create_from_device()`
+        this does not perform a keygen or "show system info" every task.
+
+        Arguments:
+            * module(AnsibleModule): the ansible module.
+
+        Returns:
+            * A Firewall or Panorama object whose xapi is an HttpApiXapi.
+        """
+        conn = Connection(module._socket_path)
+        info = conn.version()
+        api_key = conn.api_key()
+        hostname = conn.get_option("host")
+        # The port of the connection, for modules sending some requests
+        # outside of it, such as file imports.
+        port = conn.get_option("port") or 443
+
+        model = info["model"] or ""
+        if model == "Panorama" or model.startswith("M-"):
+            device = Panorama(hostname, api_key=api_key, port=port)
+        else:
+            device = Firewall(
+                hostname, api_key=api_key, serial=info["serial"], port=port
+            )
+        device._set_version_and_version_info(info["sw-version"])
+        device._xapi_private = HttpApiXapi(
+            api_key=api_key,
+            hostname=hostname,
+            port=port,
+            timeout=device.timeout,
+            pan_device=device,
+            connection=conn,
+        )
+
+        return device
+
     def process(self, module):
         result = {}
 
@@ -485,17 +788,62 @@ class ConnectionHelper(object):
         if parent is None:
             raise Exception("parent_handling() must return the parent")
 
-        # Build the object from the spec.
-        spec = {}
-        for ansible_param in self.sdk_params.keys():
-            sdk_param = self.ansible_to_sdk_param_mapping.get(
-                ansible_param, ansible_param
+        # Optional: with_bulk_config.
+        if self.with_bulk_config and module.params["config"] is not None:
+            self.apply_bulk_state(parent, module, result)
+            if self.with_audit_comment and result["changed"] and not module.check_mode:
+                comment = module.params["audit_comment"]
+                if comment:
+                    cls = to_sdk_cls(*self.sdk_cls)
+                    changed = result["created"] + result["updated"]
+                    if module.params["audit_comment_moved"]:
+                        changed += [
+                            x for x in result.get("moved", []) if x not in changed
+                        ]
+                    for uid in changed:
+                        obj = cls(uid)
+                        parent.add(obj)
+                        obj.opstate.audit_comment.update(comment)
+            if self.with_commit and result["changed"] and module.params["commit"]:
+                self.commit(module)
+            module.exit_json(**result)
+            return
+
+        if module.params.get("state") == "overridden":
+            module.fail_json(msg='state "overridden" requires "config"')
+
+        # Optional: with_movement, ordering a list of rules.
+        if self.with_movement and module.params.get("rule_order") is not None:
+            if module.params["state"] not in ("present", "merged", "replaced"):
+                module.fail_json(
+                    msg='"rule_order" does not support state: {0}'.format(
+                        module.params["state"]
+                    )
+                )
+            cls = to_sdk_cls(*self.sdk_cls)
+            result["changed"] = self.apply_rule_order(
+                cls,
+                parent,
+                module.params["rule_order"],
+                module.params["location"],
+                module.params["existing_rule"],
+                module,
+                result,
             )
-            spec[sdk_param] = module.params.get(ansible_param)
-            if ansible_param in self.preset_values.keys():
-                self.preset_values[sdk_param] = self.preset_values.pop(ansible_param)
-            if ansible_param in self.default_values.keys():
-                self.default_values[sdk_param] = self.default_values.pop(ansible_param)
+            if self.with_audit_comment and result["changed"] and not module.check_mode:
+                comment = module.params["audit_comment"]
+                if comment and module.params["audit_comment_moved"]:
+                    for uid in result["moved"]:
+                        obj = cls(uid)
+                        parent.add(obj)
+                        obj.opstate.audit_comment.update(comment)
+            if self.with_commit and result["changed"] and module.params["commit"]:
+                self.commit(module)
+            module.exit_json(**result)
+            return
+
+        # Build the object from the spec.
+        spec = self.sdk_spec(module.params)
 
         if self.with_uuid:
             spec["uuid"] = module.params["uuid"]
@@ -518,18 +866,23 @@ class ConnectionHelper(object):
         self.post_state_handling(obj, result, module)
 
         # Optional: with_movement.
+        moved_only = False
         if self.with_movement and module.params["state"] in (
             "present",
             "merged",
             "replaced",
         ):
-            result["changed"] |= self.apply_position(
+            moved = self.apply_position(
                 obj, module.params["location"], module.params["existing_rule"], module
             )
+            if moved and not result["changed"]:
+                result["changed"] = moved_only = True
 
         # Optional: with_audit_comment.
         if self.with_audit_comment and result["changed"] and not module.check_mode:
             comment = module.params["audit_comment"]
+            if moved_only and not module.params["audit_comment_moved"]:
+                comment = None
             if comment:
                 obj.opstate.audit_comment.update(comment)
 
@@ -540,6 +893,28 @@ class ConnectionHelper(object):
         # Done.
         module.exit_json(**result)
 
+    def sdk_spec(self, params):
+        """Returns the SDK object spec for the given Ansible params.
+
+        Args:
+            params(dict): The module params, or a single `config` item.
+
+        Returns:
+            dict: The sdk_params values, keyed by SDK param name.
+        """
+        spec = {}
+        for ansible_param in self.sdk_params.keys():
+            sdk_param = self.ansible_to_sdk_param_mapping.get(
+                ansible_param, ansible_param
+            )
+            spec[sdk_param] = params.get(ansible_param)
+            if ansible_param in self.preset_values.keys():
+                self.preset_values[sdk_param] = self.preset_values.pop(ansible_param)
+            if ansible_param in self.default_values.keys():
+                self.default_values[sdk_param] = self.default_values.pop(ansible_param)
+
+        return spec
+
     def initial_handling(self, module):
         """Override to implement module specific deprecations or param massaging."""
         pass
@@ -566,9 +941,11 @@ class ConnectionHelper(object):
         It's advised to call `super().object_handling(obj, module)` if overriden
         in the modules.
         """
+        defaults = self._cls_meta(type(obj)).defaults
         for key, obj_value in obj.about().items():
             if obj_value is None:
-                setattr(obj, key, self._get_default_value(obj, key))
+                # Lists are copied, as objects may go on to modify theirs.
+                setattr(obj, key, copy.copy(defaults.get(key)))
 
     def pre_state_handling(self, obj, result, module):
         """Override to provide custom pre-state handling functionality."""
@@ -864,51 +1241,23 @@ class ConnectionHelper(object):
                     continue
                 result["before"] = self.describe(item)
                 result["diff"] = {"before": eltostr(item)}
-                # Doing item.apply() is faster from an API perspective, but may have
-                # undesired side-effects if the object is a vsys importable and the vsys
-                # has not been specified, so we'll just do item.update() for all changed
-                # params.
-                updated_params = set([])
-                for key, obj_value in obj.about().items():
-                    item_value = getattr(item, key, None)
-                    if obj_value:
-                        if isinstance(obj_value, list) or isinstance(item_value, list):
-                            if not item_value:
-                                item_value = []
-                            if isinstance(obj_value, str):
-                                obj_value = [obj_value]
-                            # if current config or obj to create is one of the preset values
-                            # (dropdown options in UI) then replace it with the obj value
-                            # since values like "any" can not be in place with other values.
-                            if (
-                                preset_values := self.preset_values.get(key, None)
-                            ) and (
-                                set(item_value).issubset(preset_values)
-                                or set(obj_value).issubset(preset_values)
-                            ):
-                                updated_params.add(key)
-                                setattr(item, key, obj_value)
-                            else:
-                                for elm in obj_value:
-                                    if elm not in item_value:
-                                        updated_params.add(key)
-                                        item_value.append(elm)
-                                        setattr(item, key, item_value)
-                        elif item_value != obj_value:
-                            updated_params.add(key)
-                            setattr(item, key, obj_value)
+                # Doing item.apply() may have undesired side-effects if the object is
+                # a vsys importable and the vsys has not been specified, so only the
+                # changed params are updated, all in one request.
+                updated_params = self.merge_params(item, obj)
                 if updated_params:
                     result["changed"] = True
                     result["after"] = self.describe(item)
                     result["diff"]["after"] = eltostr(item)
                     if not module.check_mode:
-                        for param in updated_params:
-                            try:
-                                item.update(param)
-                            except PanDeviceError as e:
-                                module.fail_json(
-                                    msg="Failed update {0}: {1}".format(param, e)
+                        try:
+                            self.update_params(item, updated_params)
+                        except PanDeviceError as e:
+                            module.fail_json(
+                                msg="Failed update {0}: {1}".format(
+                                    ", ".join(sorted(updated_params)), e
                                 )
+                            )
                 break
             else:  # create new record with merge
                 self.object_handling(obj, module)
@@ -984,10 +1333,13 @@ class ConnectionHelper(object):
             if module.params.get("gathered_filter", None):
                 result["gathered"] = []
                 result["gathered_xml"] = []
+                logic = module.params["gathered_filter"]
+                try:
+                    self._gathered_filters[logic] = GatheredFilter(logic)
+                except Exception as e:
+                    module.fail_json(msg="Invalid gathered_filter: {0}".format(e))
                 for item in listing:
-                    if self.matches_gathered_filter(
-                        item, module.params["gathered_filter"]
-                    ):
+                    if self.matches_gathered_filter(item, logic):
                         result["gathered"].append(self.describe(item))
                         item_xml = ""
                         try:
@@ -1039,6 +1391,385 @@ class ConnectionHelper(object):
 
         return result
 
+    def merge_params(self, item, obj):
+        """Merges the params specified in obj into item.
+
+        List params have the new members appended, while all other params
+        specified in obj overwrite the value in item.
+
+        Args:
+            item: The pandevice object currently configured.
+            obj: The pandevice object with the params to merge in.
+
+        Returns:
+            set: The names of the params of item that were changed.
+        """
+        updated_params = set([])
+        preset_values = self._cls_meta(type(obj)).preset_values
+        for key, obj_value in obj.about().items():
+            item_value = getattr(item, key, None)
+            if obj_value:
+                if isinstance(obj_value, list) or isinstance(item_value, list):
+                    if not item_value:
+                        item_value = []
+                    if isinstance(obj_value, str):
+                        obj_value = [obj_value]
+                    # if current config or obj to create is one of the preset values
+                    # (dropdown options in UI) then replace it with the obj value
+                    # since values like "any" can not be in place with other values.
+                    if (presets := preset_values.get(key, None)) and (
+                        presets.issuperset(item_value) or presets.issuperset(obj_value)
+                    ):
+                        updated_params.add(key)
+                        setattr(item, key, obj_value)
+                    else:
+                        for elm in obj_value:
+                            if elm not in item_value:
+                                updated_params.add(key)
+                                item_value.append(elm)
+                                setattr(item, key, item_value)
+                elif item_value != obj_value:
+                    updated_params.add(key)
+                    setattr(item, key, obj_value)
+
+        return updated_params
+
+    def apply_bulk_state(self, parent, module, result):
+        """Bulk state handling for the `config` list of objects.
+
+        The objects currently configured are retrieved with a single
+        refreshall() of the parent and compared locally.  New objects and
+        merges that only add values are then pushed with as few `set` API
+        calls as possible.  Replaced objects, and the params of merges that
+        replace a value, are edited with multi-config requests if supported.
+        Deletions are done using delete_similar().
+
+        For rule modules, `config` is also the desired rule order, and the
+        fewest moves reaching it are made last.  With a state of overridden,
+        `config` is the whole rulebase and the rules not in it are deleted.
+
+        Note:  If module.check_mode is True, then the changes are computed,
+        but not actually made.
+
+        Args:
+            parent: The pandevice object the config objects belong to.
+            module: The Ansible module.
+            result(dict): Update this dict with the results of this function.
+        """
+        state = module.params["state"]
+        states = ["present", "absent", "merged", "replaced", "deleted"]
+        if self.with_movement:
+            states.append("overridden")
+        if state not in states:
+            module.fail_json(msg='"config" does not support state: {0}'.format(state))
+
+        location = existing_rule = None
+        if self.with_movement and state not in ("absent", "deleted"):
+            location = module.params["location"]
+            existing_rule = module.params["existing_rule"]
+            self._check_location(location, existing_rule, module)
+            if state == "overridden" and location is not None:
+                module.fail_json(msg='"location" does not support state: overridden')
+
+        # Validate every item against the object params of the module.
+        cls = to_sdk_cls(*self.sdk_cls)
+        validator = ArgumentSpecValidator(self.bulk_config_spec)
+        object_params = list(self.sdk_params) + list(self.extra_params)
+        desired = []
+        item_modules, item_results = {}, {}
+        seen = set()
+        for num, item_params in enumerate(module.params["config"]):
+            ans = validator.validate(item_params)
+            if ans.error_messages:
+                module.fail_json(
+                    msg="config[{0}]: {1}".format(num, ", ".join(ans.error_messages))
+                )
+            item_module = _ItemModule(module, object_params, ans.validated_parameters)
+            spec = self.sdk_spec(ans.validated_parameters)
+            self.spec_handling(spec, item_module)
+            obj = cls(**spec)
+            if obj.uid in seen:
+                module.fail_json(msg="config[{0}]: duplicate {1}".format(num, obj.uid))
+            seen.add(obj.uid)
+            desired.append(obj)
+            item_modules[obj.uid] = item_module
+        if existing_rule is not None and existing_rule in seen:
+            module.fail_json(msg="existing_rule cannot be in config")
+
+        # One refresh of everything currently configured.
+        try:
+            listing = cls.refreshall(parent, add=False)
+        except PanDeviceError as e:
+            module.fail_json(msg="Failed bulk refresh: {0}".format(e))
+        current = dict((x.uid, x) for x in listing)
+
+        to_set, to_edit, to_update, to_delete = [], [], [], []
+        created, updated, deleted = [], [], []
+        before, after = [], []
+        for obj in desired:
+            item_results[obj.uid] = {"changed": False}
+            self.pre_state_handling(obj, item_results[obj.uid], item_modules[obj.uid])
+            item = current.get(obj.uid)
+            if state in ("absent", "deleted"):
+                if item is not None:
+                    before.append(item)
+                    deleted.append(obj.uid)
+                    to_delete.append(obj)
+                continue
+
+            if item is None:
+                self.object_handling(obj, module)
+                after.append(obj)
+                created.append(obj.uid)
+                to_set.append(obj)
+            elif state == "merged":
+                # Copy the object only, not its parent tree and device.
+                item_parent, item.parent = item.parent, None
+                try:
+                    merged = copy.deepcopy(item)
+                finally:
+                    item.parent = item_parent
+                merged.parent = item_parent
+                params = self.merge_params(merged, obj)
+                if params:
+                    before.append(item)
+                    after.append(merged)
+                    updated.append(obj.uid)
+                    # A `set` only adds to the config, so merges that replace
+                    # a value are edited instead.
+                    if all(self._adds_to(item, merged, x) for x in params):
+                        to_set.append(merged)
+                    else:
+                        to_update.append((merged, params))
+            else:
+                self.object_handling(obj, module)
+                if self.with_uuid and obj.uuid is None:
+                    obj.uuid = item.uuid
+                if not item.equal(obj, compare_children=True):
+                    before.append(item)
+                    after.append(obj)
+                    updated.append(obj.uid)
+                    to_edit.append(obj)
+
+        if state == "overridden":
+            for item in listing:
+                if item.uid not in seen:
+                    before.append(item)
+                    deleted.append(item.uid)
+                    to_delete.append(item)
+
+        # Rules are set at the bottom of the rulebase, then moved into place.
+        moves = []
+        if self.with_movement and state not in ("absent", "deleted"):
+            names = [x.uid for x in desired]
+            gone = set(deleted)
+            order = [x.uid for x in listing if x.uid not in gone] + created
+            if state == "overridden":
+                target = names
+            else:
+                try:
+                    target = place_rules(order, names, location, existing_rule)
+                except ValueError:
+                    msg = [
+                        "Cannot do relative rule placement",
+                        '"{0}" does not exist.'.format(existing_rule),
+                    ]
+                    module.fail_json(msg="{0}".format(msg))
+            moves = plan_moves(order, target)
+            result["moved"] = [x[0] for x in moves]
+            result["moves_saved"] = len(names) - len(moves)
+
+        result["changed"] = bool(created or updated or deleted or moves)
+        result["created"] = created
+        result["updated"] = updated
+        result["deleted"] = deleted
+        result["before"] = self.describe(before)
+        result["after"] = self.describe(after)
+        result["diff"] = {
+            "before": "".join(to_text(eltostr(x)) for x in before),
+            "after": "".join(to_text(eltostr(x)) for x in after),
+        }
+
+        if result["changed"] and not module.check_mode:
+            # Only attach the objects to push, as the bulk functions operate
+            # on everything sharing the same xpath in the object tree.
+            try:
+                if to_delete:
+                    parent.extend(to_delete)
+                    to_delete[0].delete_similar()
+                    parent.removeall(cls)
+                parent.extend(to_set + to_edit + [x[0] for x in to_update])
+                self._bulk_set(to_set)
+                self._bulk_edit(to_edit)
+                self._bulk_update(to_update)
+                for uid, where, ref in moves:
+                    rule = cls(uid)
+                    parent.add(rule)
+                    rule.move(where, ref)
+            except PanDeviceError as e:
+                module.fail_json(msg="Failed bulk apply: {0}".format(e))
+
+        # The per object hooks see the before / after dicts of their item.
+        before_by_uid = dict(zip((x.uid for x in before), result["before"]))
+        after_by_uid = dict(zip((x.uid for x in after), result["after"]))
+        for obj in desired:
+            item_result = item_results[obj.uid]
+            item_result["changed"] = obj.uid in before_by_uid or obj.uid in after_by_uid
+            item_result["before"] = before_by_uid.get(obj.uid)
+            item_result["after"] = after_by_uid.get(obj.uid)
+            self.post_state_handling(obj, item_result, item_modules[obj.uid])
+
+    def _adds_to(self, item, merged, param):
+        """Returns if merged only adds to the value of param in item."""
+        old = getattr(item, param, None)
+        new = getattr(merged, param, None)
+        if old is None:
+            return True
+        elif isinstance(old, list) and isinstance(new, list):
+            return set(old).issubset(new)
+
+        return old == new
+
+    def update_params(self, item, params):
+        """Does item.update() for each of the params, in one request.
+
+        Each param's own xpath is edited, or deleted if the param is None, just
+        as item.update() does, so config the SDK does not know about and a vsys
+        importable's imports are left alone.  Several params are sent as one
+        multi-config request, which PAN-OS applies all or nothing.
+
+        Args:
+            item: The pan-os-python object, attached to its parent.
+            params: The names of the sdk params to update.
+        """
+        params = sorted(params)
+        dev = item.nearest_pandevice()
+        if len(params) == 1 or not supports_multi_config(dev):
+            for param in params:
+                item.update(param)
+            return
+
+        self._multi_config(dev, self._param_ops(item, params), item.HA_SYNC)
+
+    def _param_ops(self, item, params):
+        """Returns the (action, xpath, element) ops of item.update() for params."""
+        ops = []
+        for param in params:
+            path, attr, value, var_path = item._get_param_specific_info(param)
+            if var_path.vartype == "attrib":
+                raise NotImplementedError("Cannot update 'attrib' style params")
+            xpath = "{0}/{1}".format(item.xpath(), path)
+
+            if value is None:
+                ops.append(("delete", xpath, None))
+            else:
+                elm = ET.Element(path.split("/")[-1])
+                var_path._set_inner_xml_tag_text(elm, value)
+                ops.append(("edit", xpath, ET.tostring(elm, encoding="unicode")))
+
+        return ops
+
+    def _multi_config(self, dev, ops, retry_on_peer):
+        """Sends (action, xpath, element) ops in chunked multi-config requests."""
+        dev.set_config_changed()
+        chunks = [[]]
+        size = 0
+        for op in ops:
+            op_size = len(op[1]) + len(op[2] or "")
+            if chunks[-1] and size + op_size > _BULK_REQUEST_MAX_SIZE:
+                chunks.append([])
+                size = 0
+            chunks[-1].append(op)
+            size += op_size
+
+        for chunk in chunks:
+            xml = [
+                multi_config_op(num, action, xpath, element)
+                for num, (action, xpath, element) in enumerate(chunk, 1)
+            ]
+            dev.xapi.edit(
+                element="<multi-config>{0}</multi-config>".format("".join(xml)),
+                extra_qs={"action": "multi-config"},
+                retry_on_peer=retry_on_peer,
+            )
+
+    def _bulk_set(self, objs):
+        """Creates / merges objs sharing one xpath with chunked `set` calls."""
+        if not objs:
+            return
+
+        dev = objs[0].nearest_pandevice()
+        dev.set_config_changed()
+
+        # Like create_similar(), the last xpath token is the new root tag.
+        xpath_tokens = objs[0].xpath_short().split("/")
+        new_root = xpath_tokens.pop()
+        xpath = "/".join(xpath_tokens)
+
+        chunks = [[]]
+        size = 0
+        for obj in objs:
+            elm = obj.element()
+            elm_size = len(ET.tostring(elm, encoding="utf-8"))
+            if chunks[-1] and size + elm_size > _BULK_REQUEST_MAX_SIZE:
+                chunks.append([])
+                size = 0
+            chunks[-1].append(elm)
+            size += elm_size
+
+        for chunk in chunks:
+            shared_root = ET.Element(new_root)
+            shared_root.extend(chunk)
+            dev.xapi.set(
+                xpath,
+                ET.tostring(shared_root, encoding="utf-8"),
+                retry_on_peer=objs[0].HA_SYNC,
+            )
+
+    def _bulk_edit(self, objs):
+        """Replaces objs, in multi-config requests if supported."""
+        if not objs:
+            return
+
+        dev = objs[0].nearest_pandevice()
+        if len(objs) == 1 or not supports_multi_config(dev):
+            for obj in objs:
+                obj.apply()
+            return
+
+        ops = [
+            ("edit", x.xpath(), ET.tostring(x.element(), encoding="unicode"))
+            for x in objs
+        ]
+        self._multi_config(dev, ops, objs[0].HA_SYNC)
+
+    def _bulk_update(self, updates):
+        """Does update_params() for (item, params) pairs, in multi-config requests."""
+        if not updates:
+            return
+
+        dev = updates[0][0].nearest_pandevice()
+        if len(updates) == 1 or not supports_multi_config(dev):
+            for item, params in updates:
+                self.update_params(item, params)
+            return
+
+        ops = []
+        for item, params in updates:
+            ops.extend(self._param_ops(item, sorted(params)))
+        self._multi_config(dev, ops, updates[0][0].HA_SYNC)
+
+    def _check_location(self, location, existing_rule, module):
+        """Fails on an improper combination of location / existing_rule."""
+        improper_combo = False
+        improper_combo |= location is None and existing_rule is not None
+        improper_combo |= location in ("before", "after") and existing_rule is None
+        improper_combo |= location in ("top", "bottom") and existing_rule is not None
+        if improper_combo:
+            module.fail_json(
+                msg='Improper combination of "location" / "existing_rule".'
+            )
+
     def apply_position(self, obj, location, existing_rule, module):
         """Moves an object into the given location.
 
@@ -1067,15 +1798,8 @@ class ConnectionHelper(object):
         ref_index = None
 
         # Sanity check the location / existing_rule params.
-        improper_combo = False
-        improper_combo |= location is None and existing_rule is not None
-        improper_combo |= location in ("before", "after") and existing_rule is None
-        improper_combo |= location in ("top", "bottom") and existing_rule is not None
-        if improper_combo:
-            module.fail_json(
-                msg='Improper combination of "location" / "existing_rule".'
-            )
-        elif location is None:
+        self._check_location(location, existing_rule, module)
+        if location is None:
             return False
 
         # Retrieve the current rules.
@@ -1123,6 +1847,84 @@ class ConnectionHelper(object):
         # Done.
         return changed
 
+    def apply_rule_order(
+        self, cls, parent, rule_order, location, existing_rule, module, result
+    ):
+        """Places a list of rules, in the given order, at the given location.
+
+        The rules are placed as one contiguous block, in the order of
+        rule_order, at the top or bottom of the rulebase or before / after
+        existing_rule.  Without a location, only the relative order of the
+        rules is enforced.
+
+        The current rule order is retrieved with a single refreshall(), then
+        plan_moves() finds the fewest moves reaching the desired order.  Only
+        those moves are made.
+
+        Note:  If module.check_mode is True, then this function returns
+        True if a change is needed, but doesn't actually make the change.
+
+        Args:
+            cls: The pandevice class of the rules.
+            parent: The rulebase.
+            rule_order(list): The rule names, in order.
+            location: Location keyword (before, after, top, bottom).
+            existing_rule: The reference for before/after positioning.
+            module: The Ansible module.
+            result(dict): Updated with "moved" and "moves_saved".
+
+        Returns:
+            bool: If a change was needed.
+        """
+        self._check_location(location, existing_rule, module)
+        result["moved"] = []
+        result["moves_saved"] = 0
+        if not rule_order:
+            return False
+        if len(set(rule_order)) != len(rule_order):
+            module.fail_json(msg="Duplicate rules in rule_order")
+        if existing_rule is not None and existing_rule in rule_order:
+            module.fail_json(msg="existing_rule cannot be in rule_order")
+
+        # Retrieve the current rules.
+        try:
+            rules = cls.refreshall(parent, name_only=True)
+        except PanDeviceError as e:
+            module.fail_json(msg="Failed move refresh: {0}".format(e))
+
+        listing = [x.uid for x in rules]
+        missing = set(rule_order).difference(listing)
+        if missing:
+            module.fail_json(
+                msg="Rules not present for move: {0}".format(
+                    ", ".join(x for x in rule_order if x in missing)
+                )
+            )
+
+        try:
+            desired = place_rules(listing, rule_order, location, existing_rule)
+        except ValueError:
+            msg = [
+                "Cannot do relative rule placement",
+                '"{0}" does not exist.'.format(existing_rule),
+            ]
+            module.fail_json(msg="{0}".format(msg))
+
+        moves = plan_moves(listing, desired)
+        result["moved"] = [x[0] for x in moves]
+        result["moves_saved"] = len(rule_order) - len(moves)
+
+        # Perform the moves (if not check mode).
+        if moves and not module.check_mode:
+            by_uid = dict((x.uid, x) for x in rules)
+            for uid, where, ref in moves:
+                try:
+                    by_uid[uid].move(where, ref)
+                except PanDeviceError as e:
+                    module.fail_json(msg="Failed move: {0}".format(e))
+
+        return bool(moves)
+
     def commit(self, module, include_template=False, admins=None):
         """Performs a commit.
 
@@ -1168,18 +1970,31 @@ class ConnectionHelper(object):
                 include_template = True
 
         try:
-            self.device.commit_all(
-                sync=True,
-                sync_all=True,
+            job_id = self.device.commit_all(
                 devicegroup=dg_name,
                 include_template=include_template,
                 exception=True,
             )
             committed = True
+            # Stop at the first device that fails, instead of waiting for all
+            # the devices of the device group to be done first.
+            finished, job = wait_for_push(self.device, job_id, fail_fast=True)
         except PanCommitNotNeeded:
             pass
         except PanDeviceError as e:
             module.fail_json(msg="Failed commit-all: {0}".format(e))
+        else:
+            failed = [
+                "{0}: {1}".format(x["name"], " | ".join(x["messages"]))
+                for x in push_devices(job).values()
+                if x["result"] == "FAIL"
+            ]
+            if failed or job.findtext("result") == "FAIL":
+                module.fail_json(
+                    msg="Failed commit-all: job ID {0}: {1}".format(
+                        job_id, "; ".join(failed)
+                    )
+                )
 
         return committed
 
@@ -1201,13 +2016,20 @@ class ConnectionHelper(object):
     def _describe(self, elm):
         ans = elm.about()
 
-        for module_name, sdk_name in self.ansible_to_sdk_param_mapping.items():
-            if module_name == sdk_name:
-                continue
+        for module_name, sdk_name in self._cls_meta(type(elm)).renames:
             ans[module_name] = ans.pop(sdk_name)
 
         return ans
 
+    def _cls_meta(self, cls):
+        """Returns the _SdkClassMeta of a pan-os-python class, built once."""
+        meta = self._sdk_cls_meta.get(cls)
+        if meta is None:
+            meta = _SdkClassMeta(cls, self)
+            self._sdk_cls_meta[cls] = meta
+
+        return meta
+
     def _get_default_value(self, obj, key):
         """Returns default value for an sdk param in Ansible module.
 
@@ -1220,33 +2042,18 @@ class ConnectionHelper(object):
             fetch from SDK defaults as a fallback.
 
         """
-        # TODO get default values from pan-os-python SDK
-        # obj._params is not public attribute on SDK which provide default values
-        # either make it public accessible or provide a method
-        # NOTE create a temp object with defaults and use values from this temp object
-        # to fetch defaults for None values and set it for the object to create
-        obj_default = obj.__class__()
-        if (default_value := self.default_values.get(key, None)) is None:
-            # set default value from SDK if not found in module default_values
-            default_value = getattr(obj_default, key, None)
+        return copy.copy(self._cls_meta(type(obj)).defaults.get(key))
 
-        return default_value
-
-    def _shlex_split(self, logic):
-        """Split string using shlex.split without escape char
-
-        Escape char '\' is removed from shlex class to correctly process regex.
-        """
-        lex = shlex.shlex(logic, posix=True)
-        lex.whitespace_split = True
-        lex.commenters = ""
-        lex.escape = ""
-
-        return list(lex)
+    def _item_fields(self, item):
+        """Maps the fields of describe(item) to the item's sdk param names."""
+        return self._cls_meta(type(item)).fields
 
     def matches_gathered_filter(self, item, logic):
         """Returns True if the item and its contents matches the logic given.
 
+        The logic is compiled once into a GatheredFilter, which then only
+        reads the fields it needs from each item.
+
         Args:
             item: A pan-os-python instance.
             logic (str): The logic to apply to the item.
@@ -1254,21 +2061,123 @@ class ConnectionHelper(object):
         Returns:
             bool: True if the item matches the logic.
         """
-        err_msg = "Improperly formatted logic string"
-        logic = logic.strip()
-        item_config = self._describe(item)
+        gathered_filter = self._gathered_filters.get(logic)
+        if gathered_filter is None:
+            gathered_filter = GatheredFilter(logic)
+            self._gathered_filters[logic] = gathered_filter
+
+        return gathered_filter.matches(_ItemFields(item, self._item_fields(item)))
+
+
+class _SdkClassMeta(object):
+    """
+    What a ConnectionHelper needs to know about a pan-os-python class.
+
+    Built once per class, so objects handled in bulk do not each create a
+    throwaway instance to read the SDK defaults, or remap the helper's params.
+
+    Attributes:
+        params (tuple): The SDK param names, as in about().
+        defaults (dict): The default of each param, from the module's
+            default_values, else from the SDK.
+        preset_values (dict): The module's preset_values as frozensets.
+        renames (tuple): (ansible name, SDK name) for params named differently.
+        fields (dict): The SDK param name of each field of describe().
+    """
+
+    def __init__(self, cls, helper):
+        # TODO get default values from pan-os-python SDK
+        # obj._params is not public attribute on SDK which provide default values
+        # either make it public accessible or provide a method
+        # NOTE read the defaults from a temp object with no params set
+        sdk_defaults = cls().about()
+        to_sdk = helper.ansible_to_sdk_param_mapping
+
+        # sdk_spec() renames these to the SDK names, but may not have run yet.
+        default_values = dict(
+            (to_sdk.get(k, k), v) for k, v in helper.default_values.items()
+        )
+        self.params = tuple(sdk_defaults)
+        self.defaults = {}
+        for key, sdk_value in sdk_defaults.items():
+            value = default_values.get(key, None)
+            self.defaults[key] = sdk_value if value is None else value
+
+        self.preset_values = dict(
+            (to_sdk.get(k, k), frozenset(v)) for k, v in helper.preset_values.items()
+        )
+        self.renames = tuple((k, v) for k, v in to_sdk.items() if k != v)
 
+        to_ansible = dict((v, k) for k, v in self.renames)
+        self.fields = dict((to_ansible.get(k, k), k) for k in self.params)
+
+
+class _ItemFields(object):
+    """Read-only view of the fields of describe(item), read on access."""
+
+    def __init__(self, item, fields):
+        self.item = item
+        self.fields = fields
+
+    def __contains__(self, field):
+        return field in self.fields
+
+    def __getitem__(self, field):
+        sdk_name = self.fields[field]
+        if sdk_name == self.item.NAME:
+            return self.item.uid
+        return getattr(self.item, sdk_name)
+
+
+class GatheredFilter(object):
+    """A gathered_filter logic string, compiled into a predicate.
+
+    The logic is tokenized and parsed once into closures, with the usual
+    precedence of "not", "and" and "or" and short-circuit evaluation, and
+    regexes and numbers compiled up front.  Matching an item then only reads
+    the fields the logic needs.
+
+    Args:
+        logic (str): The gathered_filter logic.
+    """
+
+    _ERR_MSG = "Improperly formatted logic string"
+    _UNARY = ("is-none", "is-not-none", "is-true", "is-false")
+
+    def __init__(self, logic):
+        logic = logic.strip()
         if not logic:
             raise Exception("no logic given")
 
+        self.fields = set()
         if logic == "*":
-            return True
+            self._predicate = lambda config: True
+            return
 
-        evaler = []
+        self._tokens = self._tokenize(logic)
+        self._pos = 0
+        self._predicate = self._parse_or()
+        if self._pos != len(self._tokens):
+            raise Exception(self._ERR_MSG)
+        del self._tokens
+
+    def matches(self, config):
+        """Returns True if the config matches the logic.
+
+        Args:
+            config: The described item, or a mapping with the same fields.
+        """
+        for field in self.fields:
+            if field not in config:
+                raise Exception("No field named {0}".format(field))
 
+        return bool(self._predicate(config))
+
+    def _tokenize(self, logic):
+        """Splits the logic into "not", "and", "or", parens and predicates."""
+        tokens = []
         pdepth = 0
-        logic_tokens = self._shlex_split(logic)
-        token_iter = iter(logic_tokens)
+        token_iter = iter(_shlex_split(logic))
         while True:
             end_parens = 0
             try:
@@ -1278,15 +2187,15 @@ class ConnectionHelper(object):
 
             while True:
                 if field.startswith("not("):
-                    evaler.append("not")
+                    tokens.append("not")
                     field = field[3:]
 
                 if field.startswith("!("):
-                    evaler.extend(["not", "("])
+                    tokens.extend(["not", "("])
                     field = field[2:]
                     pdepth += 1
                 elif field.startswith("("):
-                    evaler.append("(")
+                    tokens.append("(")
                     field = field[1:]
                     pdepth += 1
                 else:
@@ -1295,154 +2204,351 @@ class ConnectionHelper(object):
             if not field:
                 continue
             elif field in ("&&", "and"):
-                evaler.append("and")
+                tokens.append("and")
                 continue
             elif field in ("||", "or"):
-                evaler.append("or")
+                tokens.append("or")
                 continue
             elif field == "not":
-                evaler.append("not")
+                tokens.append("not")
                 continue
 
             while field.endswith(")"):
                 end_parens += 1
                 pdepth -= 1
                 if pdepth < 0:
-                    raise Exception(err_msg)
+                    raise Exception(self._ERR_MSG)
                 field = field[:-1]
 
             if field.lower() == "true":
-                evaler.append("True")
+                tokens.append(lambda config: True)
                 field = ""
             elif field.lower() == "false":
-                evaler.append("False")
+                tokens.append(lambda config: False)
                 field = ""
 
             if not field:
-                evaler.extend(")" * end_parens)
+                tokens.extend(")" * end_parens)
                 continue
             elif end_parens:
-                raise Exception(err_msg)
-            elif field not in item_config:
-                raise Exception("No field named {0}".format(field))
+                raise Exception(self._ERR_MSG)
+
+            self.fields.add(field)
 
             try:
                 operator = next(token_iter)
             except StopIteration:
-                raise Exception(err_msg)
+                raise Exception(self._ERR_MSG)
 
             operator_list = operator.split(")")
             operator = operator_list[0]
-            if operator == "is-none":
-                evaler.append("{0}".format(item_config[field] is None))
-            elif operator == "is-not-none":
-                evaler.append("{0}".format(item_config[field] is not None))
-            elif operator == "is-true":
-                evaler.append("{0}".format(bool(item_config[field])))
-            elif operator == "is-false":
-                evaler.append("{0}".format(not bool(item_config[field])))
-
-            if operator in ["is-none", "is-not-none", "is-true", "is-false"]:
-                evaler.extend(")" * (len(operator_list) - 1))
+            if operator in self._UNARY:
+                tokens.append(self._compile(field, operator, None))
+                tokens.extend(")" * (len(operator_list) - 1))
                 pdepth -= len(operator_list) - 1
                 continue
 
             if len(operator_list) != 1:
-                raise Exception(err_msg)
+                raise Exception(self._ERR_MSG)
 
             try:
                 value = next(token_iter)
             except StopIteration:
-                raise Exception(err_msg)
+                raise Exception(self._ERR_MSG)
 
             while value.endswith(")"):
                 end_parens += 1
                 pdepth -= 1
                 if pdepth < 0:
-                    raise Exception(err_msg)
+                    raise Exception(self._ERR_MSG)
                 value = value[:-1]
                 if not value:
-                    raise Exception(err_msg)
-
-            if operator == "==":
-                evaler.append("{0}".format("{0}".format(item_config[field]) == value))
-            elif operator == "!=":
-                evaler.append("{0}".format("{0}".format(item_config[field]) != value))
-            elif operator == "<":
-                evaler.append(
-                    "{0}".format(
-                        False if value is None else item_config[field] < float(value)
-                    )
-                )
-            elif operator == "<=":
-                evaler.append(
-                    "{0}".format(
-                        False if value is None else item_config[field] <= float(value)
-                    )
-                )
-            elif operator == ">":
-                evaler.append(
-                    "{0}".format(
-                        False if value is None else item_config[field] > float(value)
-                    )
-                )
-            elif operator == ">=":
-                evaler.append(
-                    "{0}".format(
-                        False if value is None else item_config[field] >= float(value)
-                    )
-                )
-            elif operator == "contains":
-                evaler.append("{0}".format(value in (item_config[field] or [])))
-            elif operator == "does-not-contain":
-                evaler.append("{0}".format(value not in (item_config[field] or [])))
-            elif operator == "starts-with":
-                evaler.append(
-                    "{0}".format((item_config[field] or "").startswith(value))
-                )
-            elif operator == "does-not-start-with":
-                evaler.append(
-                    "{0}".format(not (item_config[field] or "").startswith(value))
-                )
-            elif operator == "ends-with":
-                evaler.append("{0}".format((item_config[field] or "").endswith(value)))
-            elif operator == "does-not-end-with":
-                evaler.append(
-                    "{0}".format(not (item_config[field] or "").endswith(value))
-                )
-            elif operator == "matches-regex":
-                evaler.append(
-                    "{0}".format(
-                        re.search(value, (item_config[field] or "")) is not None
-                    )
-                )
-            elif operator == "does-not-match-regex":
-                evaler.append(
-                    "{0}".format(re.search(value, (item_config[field] or "")) is None)
-                )
-            elif operator == "contains-regex":
-                prog = re.compile(value)
-                evaler.append(
-                    "{0}".format(
-                        any(prog.search(x) for x in (item_config[field] or []))
-                    )
-                )
-            elif operator == "does-not-contain-regex":
-                prog = re.compile(value)
-                evaler.append(
-                    "{0}".format(
-                        not any(prog.search(x) for x in (item_config[field] or []))
-                    )
-                )
-            else:
-                raise Exception("Unknown operator: {0}".format(operator))
+                    raise Exception(self._ERR_MSG)
 
-            evaler.extend(")" * end_parens)
+            tokens.append(self._compile(field, operator, value))
+            tokens.extend(")" * end_parens)
 
         if pdepth != 0:
             raise Exception("Parenthesis depth is inequal: {0}".format(pdepth))
 
-        return bool(eval(" ".join(evaler)))
+        return tokens
+
+    def _compile(self, field, operator, value):
+        """Returns the predicate of a single "<field> <operator> [value]"."""
+        if operator == "is-none":
+            return lambda c: c[field] is None
+        elif operator == "is-not-none":
+            return lambda c: c[field] is not None
+        elif operator == "is-true":
+            return lambda c: bool(c[field])
+        elif operator == "is-false":
+            return lambda c: not bool(c[field])
+        elif operator == "==":
+            return lambda c: "{0}".format(c[field]) == value
+        elif operator == "!=":
+            return lambda c: "{0}".format(c[field]) != value
+        elif operator in ("<", "<=", ">", ">="):
+            number = float(value)
+            if operator == "<":
+                return lambda c: c[field] < number
+            elif operator == "<=":
+                return lambda c: c[field] <= number
+            elif operator == ">":
+                return lambda c: c[field] > number
+            return lambda c: c[field] >= number
+        elif operator == "contains":
+            return lambda c: value in (c[field] or [])
+        elif operator == "does-not-contain":
+            return lambda c: value not in (c[field] or [])
+        elif operator == "starts-with":
+            return lambda c: (c[field] or "").startswith(value)
+        elif operator == "does-not-start-with":
+            return lambda c: not (c[field] or "").startswith(value)
+        elif operator == "ends-with":
+            return lambda c: (c[field] or "").endswith(value)
+        elif operator == "does-not-end-with":
+            return lambda c: not (c[field] or "").endswith(value)
+
+        if operator not in (
+            "matches-regex",
+            "does-not-match-regex",
+            "contains-regex",
+            "does-not-contain-regex",
+        ):
+            raise Exception("Unknown operator: {0}".format(operator))
+
+        prog = re.compile(value)
+        if operator == "matches-regex":
+            return lambda c: prog.search(c[field] or "") is not None
+        elif operator == "does-not-match-regex":
+            return lambda c: prog.search(c[field] or "") is None
+        elif operator == "contains-regex":
+            return lambda c: any(prog.search(x) for x in (c[field] or []))
+        return lambda c: not any(prog.search(x) for x in (c[field] or []))
+
+    def _next(self):
+        token = self._tokens[self._pos] if self._pos < len(self._tokens) else None
+        self._pos += 1
+        return token
+
+    def _peek(self):
+        return self._tokens[self._pos] if self._pos < len(self._tokens) else None
+
+    def _parse_or(self):
+        parts = [self._parse_and()]
+        while self._peek() == "or":
+            self._next()
+            parts.append(self._parse_and())
+
+        if len(parts) == 1:
+            return parts[0]
+        return lambda c: any(x(c) for x in parts)
+
+    def _parse_and(self):
+        parts = [self._parse_not()]
+        while self._peek() == "and":
+            self._next()
+            parts.append(self._parse_not())
+
+        if len(parts) == 1:
+            return parts[0]
+        return lambda c: all(x(c) for x in parts)
+
+    def _parse_not(self):
+        if self._peek() == "not":
+            self._next()
+            operand = self._parse_not()
+            return lambda c: not operand(c)
+
+        token = self._next()
+        if token == "(":
+            ans = self._parse_or()
+            if self._next() != ")":
+                raise Exception(self._ERR_MSG)
+            return ans
+        elif callable(token):
+            return token
+
+        raise Exception(self._ERR_MSG)
+
+
+def _shlex_split(logic):
+    """Split string using shlex.split without escape char
+
+    Escape char '\\' is removed from shlex class to correctly process regex.
+    """
+    lex = shlex.shlex(logic, posix=True)
+    lex.whitespace_split = True
+    lex.commenters = ""
+    lex.escape = ""
+
+    return list(lex)
+
+
+def clone_device(device):
+    """
+    Returns a copy of device with its own API transport.
+
+    pan-python keeps the state of each request on the PanXapi instance, so
+    a device must not be shared between threads.  The copy reuses the API
+    key and version info, so no keygen or "show system info" is performed,
+    and starts with no children.  A firewall reached through Panorama is
+    attached to a copy of its Panorama, so it keeps proxying through it.
+
+    Args:
+        device: The Firewall or Panorama to copy.
+
+    Returns:
+        A Firewall or Panorama for use in another thread.
+    """
+    ans = copy.copy(device)
+    ans.children = []
+    ans.parent = None
+    ans._xapi_private = None
+
+    if hasattr(device.parent, "refresh_devices"):
+        clone_device(device.parent).add(ans)
+
+    xapi = device._xapi_private
+    if HAS_PANDEVICE and isinstance(xapi, HttpApiXapi):
+        ans._xapi_private = HttpApiXapi(
+            api_key=xapi.api_key,
+            hostname=xapi.hostname,
+            port=xapi.port,
+            timeout=device.timeout,
+            serial=xapi.serial,
+            pan_device=ans,
+            connection=Connection(xapi.connection.socket_path),
+        )
+
+    return ans
+
+
+def supports_multi_config(device):
+    """
+    Returns if the device is known to support multi-config requests.
+
+    The version of a firewall reached through Panorama is usually not
+    known, in which case this is False.
+    """
+    version = device._version_info
+    return version is not None and version >= _MULTI_CONFIG_MIN_VERSION
+
+
+def multi_config_op(num, action, xpath, element=None):
+    """
+    Returns one operation of a PAN-OS multi-config request.
+
+    Args:
+        num (int): The id of the operation, which errors refer to.
+        action (str): The config action, such as "set", "edit" or "delete".
+        xpath (str): The xpath to apply the action to.
+        element (str): The element to set or edit.
+
+    Returns:
+        str: The operation's XML.
+    """
+    attrs = "id={0} xpath={1}".format(quoteattr(str(num)), quoteattr(xpath))
+    if element is None:
+        return "<{0} {1}/>".format(action, attrs)
+
+    return "<{0} {1}>{2}</{0}>".format(action, attrs, element)
+
+
+def place_rules(listing, rule_order, location=None, existing_rule=None):
+    """
+    Returns the rulebase order with rule_order placed at the given location.
+
+    The other rules keep their order, and the rule_order block goes at the
+    location.  Without a location, the rules are reordered within the
+    positions they already hold.
+
+    Args:
+        listing(list): The current rule names, in order, including rule_order.
+        rule_order(list): The rule names to place, in order.
+        location(str): Location keyword (before, after, top, bottom).
+        existing_rule(str): The reference for before/after positioning.
+
+    Returns:
+        list: The desired rule names, in order.
+
+    Raises:
+        ValueError: If existing_rule is not in the listing.
+    """
+    block = set(rule_order)
+    others = [x for x in listing if x not in block]
+    if location is None:
+        ordered = iter(rule_order)
+        return [next(ordered) if x in block else x for x in listing]
+
+    if location == "top":
+        idx = 0
+    elif location == "bottom":
+        idx = len(others)
+    else:
+        idx = others.index(existing_rule)
+        if location == "after":
+            idx += 1
+
+    return others[:idx] + list(rule_order) + others[idx:]
+
+
+def plan_moves(current, desired):
+    """
+    Returns the fewest rule moves that turn the current order into desired.
+
+    The rules in the longest subsequence already in the desired order stay
+    put, and every other rule is moved once, right after the rule preceding
+    it in desired (which is either staying put or already moved).
+
+    Args:
+        current(list): The current rule names, in order.
+        desired(list): The same rule names, in the desired order.
+
+    Returns:
+        list: (name, location, existing_rule) tuples, in the order to make
+        them, where location is "top" (existing_rule None) or "after".
+    """
+    # Longest increasing subsequence of the desired positions, in the
+    # current order, in O(n log n).
+    position = dict((uid, num) for num, uid in enumerate(desired))
+    seq = [position[x] for x in current]
+    tails = []
+    tail_idx = []
+    prev = [None] * len(seq)
+    for num, value in enumerate(seq):
+        lo, hi = 0, len(tails)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if tails[mid] < value:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo > 0:
+            prev[num] = tail_idx[lo - 1]
+        if lo == len(tails):
+            tails.append(value)
+            tail_idx.append(num)
+        else:
+            tails[lo] = value
+            tail_idx[lo] = num
+
+    stay = set()
+    num = tail_idx[-1] if tail_idx else None
+    while num is not None:
+        stay.add(current[num])
+        num = prev[num]
+
+    ans = []
+    for num, uid in enumerate(desired):
+        if uid in stay:
+            continue
+        if num == 0:
+            ans.append((uid, "top", None))
+        else:
+            ans.append((uid, "after", desired[num - 1]))
+
+    return ans
 
 
 def get_connection(
@@ -1483,6 +2589,7 @@ def get_connection(
     with_movement=False,
     with_audit_comment=False,
     with_gathered_filter=False,
+    with_bulk_config=False,
     with_update_in_apply_state=False,
     with_set_vlan_reference=False,
     with_set_vsys_reference=False,
@@ -1574,9 +2681,15 @@ def get_connection(
         with_target(bool): Include target and negate_target in the spec (for
             panos.policies objects).
         with_movement(bool): This is a rule module, so move the rule into place.
+            With sdk_params, this also adds `rule_order`, to order a list of
+            rules instead.
         with_audit_comment(bool): This is a rule module, so perform audit comment
             operations.
         with_gathered_filter(bool): Include `gathered_filter` param for network resource modules.
+        with_bulk_config(bool): Include the `config` param, a list of objects to manage
+            in bulk with a single refresh instead of one object per task.
+            With with_movement, `config` is a rulebase and the state may also
+            be "overridden".
         with_update_in_apply_state(bool): `apply_state()` should do `.update(param)` on
             changes instead of `obj.apply()`.
         with_set_vlan_reference(bool): Module should do `set_vlan()` in apply_state().
@@ -1610,7 +2723,6 @@ def get_connection(
     renames = {}
     spec = {
         "provider": {
-            "required": True,
             "type": "dict",
             "required_one_of": [
                 ["password", "api_key"],
@@ -1639,12 +2751,6 @@ def get_connection(
                 "port": {"default": 443, "type": "int"},
             }
         )
-        req.extend(
-            [
-                ["provider", "ip_address"],
-                ["provider", "password", "api_key"],
-            ]
-        )
 
     if with_state:
         spec["state"] = {
@@ -1713,12 +2819,17 @@ def get_connection(
             "choices": ["top", "bottom", "before", "after"],
         }
         spec["existing_rule"] = {}
+        if sdk_params is not None:
+            if "rule_order" in spec:
+                raise KeyError("cannot add 'rule_order' for with_movement")
+            spec["rule_order"] = {"type": "list", "elements": "str"}
 
     if with_audit_comment:
         if "audit_comment" in spec:
             raise KeyError("audit_comment is already in the spec")
         helper.with_audit_comment = True
         spec["audit_comment"] = {}
+        spec["audit_comment_moved"] = {"type": "bool", "default": True}
 
     if vsys_dg is not None:
         if isinstance(vsys_dg, bool):
@@ -1859,6 +2970,9 @@ def get_connection(
         if default_values is not None:
             helper.default_values = default_values
 
+    # Required sdk_params become optional if an alternative param is given.
+    alternatives = []
+
     if with_gathered_filter:
         if "gathered_filter" in spec:
             raise KeyError("cannot add 'gathered_filter' for with_gathered_filter")
@@ -1866,9 +2980,29 @@ def get_connection(
             raise Exception("with_gathered_filter requires sdk_params to be specified")
         helper.with_gathered_filter = True
         spec["gathered_filter"] = {}
+        alternatives.append("gathered_filter")
+
+    if with_bulk_config:
+        if "config" in spec:
+            raise KeyError("cannot add 'config' for with_bulk_config")
+        if sdk_params is None:
+            raise Exception("with_bulk_config requires sdk_params to be specified")
+        if vsys_importable is not None:
+            raise Exception("with_bulk_config does not support importables")
+        helper.with_bulk_config = True
+        helper.bulk_config_spec = copy.deepcopy(sdk_params)
+        spec["config"] = {"type": "list", "elements": "dict"}
+        alternatives.append("config")
+        if with_movement and "state" in spec:
+            spec["state"]["choices"].append("overridden")
+
+    if with_movement and sdk_params is not None:
+        alternatives.append("rule_order")
+
+    if alternatives:
         for k in sdk_params.keys():
             if spec[k].get("required", False):
-                req.append(["gathered_filter", k])
+                req.append(alternatives + [k])
                 spec[k]["required"] = False
 
     if extra_params is not None:
@@ -2008,3 +3142,823 @@ def get_nested_key(d, key_list):
     """
 
     return reduce(lambda val, key: val.get(key) if val else None, key_list, d)
+
+
+class JobTimeoutError(Exception):
+    """Raised by JobPoller when jobs are not finished before the timeout."""
+
+    def __init__(self, msg, pending):
+        super(JobTimeoutError, self).__init__(msg)
+        self.pending = pending
+
+
+def poll_intervals(min_interval=0.5, max_interval=30, backoff=1.5):
+    """
+    Yields the delays between polls: quick at first, as most jobs finish in
+    a few seconds, then growing by backoff each poll up to max_interval.
+
+    :param min_interval: First delay, in seconds.
+    :param max_interval: Max delay, in seconds.
+    :param backoff: Factor applied to the delay after each poll.
+    """
+    interval = min_interval
+    while True:
+        yield interval
+        interval = min(max_interval, interval * backoff)
+
+
+def show_jobs(op):
+    """
+    Returns a JobPoller fetch function that runs "show jobs" commands.
+
+    One job is polled with "show jobs id", several at once with a single
+    "show jobs all", falling back to "show jobs id" for jobs that are no
+    longer listed.
+
+    :param op: Function running an XML op command and returning the root
+        Element of the response.
+    """
+
+    def fetch(job_ids):
+        if len(job_ids) == 1:
+            cmd = "<show><jobs><id>{0}</id></jobs></show>".format(job_ids[0])
+            job = op(cmd).find("./result/job")
+            return {} if job is None else {job_ids[0]: job}
+
+        ans = op("<show><jobs><all/></jobs></show>")
+        jobs = dict((x.findtext("id"), x) for x in ans.findall("./result/job"))
+        for job_id in job_ids:
+            if job_id not in jobs:
+                jobs.update(fetch([job_id]))
+
+        return jobs
+
+    return fetch
+
+
+def check_autocommit(jobs):
+    """
+    Returns if a device is ready after boot, going by its "show jobs all".
+
+    A device is ready once its AutoCom job, if any, has finished OK.
+
+    :param jobs: The job Elements of "show jobs all".
+    """
+    if len(jobs) == 0:
+        return False
+
+    for j in jobs:
+        job_type = j.findtext(".//type")
+        job_result = j.findtext(".//result")
+
+        if job_type is None or job_result is None:
+            return False
+
+        if job_type == "AutoCom" and job_result == "OK":
+            return True
+        elif job_type == "AutoCom":
+            return False
+
+    # If we get to this point, the autocommit job is no longer in the job
+    # history and it is assumed the device is ready.
+    return True
+
+
+class JobPoller(object):
+    """
+    Waits for PAN-OS jobs to finish.
+
+    All the pending jobs are fetched together each poll.  The delay between
+    polls follows poll_intervals(), but when the jobs report their progress,
+    the next poll is timed for when the first pending job is expected to
+    finish (still between min_interval and max_interval).
+
+    :param fetch: Function taking a list of job IDs and returning a dict of
+        job ID to job Element (with "status" and "progress" children) for at
+        least those jobs, such as the one returned by show_jobs().
+    :param timeout: Max time to wait, in seconds, or None to wait forever.
+    :param min_interval: Min delay between polls, in seconds.
+    :param max_interval: Max delay between polls, in seconds.
+    :param backoff: Growth factor of the delay between polls.
+    :param finished: Function telling if a job Element is finished, by
+        default when its status is FIN.
+    """
+
+    def __init__(
+        self,
+        fetch,
+        timeout=600,
+        min_interval=0.5,
+        max_interval=30,
+        backoff=1.5,
+        finished=None,
+    ):
+        self.fetch = fetch
+        self.finished = finished or (lambda job: job.findtext("status") == "FIN")
+        self.timeout = timeout
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.polls = 0
+
+    def wait(self, job_ids, callback=None):
+        """
+        Polls until all the given jobs are finished.
+
+        :param job_ids: List of job IDs.
+        :param callback: Function called with each job's ID and Element as
+            soon as that job is finished.
+        :returns: Dict of job ID to the finished job Element.
+        """
+        pending = [str(x) for x in job_ids]
+        finished = {}
+        started = {}
+        intervals = poll_intervals(self.min_interval, self.max_interval, self.backoff)
+        end_time = time.time() + (
+            self.timeout if self.timeout is not None else float("inf")
+        )
+
+        while True:
+            self.polls += 1
+            now = time.time()
+            jobs = self.fetch(pending)
+
+            eta = None
+            for job_id in list(pending):
+                job = jobs.get(job_id)
+                if job is None:
+                    continue
+                if self.finished(job):
+                    pending.remove(job_id)
+                    finished[job_id] = job
+                    if callback is not None:
+                        callback(job_id, job)
+                    continue
+
+                # Estimate the time left from the progress made since the
+                # job was first seen.
+                try:
+                    progress = float(job.findtext("progress") or 0)
+                except ValueError:
+                    progress = 0
+                first_time, first_progress = started.setdefault(job_id, (now, progress))
+                if progress > first_progress and now > first_time:
+                    left = (
+                        (100 - progress)
+                        * (now - first_time)
+                        / (progress - first_progress)
+                    )
+                    eta = left if eta is None else min(eta, left)
+
+            if not pending:
+                return finished
+
+            delay = next(intervals)
+            if eta is not None:
+                delay = max(self.min_interval, min(self.max_interval, eta))
+
+            remaining = end_time - time.time()
+            if remaining <= 0:
+                raise JobTimeoutError(
+                    "Timed out waiting for job id {0}".format(", ".join(pending)),
+                    pending,
+                )
+
+            time.sleep(min(delay, remaining))
+
+
+def push_devices(job):
+    """
+    Returns the state of each device of a commit-all (push) job, by serial.
+
+    :param job: The job Element of the commit-all job.
+    """
+    devices = {}
+    for entry in job.findall("./devices/entry"):
+        serial = entry.findtext("serial-no")
+        devices[serial] = {
+            "serial": serial,
+            "name": entry.findtext("devicename"),
+            "status": entry.findtext("status"),
+            "result": entry.findtext("result"),
+            "progress": entry.findtext("progress"),
+            "messages": [x.text for x in entry.iterfind("./details//line") if x.text],
+        }
+
+    return devices
+
+
+def wait_for_push(device, job_id, timeout=None, fail_fast=False):
+    """
+    Waits for a commit-all (push) job on Panorama to finish on every device.
+
+    Unlike commit_all(sync_all=True), this can stop waiting as soon as one
+    device fails, instead of waiting for the slowest device first.
+
+    :param device: The Panorama.
+    :param job_id: ID of the commit-all job.
+    :param timeout: Max time to wait, in seconds, or None to wait forever.
+    :param fail_fast: Stop waiting as soon as a device fails.
+    :returns: Tuple of whether the job is finished and the last job Element.
+    """
+    fetch = show_jobs(lambda cmd: device.op(cmd, cmd_xml=False))
+    last = {}
+
+    def fetch_job(job_ids):
+        last.update(fetch(job_ids))
+        return last
+
+    def finished(job):
+        results = [x.findtext("result") for x in job.iterfind("./devices/entry")]
+        if fail_fast and "FAIL" in results:
+            return True
+        return job.findtext("status") == "FIN" and "PEND" not in results
+
+    poller = JobPoller(fetch_job, timeout=timeout, finished=finished)
+
+    try:
+        poller.wait([job_id])
+    except JobTimeoutError:
+        return False, last.get(str(job_id))
+
+    return True, last[str(job_id)]
+
+
+class ShellTimeoutError(Exception):
+    """Raised by ShellExpect when the expected prompt is not received in time."""
+
+    def __init__(self, msg, output):
+        super(ShellTimeoutError, self).__init__(msg)
+        self.output = output
+
+
+class ShellExpect(object):
+    """
+    Waits for prompts on an interactive ssh shell, such as a paramiko channel.
+
+    The shell is waited on with select(), so no CPU is used while the device
+    is busy.  Only the output received since the last line already scanned is
+    searched on each read, instead of the whole output.
+
+    Args:
+        shell: The interactive shell, with send(), recv() and fileno().
+        timeout (float): The default timeout of each expect(), in seconds.
+        recv_size (int): The max bytes per recv().
+    """
+
+    def __init__(self, shell, timeout=60, recv_size=4096):
+        self.shell = shell
+        self.timeout = timeout
+        self.recv_size = recv_size
+        self.buffer = ""
+        self.output = ""
+
+    @staticmethod
+    def prompt(char):
+        """Returns the pattern of a prompt ending in the given character."""
+        return re.compile(r"{0}\s*\Z".format(re.escape(char)))
+
+    def send(self, data):
+        """Sends data to the shell."""
+        self.shell.send(data)
+
+    def expect(self, pattern, timeout=None):
+        """
+        Waits for the output of the shell to match the pattern.
+
+        Args:
+            pattern: A regex string or compiled pattern.
+            timeout (float): Seconds to wait, defaulting to self.timeout.
+
+        Returns:
+            str: The output received up to and including the match.
+
+        Raises:
+            ShellTimeoutError: If the pattern is not matched in time.
+            EOFError: If the shell is closed first.
+        """
+        if not hasattr(pattern, "search"):
+            pattern = re.compile(pattern)
+        if timeout is None:
+            timeout = self.timeout
+
+        end_time = time.time() + timeout
+        pos = 0
+        while True:
+            match = pattern.search(self.buffer, pos)
+            if match is not None:
+                ans = self.buffer[: match.end()]
+                self.buffer = self.buffer[match.end() :]
+                self.output += ans
+                return ans
+
+            # Prompts are within a line, so rescan only from the last one.
+            pos = self.buffer.rfind("\n") + 1
+
+            remaining = end_time - time.time()
+            if remaining <= 0:
+                raise ShellTimeoutError("Timeout waiting for prompt", self.buffer)
+
+            readable, _, _ = select.select([self.shell], [], [], remaining)
+            if not readable:
+                continue
+
+            data = self.shell.recv(self.recv_size)
+            if not data:
+                raise EOFError("Shell closed waiting for prompt")
+            self.buffer += to_text(data, errors="surrogate_or_replace")
+
+
+# Where the firewall keeps the rules, in match order, relative to /config.
+POLICY_RULEBASES = (
+    ("panorama-pre-rulebase", "panorama/vsys/entry[@name='{0}']/pre-rulebase"),
+    (
+        "firewall-rulebase",
+        "devices/entry[@name='localhost.localdomain']/vsys/entry[@name='{0}']/rulebase",
+    ),
+    ("panorama-post-rulebase", "panorama/vsys/entry[@name='{0}']/post-rulebase"),
+)
+
+_POLICY_PROTOCOLS = {6: "tcp", 17: "udp", 132: "sctp"}
+_PREDEFINED_SERVICES = {
+    "service-http": ("tcp", "80,8080"),
+    "service-https": ("tcp", "443"),
+}
+
+
+class PolicyMatchUnknown(Exception):
+    """Raised by PolicyMatcher when only the device can match the flow."""
+
+
+def _match_all(checks):
+    """Three-valued "and" of the checks: True, False, or None for unknown."""
+    ans = True
+    for check in checks:
+        value = check()
+        if value is False:
+            return False
+        elif value is None:
+            ans = None
+    return ans
+
+
+def _is_any(values):
+    return not values or "any" in values
+
+
+def _as_list(value):
+    if value is None or isinstance(value, list):
+        return value
+    return [value]
+
+
+def ip_range(value):
+    """Returns (version, first, last) of an IP, network or IP range, or None."""
+    try:
+        if "-" in value:
+            first, last = [ipaddress.ip_address(x.strip()) for x in value.split("-", 1)]
+            if first.version != last.version:
+                return None
+            return first.version, int(first), int(last)
+        net = ipaddress.ip_network(to_text(value.strip()), strict=False)
+    except ValueError:
+        return None
+
+    return net.version, int(net.network_address), int(net.broadcast_address)
+
+
+def port_ranges(value):
+    """Returns the (first, last) ranges of a port string like "80,8000-8080"."""
+    ans = []
+    for token in (value or "").split(","):
+        token = token.strip()
+        if not token:
+            continue
+        first, _, last = token.partition("-")
+        ans.append((int(first), int(last or first)))
+    return ans
+
+
+class IntervalSet(object):
+    """Merged, sorted [first, last] integer intervals, searched with bisect."""
+
+    def __init__(self, intervals):
+        merged = []
+        for first, last in sorted(intervals):
+            if merged and first <= merged[-1][1] + 1:
+                merged[-1][1] = max(merged[-1][1], last)
+            else:
+                merged.append([first, last])
+        self.starts = [x[0] for x in merged]
+        self.ends = [x[1] for x in merged]
+
+    def __contains__(self, value):
+        idx = bisect.bisect_right(self.starts, value) - 1
+        return idx >= 0 and value <= self.ends[idx]
+
+
+class PolicyMatcher(object):
+    """
+    First-match lookups of flows against a firewall's rules, in memory.
+
+    The rules and the address, service, application group and URL category
+    objects they use are loaded from one copy of the firewall's config, with
+    address and port sets resolved into merged intervals once per distinct
+    rule value.
+
+    A rule either matches, does not match, or cannot be decided locally:
+    App-ID, User-ID, URL categories, HIP profiles, schedules, FQDN and
+    dynamic addresses and application-default services are left to the
+    device.  match() raises PolicyMatchUnknown when the first rule that
+    does not clearly fail to match is undecided.
+
+    Args:
+        config: The <config> element of the firewall's running config.
+        vsys (str): The vsys of the rules.
+        template: A SecurityRule or NatRule attached to the firewall, which
+            is used to parse the rules.
+    """
+
+    def __init__(self, config, vsys, template):
+        self.config = config
+        self.vsys = vsys
+        self.is_nat = template.__class__.__name__ == "NatRule"
+        self._scopes = [
+            config.find(
+                "devices/entry[@name='localhost.localdomain']/vsys/entry[@name='{0}']".format(
+                    vsys
+                )
+            ),
+            config.find("panorama/vsys/entry[@name='{0}']".format(vsys)),
+            config.find("shared"),
+            config.find("panorama/shared"),
+        ]
+        self._scopes = [x for x in self._scopes if x is not None]
+        self._index = {}
+        self._addresses_cache = {}
+        self._services_cache = {}
+
+        rtype = "nat" if self.is_nat else "security"
+        self.rulebases = []
+        self.rules_by_name = {}
+        for rulebase, path in POLICY_RULEBASES:
+            elm = config.find("{0}/{1}/rules".format(path.format(vsys), rtype))
+            rules = template.refreshall_from_xml(elm) if elm is not None else []
+            self.rulebases.append((rulebase, rules))
+            for rule in rules:
+                self.rules_by_name.setdefault(rule.uid, (rulebase, rule))
+
+    def match(self, flow):
+        """
+        Returns the (rulebase, rule) first matching the flow.
+
+        Args:
+            flow(dict): The flow, keyed by the panos_match_rule param names.
+
+        Returns:
+            tuple: (rulebase, rule), or (None, None) if no rule matches.
+
+        Raises:
+            PolicyMatchUnknown: If the device is needed to match the flow.
+        """
+        flow = dict(flow)
+        for key in ("source_ip", "destination_ip"):
+            flow[key] = ipaddress.ip_address(to_text(flow[key]))
+
+        for rulebase, rules in self.rulebases:
+            for rule in rules:
+                if rule.disabled:
+                    continue
+                if self.is_nat:
+                    ans = self._match_nat(rule, flow)
+                else:
+                    ans = self._match_security(rule, flow)
+                if ans:
+                    return rulebase, rule
+                elif ans is None:
+                    raise PolicyMatchUnknown(
+                        'Rule "{0}" needs the device to match'.format(rule.uid)
+                    )
+
+        return None, None
+
+    def _match_security(self, rule, flow):
+        return _match_all(
+            (
+                lambda: self._zones(rule, flow),
+                lambda: self._address(
+                    rule.source, rule.negate_source, flow["source_ip"]
+                ),
+                lambda: self._address(
+                    rule.destination, rule.negate_destination, flow["destination_ip"]
+                ),
+                lambda: self._service(rule.service, flow),
+                lambda: self._application(rule.application, flow["application"]),
+                lambda: self._literal(rule.source_user, flow["source_user"]),
+                lambda: self._category(rule.category, flow["category"]),
+                lambda: _is_any(rule.hip_profiles) or None,
+                lambda: _is_any(rule.source_devices) or None,
+                lambda: _is_any(rule.destination_devices) or None,
+                lambda: rule.schedule is None or None,
+            )
+        )
+
+    def _match_nat(self, rule, flow):
+        return _match_all(
+            (
+                lambda: rule.nat_type in (None, "ipv4") or None,
+                lambda: self._member(rule.fromzone, flow["source_zone"]),
+                lambda: self._member(rule.tozone, flow["destination_zone"]),
+                lambda: self._member(rule.to_interface, flow["to_interface"]),
+                lambda: self._address(rule.source, False, flow["source_ip"]),
+                lambda: self._address(rule.destination, False, flow["destination_ip"]),
+                lambda: self._service(rule.service, flow),
+            )
+        )
+
+    def _zones(self, rule, flow):
+        src, dst = flow["source_zone"], flow["destination_zone"]
+        if rule.type == "intrazone":
+            if src is None or dst is None:
+                return None
+            return src == dst and self._member(rule.fromzone, src)
+        ans = _match_all(
+            (
+                lambda: self._member(rule.fromzone, src),
+                lambda: self._member(rule.tozone, dst),
+            )
+        )
+        if ans is not False and rule.type == "interzone":
+            if src is None or dst is None:
+                return None
+            return src != dst and ans
+        return ans
+
+    @staticmethod
+    def _member(values, value):
+        values = _as_list(values)
+        if _is_any(values):
+            return True
+        elif value is None:
+            return None
+        return value in values
+
+    @staticmethod
+    def _literal(values, value):
+        """Matches names that may also be groups the device resolves."""
+        if _is_any(values):
+            return True
+        elif value is not None and value in values:
+            return True
+        return None
+
+    def _find(self, kind, name):
+        """Returns the named entry of the kind, from the nearest scope."""
+        index = self._index.get(kind)
+        if index is None:
+            index = {}
+            for scope in self._scopes:
+                for elm in scope.findall("{0}/entry".format(kind)):
+                    index.setdefault(elm.attrib.get("name"), elm)
+            self._index[kind] = index
+        return index.get(name)
+
+    def _address(self, names, negate, ip):
+        names = _as_list(names)
+        if _is_any(names):
+            return not negate
+
+        key = tuple(names)
+        ans = self._addresses_cache.get(key)
+        if ans is None:
+            ranges = {}
+            resolved = all([self._resolve_address(x, ranges, set()) for x in names])
+            ans = (
+                dict((k, IntervalSet(v)) for k, v in ranges.items()),
+                resolved,
+            )
+            self._addresses_cache[key] = ans
+
+        ranges, resolved = ans
+        if ip.version in ranges and int(ip) in ranges[ip.version]:
+            found = True
+        elif not resolved:
+            return None
+        else:
+            found = False
+        return found != bool(negate)
+
+    def _resolve_address(self, name, ranges, seen):
+        """Adds the ranges of an address name; returns False if unresolved."""
+        if name in seen:
+            return True
+        seen.add(name)
+
+        values = []
+        elm = self._find("address", name)
+        if elm is not None:
+            for tag in ("ip-netmask", "ip-range"):
+                values.extend(x.text for x in elm.findall(tag))
+            if not values:
+                return False
+        else:
+            elm = self._find("address-group", name)
+            if elm is not None:
+                if elm.find("dynamic") is not None:
+                    return False
+                return all(
+                    [
+                        self._resolve_address(x.text, ranges, seen)
+                        for x in elm.findall("static/member")
+                    ]
+                )
+            values.append(name)
+
+        for value in values:
+            ans = ip_range(value or "")
+            if ans is None:
+                return False
+            ranges.setdefault(ans[0], []).append(ans[1:])
+        return True
+
+    def _service(self, names, flow):
+        names = _as_list(names)
+        if _is_any(names):
+            return True
+        elif "application-default" in names:
+            return None
+
+        key = tuple(names)
+        ans = self._services_cache.get(key)
+        if ans is None:
+            services = []
+            resolved = all([self._resolve_service(x, services, set()) for x in names])
+            ans = (services, resolved)
+            self._services_cache[key] = ans
+
+        services, resolved = ans
+        protocol = _POLICY_PROTOCOLS.get(flow["protocol"])
+        dport, sport = flow["destination_port"], flow["source_port"]
+        if dport is None:
+            return None
+        for proto, dports, sports in services:
+            if proto != protocol or dport not in dports:
+                continue
+            if sports is None or (sport is not None and sport in sports):
+                return True
+            elif sport is None:
+                resolved = False
+        return None if not resolved else False
+
+    def _resolve_service(self, name, services, seen):
+        """Adds the ports of a service name; returns False if unresolved."""
+        if name in seen:
+            return True
+        seen.add(name)
+
+        elm = self._find("service", name)
+        if elm is not None:
+            for proto in ("tcp", "udp", "sctp"):
+                spec = elm.find("protocol/{0}".format(proto))
+                if spec is None:
+                    continue
+                sports = spec.find("source-port")
+                services.append(
+                    (
+                        proto,
+                        IntervalSet(port_ranges(spec.findtext("port"))),
+                        (
+                            None
+                            if sports is None
+                            else IntervalSet(port_ranges(sports.text))
+                        ),
+                    )
+                )
+                return True
+            return False
+
+        elm = self._find("service-group", name)
+        if elm is not None:
+            return all(
+                [
+                    self._resolve_service(x.text, services, seen)
+                    for x in elm.findall("members/member")
+                ]
+            )
+
+        if name in _PREDEFINED_SERVICES:
+            proto, ports = _PREDEFINED_SERVICES[name]
+            services.append((proto, IntervalSet(port_ranges(ports)), None))
+            return True
+
+        return False
+
+    def _application(self, names, application):
+        names = _as_list(names)
+        if _is_any(names):
+            return True
+        elif application is None:
+            return None
+
+        seen = set()
+        pending = list(names)
+        while pending:
+            name = pending.pop()
+            if name == application:
+                return True
+            elif name in seen:
+                continue
+            seen.add(name)
+            elm = self._find("application-group", name)
+            if elm is not None:
+                pending.extend(x.text for x in elm.findall("members/member"))
+
+        # Applications have containers and implicit members, so only the
+        # device knows.
+        return None
+
+    def _category(self, names, category):
+        names = _as_list(names)
+        if _is_any(names):
+            return True
+        elif category is None:
+            return None
+        elif category in names:
+            return True
+
+        for name in names:
+            if self._find("profiles/custom-url-category", name) is not None:
+                return None
+        return False
+
+
+class SnapshotStore(object):
+    """
+    A local content-addressed store of state snapshots.
+
+    Each snapshot area is saved as gzipped, canonical JSON named by the
+    sha256 of its content, so an area that has not changed since an earlier
+    snapshot is stored only once.  A snapshot is referenced by a small handle
+    mapping each area to its digest.
+
+    Args:
+        path (str): The directory of the store, created if missing.
+    """
+
+    def __init__(self, path):
+        self.path = os.path.abspath(os.path.expanduser(path))
+
+    @staticmethod
+    def is_handle(value):
+        """Returns if the value is a handle returned by save()."""
+        return (
+            isinstance(value, dict)
+            and set(value) == set(["store", "areas"])
+            and isinstance(value["areas"], dict)
+        )
+
+    def _object_path(self, digest):
+        return os.path.join(self.path, digest[:2], digest + ".json.gz")
+
+    def put(self, data):
+        """Saves one area's data, returning its digest."""
+        content = json.dumps(data, sort_keys=True, separators=(",", ":")).encode(
+            "utf-8"
+        )
+        digest = hashlib.sha256(content).hexdigest()
+        fname = self._object_path(digest)
+        if os.path.exists(fname):
+            return digest
+
+        dirname = os.path.dirname(fname)
+        os.makedirs(dirname, exist_ok=True)
+
+        # Write to a temp file first so readers never see a partial object.
+        fd, tmp = tempfile.mkstemp(dir=dirname)
+        try:
+            with os.fdopen(fd, "wb") as raw:
+                with gzip.GzipFile(fileobj=raw, mode="wb", mtime=0) as gz:
+                    gz.write(content)
+            os.rename(tmp, fname)
+        except Exception:
+            os.unlink(tmp)
+            raise
+
+        return digest
+
+    def get(self, digest):
+        """Loads one area's data by its digest."""
+        with gzip.open(self._object_path(digest), "rb") as fd:
+            return json.loads(fd.read().decode("utf-8"))
+
+    def save(self, snapshot):
+        """Saves each area of the snapshot, returning the snapshot's handle."""
+        return dict(
+            store=self.path,
+            areas=dict((k, self.put(v)) for k, v in snapshot.items()),
+        )
+
+    @classmethod
+    def open(cls, handle):
+        """Returns the store of the handle."""
+        return cls(handle["store"])
@@ -42,6 +42,7 @@ extends_documentation_fragment:
     - paloaltonetworks.panos.fragments.network_resource_module_state
     - paloaltonetworks.panos.fragments.deprecated_commit
     - paloaltonetworks.panos.fragments.gathered_filter
+    - paloaltonetworks.panos.fragments.bulk_config
 options:
     name:
         description:
@@ -106,6 +107,7 @@ def main():
         with_classic_provider_spec=True,
         with_network_resource_module_state=True,
         with_gathered_filter=True,
+        with_bulk_config=True,
         with_commit=True,
         sdk_cls=("objects", "AddressGroup"),
         sdk_params=dict(
@@ -42,6 +42,7 @@ extends_documentation_fragment:
     - paloaltonetworks.panos.fragments.network_resource_module_state
     - paloaltonetworks.panos.fragments.deprecated_commit
     - paloaltonetworks.panos.fragments.gathered_filter
+    - paloaltonetworks.panos.fragments.bulk_config
 options:
     name:
         description:
@@ -99,6 +100,16 @@ EXAMPLES = """
     provider: '{{ provider }}'
     name: 'Test-Two'
     state: 'absent'
+
+- name: Create many objects in a single task
+  paloaltonetworks.panos.panos_address_object:
+    provider: '{{ provider }}'
+    config:
+      - name: 'web-01'
+        value: '10.0.0.1'
+      - name: 'web-02'
+        value: '10.0.0.2'
+        tag: ['Prod']
 """
 
 RETURN = """
@@ -119,6 +130,7 @@ def main():
         with_network_resource_module_state=True,
         with_commit=True,
         with_gathered_filter=True,
+        with_bulk_config=True,
         sdk_cls=("objects", "AddressObject"),
         sdk_params=dict(
             name=dict(required=True),
@@ -79,10 +79,12 @@ status:
 
 
 import sys
-import time
 
-from ansible.module_utils._text import to_text
 from ansible.module_utils.basic import AnsibleModule
+from ansible_collections.paloaltonetworks.panos.plugins.module_utils.panos import (
+    ShellExpect,
+    ShellTimeoutError,
+)
 
 try:
     import paramiko
@@ -91,23 +93,12 @@ try:
 except ImportError:
     HAS_LIB = False
 
-_PROMPTBUFF = 4096
-
 
 def wait_with_timeout(module, shell, prompt, timeout=60):
-    now = time.time()
-    result = ""
-    while True:
-        if shell.recv_ready():
-            result += to_text(shell.recv(_PROMPTBUFF))
-            endresult = result.strip()
-            if len(endresult) != 0 and endresult[-1] == prompt:
-                break
-
-        if time.time() - now > timeout:
-            module.fail_json(msg="Timeout waiting for prompt")
-
-    return result
+    try:
+        return shell.expect(ShellExpect.prompt(prompt), timeout)
+    except ShellTimeoutError:
+        module.fail_json(msg="Timeout waiting for prompt")
 
 
 def set_panwfw_password(module, ip_address, key_filename, newpassword, username):
@@ -120,7 +111,7 @@ def set_panwfw_password(module, ip_address, key_filename, newpassword, username)
     ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
 
     ssh.connect(ip_address, username=username, key_filename=key_filename)
-    shell = ssh.invoke_shell()
+    shell = ShellExpect(ssh.invoke_shell())
 
     # wait for the shell to start
     buff = wait_with_timeout(module, shell, ">")
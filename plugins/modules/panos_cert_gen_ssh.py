@@ -98,9 +98,11 @@ RETURN = """
 """
 
 
-import time
-
 from ansible.module_utils.basic import AnsibleModule
+from ansible_collections.paloaltonetworks.panos.plugins.module_utils.panos import (
+    ShellExpect,
+    ShellTimeoutError,
+)
 
 try:
     import paramiko
@@ -109,23 +111,12 @@ try:
 except ImportError:
     HAS_LIB = False
 
-_PROMPTBUFF = 4096
-
 
 def wait_with_timeout(module, shell, prompt, timeout=60):
-    now = time.time()
-    result = ""
-    while True:
-        if shell.recv_ready():
-            result += shell.recv(_PROMPTBUFF)
-            endresult = result.strip()
-            if len(endresult) != 0 and endresult[-1] == prompt:
-                break
-
-        if time.time() - now > timeout:
-            module.fail_json(msg="Timeout waiting for prompt")
-
-    return result
+    try:
+        return shell.expect(ShellExpect.prompt(prompt), timeout)
+    except ShellTimeoutError:
+        module.fail_json(msg="Timeout waiting for prompt")
 
 
 def generate_cert(
@@ -152,7 +143,7 @@ def generate_cert(
     else:
         client.connect(ip_address, username=username, key_filename=key_filename)
 
-    shell = client.invoke_shell()
+    shell = ShellExpect(client.invoke_shell())
     # wait for the shell to start
     buff = wait_with_timeout(module, shell, ">")
     stdout += buff
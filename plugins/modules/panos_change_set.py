@@ -0,0 +1,103 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+#  Copyright 2026 Palo Alto Networks, Inc
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+from __future__ import absolute_import, division, print_function
+
+__metaclass__ = type
+
+DOCUMENTATION = """
+---
+module: panos_change_set
+short_description: Send or drop the config changes deferred by the httpapi connection.
+description:
+    - With the I(defer_writes) option of the C(paloaltonetworks.panos.panos) httpapi
+      connection, config changes made by the modules are queued in the connection
+      instead of being sent one by one.
+    - This module sends the queued changes as one C(multi-config) request, which PAN-OS
+      applies all or nothing, or drops them.
+    - The commit modules send the queued changes before committing, so this is only
+      needed to apply them without a commit, or to check them for errors at a given
+      point of a play.
+    - Tasks that queue changes return a warning saying so.  Changes still queued when
+      the connection is closed are discarded with a warning, so a play that does not
+      commit should end with this module.
+author: "Palo Alto Networks (@PaloAltoNetworks)"
+version_added: '3.5.0'
+notes:
+    - Only works with the C(paloaltonetworks.panos.panos) httpapi connection.
+    - Panorama is supported.
+    - Check mode is supported.
+options:
+    state:
+        description:
+            - B(flushed) sends the queued changes, B(discarded) drops them.
+        type: str
+        choices: ['flushed', 'discarded']
+        default: flushed
+"""
+
+EXAMPLES = """
+- name: Apply the queued changes without committing
+  paloaltonetworks.panos.panos_change_set:
+
+- name: Drop the queued changes
+  paloaltonetworks.panos.panos_change_set:
+    state: discarded
+"""
+
+RETURN = """
+changes:
+    description: How many queued changes were sent or dropped.
+    returned: always
+    type: int
+    sample: 42
+"""
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.connection import Connection, ConnectionError
+
+
+def main():
+    module = AnsibleModule(
+        argument_spec=dict(
+            state=dict(default="flushed", choices=["flushed", "discarded"]),
+        ),
+        supports_check_mode=True,
+    )
+
+    if getattr(module, "_socket_path", None) is None:
+        module.fail_json(
+            msg="This module requires the paloaltonetworks.panos.panos httpapi connection"
+        )
+
+    conn = Connection(module._socket_path)
+
+    try:
+        changes = conn.pending_changes()
+        if changes and not module.check_mode:
+            if module.params["state"] == "flushed":
+                changes = conn.flush_changes()
+            else:
+                changes = conn.discard_changes()
+    except ConnectionError as e:
+        module.fail_json(msg="{0}".format(e))
+
+    module.exit_json(changed=changes > 0, changes=changes)
+
+
+if __name__ == "__main__":
+    main()
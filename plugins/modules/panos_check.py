@@ -48,11 +48,15 @@ options:
     timeout:
         description:
             - Length of time (in seconds) to wait for jobs to finish.
+            - This also bounds the retries of the connection to the device, which
+              back off exponentially (up to 30 seconds apart) while it is down.
         default: 60
         type: int
     interval:
         description:
             - Length of time (in seconds) to wait between checks.
+            - If 0, checks are a fraction of a second apart at first and then
+              back off, up to 10 seconds apart.
         default: 0
         type: int
 """
@@ -75,14 +79,27 @@ EXAMPLES = """
 
 RETURN = """
 # Default return values
+connection_attempts:
+    description: Number of attempts made to connect to the device.
+    returned: always
+    type: int
+    sample: 3
+connection_elapsed:
+    description: Seconds spent connecting to the device, including the backoff between attempts.
+    returned: always
+    type: float
+    sample: 3.52
 """
 
 
+import itertools
 import time
 
 from ansible.module_utils.basic import AnsibleModule
 from ansible_collections.paloaltonetworks.panos.plugins.module_utils.panos import (
+    check_autocommit,
     get_connection,
+    poll_intervals,
 )
 
 try:
@@ -94,27 +111,6 @@ except ImportError:
         pass
 
 
-def check_jobs(jobs):
-    if len(jobs) == 0:
-        return False
-
-    for j in jobs:
-        job_type = j.findtext(".//type")
-        job_result = j.findtext(".//result")
-
-        if job_type is None or job_result is None:
-            return False
-
-        if job_type == "AutoCom" and job_result == "OK":
-            return True
-        elif job_type == "AutoCom":
-            return False
-
-    # If we get to this point, the autocommit job is no longer in the job
-    # history and it is assumed the device is ready.
-    return True
-
-
 def main():
     helper = get_connection(
         with_classic_provider_spec=True,
@@ -139,6 +135,11 @@ def main():
     interval = module.params["interval"]
     end_time = time.time() + timeout
 
+    if interval:
+        intervals = itertools.repeat(interval)
+    else:
+        intervals = poll_intervals(max_interval=10)
+
     parent = helper.get_pandevice_parent(module, timeout)
 
     while True:
@@ -148,15 +149,24 @@ def main():
             pass
         else:
             jobs = ans.findall(".//job")
-            if check_jobs(jobs):
+            if check_autocommit(jobs):
                 break
 
         if time.time() > end_time:
-            module.fail_json(msg="Timeout reached.")
-
-        time.sleep(interval)
-
-    module.exit_json(changed=True, msg="Device is ready.")
+            module.fail_json(
+                msg="Timeout reached.",
+                connection_attempts=helper.connection_attempts,
+                connection_elapsed=helper.connection_elapsed,
+            )
+
+        time.sleep(next(intervals))
+
+    module.exit_json(
+        changed=True,
+        msg="Device is ready.",
+        connection_attempts=helper.connection_attempts,
+        connection_elapsed=helper.connection_elapsed,
+    )
 
 
 if __name__ == "__main__":
@@ -37,6 +37,7 @@ options:
     style:
         description:
             - The type of configuration element to push.
+            - Required unless I(job_id) is specified.
         type: str
         choices:
             - device group
@@ -45,7 +46,6 @@ options:
             - log collector group
             - wildfire appliance
             - wildfire cluster
-        required: True
     name:
         description:
             - The name of the configuration element to push.
@@ -76,9 +76,34 @@ options:
         elements: str
     sync:
         description:
-            - Wait for the commit to complete.
+            - Wait for the commit to complete on all the devices.
+            - If false, the job ID and the devices of the push are returned
+              right away, and I(job_id) can be used to wait for it later.
         type: bool
         default: True
+    job_id:
+        description:
+            - Instead of pushing, wait for this push job to complete on all the
+              devices, such as one started with I(sync=false).
+        type: int
+        version_added: 3.5.0
+    fail_fast:
+        description:
+            - When waiting, fail as soon as the push fails on one device
+              instead of waiting for all the devices first.
+        type: bool
+        default: False
+        version_added: 3.5.0
+    timeout:
+        description:
+            - When waiting, max time to wait for the push to complete, in
+              seconds.
+            - If the push is not complete by then, the module returns with
+              I(finished=false) and the current state of each device, so it
+              can be retried with I(job_id) until it is.
+            - If not specified, wait until the push is complete.
+        type: int
+        version_added: 3.5.0
 """
 
 EXAMPLES = """
@@ -123,6 +148,24 @@ EXAMPLES = """
     - Staging Firewalls
     - Development Firewalls
 
+- name: push to a large device group without waiting
+  paloaltonetworks.panos.panos_commit_push:
+    provider: '{{ credentials }}'
+    style: 'device group'
+    name: 'Branch Firewalls'
+    sync: false
+  register: push
+
+- name: wait for the push, failing on the first device error
+  paloaltonetworks.panos.panos_commit_push:
+    provider: '{{ credentials }}'
+    job_id: '{{ push.jobid }}'
+    fail_fast: true
+    timeout: 60
+  register: result
+  until: result.finished
+  retries: 30
+
 - name: push admin-specific changes to a device group
   paloaltonetworks.panos.panos_commit_push:
     provider: "{{ credentials }}"
@@ -138,14 +181,37 @@ jobid:
   type: int
   returned: always
   sample: 49152
+finished:
+  description: If the push is complete on all the devices.
+  type: bool
+  returned: always
+  sample: true
+devices:
+  description:
+    - State of the push on each device, by serial number.
+    - With I(sync=false), this is the state right after starting the push,
+      and can be empty if the push has not been dispatched to the devices yet.
+  type: dict
+  returned: always
+  sample:
+    "007000001222":
+      serial: "007000001222"
+      name: "fw-branch-01"
+      status: "FIN"
+      result: "OK"
+      progress: "100"
+      messages: []
 """
 
 from ansible.module_utils.basic import AnsibleModule
 from ansible_collections.paloaltonetworks.panos.plugins.module_utils.panos import (
     get_connection,
+    push_devices,
+    wait_for_push,
 )
 
 try:
+    from panos.errors import PanDeviceError
     from panos.panorama import PanoramaCommitAll
 except ImportError:
     pass
@@ -165,7 +231,6 @@ def main():
                     "wildfire appliance",
                     "wildfire cluster",
                 ],
-                required=True,
             ),
             name=dict(type="str"),
             description=dict(type="str"),
@@ -174,61 +239,94 @@ def main():
             force_template_values=dict(type="bool", default=False),
             devices=dict(type="list", elements="str"),
             sync=dict(type="bool", default=True),
+            job_id=dict(type="int"),
+            fail_fast=dict(type="bool", default=False),
+            timeout=dict(type="int"),
         ),
     )
 
     module = AnsibleModule(
         argument_spec=helper.argument_spec,
         supports_check_mode=False,
-        required_one_of=helper.required_one_of,
+        required_one_of=helper.required_one_of + [["style", "job_id"]],
     )
 
     # Verify libs are present, get the parent object.
     parent = helper.get_pandevice_parent(module)
 
-    # Construct the commit command
-    cmd = PanoramaCommitAll(
-        style=module.params["style"],
-        name=module.params["name"],
-        description=module.params["description"],
-        admins=module.params["admins"],
-        include_template=module.params["include_template"],
-        force_template_values=module.params["force_template_values"],
-        devices=module.params["devices"],
-    )
-
-    # Execute the commit
-    commit_results = {}
     sync = module.params["sync"]
-    result = parent.commit(cmd=cmd, sync=sync, sync_all=sync)
+    job_id = module.params["job_id"]
+    commit_results = {"changed": False}
 
-    # Exit with status
-    if not sync:
-        # When sync is False only jobid is returned
-        commit_results["jobid"] = int(result)
-    elif not result["success"]:
-        # The commit failed
-        fail_message = "Job ID " + result["jobid"] + ": "
-
-        for device in result[
-            "devices"
-        ].items():  # Iterate over all devices that received the commit_push
-            # In the tuples being iterated over here, index 0 is the serial number, index 1 is a dict of commit output messaging
-
-            if not device[1][
-                "success"
-            ]:  # For any devices where the commit_push was not successful...
-                # Add the name of the device and the commit messages
-                fail_message += (
-                    device[1]["name"] + ": " + " | ".join(device[1]["messages"]) + "; "
+    try:
+        if job_id is None:
+            # Construct the commit command
+            cmd = PanoramaCommitAll(
+                style=module.params["style"],
+                name=module.params["name"],
+                description=module.params["description"],
+                admins=module.params["admins"],
+                include_template=module.params["include_template"],
+                force_template_values=module.params["force_template_values"],
+                devices=module.params["devices"],
+            )
+
+            # Execute the commit
+            job_id = parent.commit(cmd=cmd)
+            if job_id is None:
+                module.exit_json(msg="Commit not needed.", finished=True, devices={})
+            commit_results["changed"] = True
+
+            # Log collector group pushes have no job, only a result.
+            if isinstance(job_id, dict):
+                commit_results.update(
+                    jobid=int(job_id["jobid"]), finished=True, devices={}
                 )
+                msg = " | ".join(job_id.get("messages") or [])
+                if not job_id["success"]:
+                    module.fail_json(msg=msg, **commit_results)
+                module.exit_json(msg=msg, **commit_results)
+
+        commit_results["jobid"] = int(job_id)
+
+        if module.params["job_id"] is None and not sync:
+            # Return the devices right away.
+            finished = False
+            job = parent.op(
+                "<show><jobs><id>{0}</id></jobs></show>".format(job_id), cmd_xml=False
+            ).find("./result/job")
+        else:
+            finished, job = wait_for_push(
+                parent,
+                job_id,
+                timeout=module.params["timeout"],
+                fail_fast=module.params["fail_fast"],
+            )
+    except PanDeviceError as e:
+        module.fail_json(msg="{0}".format(e), **commit_results)
+
+    devices = push_devices(job) if job is not None else {}
+    commit_results["finished"] = finished
+    commit_results["devices"] = devices
+
+    failed = [x for x in devices.values() if x["result"] == "FAIL"]
+    if failed or (finished and job.findtext("result") == "FAIL"):
+        # The commit failed
+        fail_message = "Job ID {0}: ".format(job_id)
+
+        for device in failed:
+            # Add the name of the device and the commit messages
+            fail_message += (
+                device["name"] + ": " + " | ".join(device["messages"]) + "; "
+            )
+
+        if not failed:
+            fail_message += " | ".join(
+                x.text for x in job.iterfind("./details//line") if x.text
+            )
 
         # Send the commit fail messages
-        module.fail_json(msg=fail_message)
-    else:
-        # The commit succeeded
-        commit_results["changed"] = True
-        commit_results["jobid"] = result["jobid"]
+        module.fail_json(msg=fail_message, **commit_results)
 
     module.exit_json(**commit_results)
 
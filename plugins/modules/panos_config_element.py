@@ -104,6 +104,7 @@ diff:
     elements: str
 """
 
+import hashlib
 import xml.etree.ElementTree
 
 from ansible.module_utils.basic import AnsibleModule
@@ -120,87 +121,126 @@ except ImportError:
         pass
 
 
-def xml_compare(one, two, excludes=None):
+DEFAULT_EXCLUDES = ("admin", "dirtyId", "time", "uuid")
+
+
+def xml_compare(one, two, excludes=None, digests=None):
     """
     Compares the contents of two xml.etree.ElementTrees for equality.
 
+    Children are compared sorted by tag name, so the order of children with
+    different tags does not matter.
+
     :param one: First ElementTree.
     :param two: Second ElementTree.
     :param excludes: List of tag attributes to disregard.
+    :param digests: Dict caching the digests of already compared elements.
     """
-    if excludes is None:
-        excludes = ["admin", "dirtyId", "time", "uuid"]
-
     if one is None or two is None:
         return False
 
-    if one.tag != two.tag:
-        # Tag does not match.
-        return False
+    if digests is None:
+        digests = {}
 
-    # Compare attributes.
-    for name, value in one.attrib.items():
-        if name not in excludes:
-            if two.attrib.get(name) != value:
-                return False
+    return xml_digest(one, excludes, digests) == xml_digest(two, excludes, digests)
 
-    for name, value in two.attrib.items():
-        if name not in excludes:
-            if one.attrib.get(name) != value:
-                return False
 
-    if not text_compare(one.text, two.text):
-        # Text differs at this node.
-        return False
-
-    # Sort children by tag name to make sure they're compared in order.
-    children_one = sorted(one, key=lambda e: e.tag)
-    children_two = sorted(two, key=lambda e: e.tag)
-
-    if len(children_one) != len(children_two):
-        # Number of children differs.
-        return False
-
-    for child_one, child_two in zip(children_one, children_two):
-        if not xml_compare(child_one, child_two, excludes):
-            # Child documents do not match.
-            return False
+def xml_digest(node, excludes=None, digests=None):
+    """
+    Returns a digest of the contents of an element, so that two elements are
+    equal for xml_compare() if their digests are equal.
 
-    return True
+    Each element is hashed once from its tag, attributes, text and the
+    digests of its children, so comparing large subtrees is linear.
 
+    :param node: The ElementTree.
+    :param excludes: List of tag attributes to disregard.
+    :param digests: Dict caching the digests of elements, by id.
+    """
+    if excludes is None:
+        excludes = DEFAULT_EXCLUDES
+
+    if digests is None:
+        digests = {}
+
+    # Iterative post-order walk, as subtrees can be deep.
+    stack = [(node, False)]
+    while stack:
+        element, visited = stack.pop()
+        if id(element) in digests:
+            continue
+
+        if not visited:
+            stack.append((element, True))
+            stack.extend((x, False) for x in element)
+            continue
+
+        attrib = sorted((k, v) for k, v in element.attrib.items() if k not in excludes)
+        # Sort children by tag name to make sure they're compared in order.
+        children = sorted(element, key=lambda e: e.tag)
+        data = repr(
+            (
+                element.tag,
+                attrib,
+                (element.text or "").strip(),
+                [digests[id(x)] for x in children],
+            )
+        )
+        digests[id(element)] = hashlib.sha256(data.encode("utf-8")).digest()
 
-def text_compare(one, two):
-    """Compares the contents of two XML text attributes."""
-    if not one and not two:
-        return True
-    return (one or "").strip() == (two or "").strip()
+    return digests[id(node)]
 
 
-def iterpath(node, tag=None, path="."):
+def iterpath(node, path=()):
     """
     Similar to Element.iter(), but the iterator gives each element's path along
     with the element itself.
 
+    The path is a tuple of (tag, name) pairs, where name is the "name"
+    attribute for "entry" elements and None otherwise.
+
     Reference: https://docs.python.org/3/library/xml.etree.elementtree.html#xml.etree.ElementTree.Element.iter
+    """
+    stack = [(node, path)]
+    while stack:
+        element, element_path = stack.pop()
+        yield element, element_path
+
+        children = []
+        for child in element:
+            if child.tag == "entry":
+                key = (child.tag, child.attrib["name"])
+            else:
+                key = (child.tag, None)
+            children.append((child, element_path + (key,)))
+        stack.extend(reversed(children))
 
-    Taken from: https://stackoverflow.com/questions/13136334/get-xpath-dynamically-using-elementtree-getpath
+
+def index_paths(node):
     """
-    if tag == "*":
-        tag = None
+    Maps each path in the document to its element, for find() like lookups.
 
-    if tag is None or node.tag == tag:
-        yield node, path
+    As with find(), if several elements have the same path, the first one in
+    document order is kept.  Entries without a name cannot be looked up by
+    name, so they are left out with their children.
 
-    for child in node:
-        if child.tag == "entry":
-            _child_path = "{0}/{1}[@name='{2}']".format(
-                path, child.tag, child.attrib["name"]
-            )
-        else:
-            _child_path = "{0}/{1}".format(path, child.tag)
+    :param node: The ElementTree.
+    """
+    index = {}
+    stack = [(node, ())]
+    while stack:
+        element, path = stack.pop()
+        index.setdefault(path, element)
 
-        for child, child_path in iterpath(child, tag, path=_child_path):
-            yield child, child_path
+        children = []
+        for child in element:
+            if child.tag != "entry":
+                children.append((child, path + ((child.tag, None),)))
+            elif "name" in child.attrib:
+                children.append((child, path + ((child.tag, child.attrib["name"]),)))
+        stack.extend(reversed(children))
+
+    return index
 
 
 def xml_contained(big, small):
@@ -211,6 +251,9 @@ def xml_contained(big, small):
     This ensures all the configuration in "small" is contained in "big", but
     "big" can have configuration not contained in "small".
 
+    "big" is indexed by path once, and element digests are shared between all
+    the comparisons, so this is linear in the size of both documents.
+
     :param big: Big document ElementTree.
     :param small: Small document ElementTree.
     """
@@ -218,21 +261,24 @@ def xml_contained(big, small):
     if big is None or small is None:
         return False
 
+    index = index_paths(big)
+    digests = {}
+
     for element, path in iterpath(small):
 
         # Elements with "member" children must have all their children be equal.
-        if element.find("*/member/..") is not None:
-            big_element = big.find(path)
+        if any(x.find("member") is not None for x in element):
+            big_element = index.get(path)
 
-            if not xml_compare(big_element, element):
+            if not xml_compare(big_element, element, digests=digests):
                 return False
 
         # Elements with no children at the same point in the tree must match
         # exactly.
         elif len(element) == 0 and (element.tag != "member"):
-            big_element = big.find(path)
+            big_element = index.get(path)
 
-            if not xml_compare(big_element, element):
+            if not xml_compare(big_element, element, digests=digests):
                 return False
 
     return True
@@ -148,6 +148,17 @@ options:
               to complete.  This is the maximum amount of time to wait, in seconds.
         type: int
         default: 600
+    checksum_algorithm:
+        description:
+            - Algorithm of the checksum of the exported file to return as I(checksum).
+            - The checksum is computed while the file is downloaded.
+        type: str
+        choices:
+            - md5
+            - sha1
+            - sha256
+            - sha512
+        version_added: 3.5.0
 """
 
 EXAMPLES = """
@@ -189,19 +200,29 @@ stdout_xml:
     returned: success
     type: str
     sample: "<dir-listing><file>/capture-rx</file><file>/capture-tx</file><file>/capture-fw</file></dir-listing>"
+checksum:
+    description: Checksum of the exported file, when I(checksum_algorithm) is set.
+    returned: success
+    type: str
+    sample: "9a3e5b6f4b6ab1d6b2a3b1c0f5b8a6f1d0c6a3b2e1f4d7c8b9a0e1f2d3c4b5a6"
 """
 
 # Force release for 9408ad5.
 
 from ansible.module_utils.basic import AnsibleModule
 from ansible_collections.paloaltonetworks.panos.plugins.module_utils.panos import (
+    JobPoller,
+    JobTimeoutError,
     get_connection,
+    xapi_stream,
 )
 
 try:
+    from panos.errors import PanDeviceError
     from panos.panorama import Panorama
 except ImportError:
     try:
+        from pandevice.errors import PanDeviceError
         from pandevice.panorama import Panorama
     except ImportError:
         pass
@@ -213,74 +234,82 @@ try:
 except ImportError:
     HAS_LIB = False
 
+import hashlib
 import json
 import pathlib
-import time
 import xml.etree.ElementTree as ET
 
+# Size of the chunks read from the API and written to disk.
+CHUNK_SIZE = 1024 * 1024
 
-def export_text(module, xapi, category, filename, create_directory):
-    xapi.export(category=category)
-
-    f = None
-
-    try:
-        if create_directory:
-            pathlib.Path(filename).parent.mkdir(parents=True, exist_ok=True)
-        with open(filename, "w") as f:
-            if category == "configuration":
-                f.write(xapi.xml_root())
-            elif category in HTML_EXPORTS:
-                f.write(xapi.text_document)
-
-        f.close()
-
-    except IOError as msg:
-        module.fail_json(msg=msg)
 
+def export_stream(
+    module, xapi, query, filename, create_directory=False, checksum_algorithm=None
+):
+    """
+    Exports to filename, streaming the API response to disk a chunk at a time.
 
-def export_binary(module, xapi, category, filename, create_directory):
-    f = None
+    Unlike xapi.export(), the export is never held in memory as a whole, so
+    memory usage is the same for large tech-support or device-state files.
 
-    xapi.export(category=category)
+    Returns the hex digest of the file if checksum_algorithm is given.
+    """
+    query = dict((k, v) for k, v in query.items() if v is not None)
+    query["type"] = "export"
 
     try:
-        if create_directory:
-            pathlib.Path(filename).parent.mkdir(parents=True, exist_ok=True)
-        with open(filename, "wb") as f:
-            content = xapi.export_result["content"]
+        response = xapi_stream(xapi, query)
+    except PanDeviceError as e:
+        module.fail_json(msg="{0}".format(e))
 
-            if content is not None:
-                f.write(content)
-
-            f.close()
-    except IOError as msg:
-        module.fail_json(msg=msg)
-
-
-def save_binary(module, xapi, category, filename, create_directory):
-    # This function is almost the same as export_binary, but omits the line...
-    #   xapi.export(category=category)
-    # This function is therefore used where the xapi.export operation is already done
-
-    f = None
+    checksum = None
+    if checksum_algorithm is not None:
+        checksum = hashlib.new(checksum_algorithm)
 
     try:
+        chunk = response.read(CHUNK_SIZE)
+
+        # Errors are returned as an XML response instead of the file.
+        if chunk.lstrip().startswith(b"<response"):
+            chunk += response.read()
+            try:
+                root = ET.fromstring(chunk)
+            except ET.ParseError:
+                pass
+            else:
+                if root.attrib.get("status") == "error":
+                    module.fail_json(
+                        msg=" ".join(x.strip() for x in root.itertext() if x.strip())
+                        or "Export failed",
+                    )
+
         if create_directory:
             pathlib.Path(filename).parent.mkdir(parents=True, exist_ok=True)
         with open(filename, "wb") as f:
-            content = xapi.export_result["content"]
-
-            if content is not None:
-                f.write(content)
+            while chunk:
+                f.write(chunk)
+                if checksum is not None:
+                    checksum.update(chunk)
+                chunk = response.read(CHUNK_SIZE)
 
-            f.close()
     except IOError as msg:
-        module.fail_json(msg=msg)
+        module.fail_json(msg="{0}".format(msg))
+    finally:
+        response.close()
+
+    if checksum is not None:
+        return checksum.hexdigest()
 
 
 def export_async(
-    module, xapi, category, filename, interval=60, timeout=600, create_directory=False
+    module,
+    xapi,
+    category,
+    filename,
+    interval=60,
+    timeout=600,
+    create_directory=False,
+    checksum_algorithm=None,
 ):
     # Submit job, get resulting job id
     xapi.export(category=category)
@@ -290,26 +319,25 @@ def export_async(
     if job_result.find(".//job") is not None:
         job_id = job_result.find(".//job").text
 
-    end_time = time.time() + timeout
-
-    while True:
+    def fetch(job_ids):
         # Check job progress
         xapi.export(category=category, extra_qs={"action": "status", "job-id": job_id})
-        poll_result = ET.fromstring(xapi.xml_root())
-
-        status = poll_result.find(".//status")
-        if status.text == "FIN":
-            break
-
-        if time.time() > end_time:
-            module.fail_json(msg="Timeout")
+        return {job_ids[0]: ET.fromstring(xapi.xml_root()).find(".//job")}
 
-        time.sleep(interval)
+    try:
+        JobPoller(fetch, timeout=timeout, max_interval=interval).wait([job_id])
+    except JobTimeoutError:
+        module.fail_json(msg="Timeout")
 
     # Get completed job
-    xapi.export(category=category, extra_qs={"action": "get", "job-id": job_id})
-
-    save_binary(module, xapi, category, filename, create_directory)
+    return export_stream(
+        module,
+        xapi,
+        {"category": category, "action": "get", "job-id": job_id},
+        filename,
+        create_directory,
+        checksum_algorithm,
+    )
 
 
 HTML_EXPORTS = [
@@ -364,6 +392,9 @@ def main():
             threat_pcap_search_time=dict(type="str"),
             threat_pcap_serial=dict(type="str"),
             timeout=dict(type="int", default=600),
+            checksum_algorithm=dict(
+                type="str", choices=["md5", "sha1", "sha256", "sha512"]
+            ),
         ),
     )
 
@@ -386,6 +417,8 @@ def main():
     filename = module.params["filename"]
     timeout = module.params["timeout"]
     create_directory = module.params["create_directory"]
+    checksum_algorithm = module.params["checksum_algorithm"]
+    checksum = None
 
     parent = helper.get_pandevice_parent(module)
     xapi = parent.xapi
@@ -394,7 +427,14 @@ def main():
         if filename is None:
             module.fail_json(msg="filename is required for export")
 
-        export_text(module, xapi, category, filename, create_directory)
+        checksum = export_stream(
+            module,
+            xapi,
+            {"category": category},
+            filename,
+            create_directory,
+            checksum_algorithm,
+        )
 
     elif category in FILE_EXPORTS:
         if filename is None:
@@ -403,20 +443,28 @@ def main():
         if category == "stats-dump" and isinstance(parent, Panorama):
             module.fail_json(msg="stats-dump is not supported on Panorama")
 
-        export_async(
+        checksum = export_async(
             module,
             xapi,
             category,
             filename,
             timeout=timeout,
             create_directory=create_directory,
+            checksum_algorithm=checksum_algorithm,
         )
 
     elif category == "device-state":
         if filename is None:
             module.fail_json(msg="filename is required for export")
 
-        export_binary(module, xapi, category, filename, create_directory)
+        checksum = export_stream(
+            module,
+            xapi,
+            {"category": category},
+            filename,
+            create_directory,
+            checksum_algorithm,
+        )
 
     elif category == "certificate":
         if filename is None:
@@ -428,6 +476,7 @@ def main():
         cert_passphrase = module.params["certificate_passphrase"]
 
         params = {
+            "category": category,
             "certificate-name": cert_name,
             "format": cert_format,
             "include-key": cert_include_keys,
@@ -441,8 +490,9 @@ def main():
         if cert_passphrase is not None:
             params["passphrase"] = cert_passphrase
 
-        xapi.export(category="certificate", extra_qs=params)
-        save_binary(module, xapi, category, filename, create_directory)
+        checksum = export_stream(
+            module, xapi, params, filename, create_directory, checksum_algorithm
+        )
 
     elif category == "application-pcap":
         # When exporting an application pcap, from_name can be:
@@ -450,9 +500,9 @@ def main():
         #   - a directory name, which gets you a list of pcaps in that directory
         #   - a filename, which gets you the pcap file
         from_name = module.params["application_pcap_name"]
-        xapi.export(category="application-pcap", from_name=from_name)
 
         if from_name is None or ".pcap" not in from_name:
+            xapi.export(category="application-pcap", from_name=from_name)
             xml_result = xapi.xml_result()
 
             obj_dict = xmltodict.parse(xml_result)
@@ -463,16 +513,23 @@ def main():
             if filename is None:
                 module.fail_json(msg="filename is required for export")
 
-            save_binary(module, xapi, category, filename, create_directory)
+            checksum = export_stream(
+                module,
+                xapi,
+                {"category": category, "from": from_name},
+                filename,
+                create_directory,
+                checksum_algorithm,
+            )
 
     elif category == "filter-pcap":
         # When exporting a filter pcap, from_name can be:
         #   - nothing, which gets you a list of files
         #   - a filename, which gets you the pcap file
         from_name = module.params["filter_pcap_name"]
-        xapi.export(category="filter-pcap", from_name=from_name)
 
         if from_name is None:
+            xapi.export(category="filter-pcap", from_name=from_name)
             xml_result = xapi.xml_result()
 
             obj_dict = xmltodict.parse(xml_result)
@@ -483,21 +540,28 @@ def main():
             if filename is None:
                 module.fail_json(msg="filename is required for export")
 
-            save_binary(module, xapi, category, filename, create_directory)
+            checksum = export_stream(
+                module,
+                xapi,
+                {"category": category, "from": from_name},
+                filename,
+                create_directory,
+                checksum_algorithm,
+            )
 
     elif category == "dlp-pcap":
         from_name = module.params["dlp_pcap_name"]
         dlp_password = module.params["dlp_password"]
-        xapi.export(
-            category="dlp-pcap",
-            from_name=from_name,
-            extra_qs={"dlp-password": dlp_password},
-        )
 
         # When exporting a dlp pcap, from_name can be:
         #   - nothing, which gets you a list of files
         #   - a filename, which gets you the pcap file
         if from_name is None:
+            xapi.export(
+                category="dlp-pcap",
+                from_name=from_name,
+                extra_qs={"dlp-password": dlp_password},
+            )
             xml_result = xapi.xml_result()
 
             obj_dict = xmltodict.parse(xml_result)
@@ -508,7 +572,18 @@ def main():
             if filename is None:
                 module.fail_json(msg="filename is required for export")
 
-            save_binary(module, xapi, category, filename, create_directory)
+            checksum = export_stream(
+                module,
+                xapi,
+                {
+                    "category": category,
+                    "from": from_name,
+                    "dlp-password": dlp_password,
+                },
+                filename,
+                create_directory,
+                checksum_algorithm,
+            )
 
     elif category == "threat-pcap":
         if filename is None:
@@ -525,15 +600,28 @@ def main():
                 msg="threat_pcap_serial is required when connecting to Panorama"
             )
 
-        xapi.export(
-            category="threat-pcap",
-            pcapid=pcap_id,
-            search_time=search_time,
-            serialno=serial,
+        # As with xapi.export(), default the search time to the pcap id's time.
+        if search_time is None and pcap_id is not None:
+            try:
+                search_time = xapi.panos_time(xapi.pcapid_time(int(pcap_id)))
+            except ValueError:
+                module.fail_json(msg="Invalid pcapid: {0}".format(pcap_id))
+
+        checksum = export_stream(
+            module,
+            xapi,
+            {
+                "category": category,
+                "pcapid": pcap_id,
+                "search-time": search_time,
+                "serialno": serial,
+            },
+            filename,
+            create_directory,
+            checksum_algorithm,
         )
-        save_binary(module, xapi, category, filename, create_directory)
 
-    module.exit_json(changed=False)
+    module.exit_json(changed=False, checksum=checksum)
 
 
 if __name__ == "__main__":
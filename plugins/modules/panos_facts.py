@@ -39,6 +39,48 @@ options:
         type: list
         elements: str
         default: ['!config']
+    routing_filter:
+        description:
+            - Filters for the C(routing) subset, applied by the device.
+        type: dict
+        version_added: 3.5.0
+        suboptions:
+            virtual_router:
+                description:
+                    - Only routes of this virtual router.
+                type: str
+            destination:
+                description:
+                    - Only routes to this destination prefix.
+                type: str
+            type:
+                description:
+                    - Only routes of this type, such as C(static), C(connect) or
+                      C(bgp).
+                type: str
+            nexthop:
+                description:
+                    - Only routes with this nexthop.
+                type: str
+    routing_filename:
+        description:
+            - Write the routing table of the C(routing) subset to this file, one
+              JSON object per line, instead of returning it in
+              I(ansible_net_routing_table).
+            - The routes are parsed and written as they are received, so large
+              routing tables are never held in memory.
+        type: path
+        version_added: 3.5.0
+    workers:
+        description:
+            - How many subsets to collect at the same time, each over its own
+              API connection.
+            - The interfaces, vr and vsys subsets share one retrieval of the
+              device config.
+            - Set to 1 to collect the subsets one after another.
+        type: int
+        default: 4
+        version_added: 3.5.0
 """
 
 EXAMPLES = """
@@ -47,6 +89,15 @@ EXAMPLES = """
   paloaltonetworks.panos.panos_facts:
     provider: '{{ provider }}'
     gather_subset: ['config']
+
+- name: Write the BGP routes of one virtual router to a file
+  paloaltonetworks.panos.panos_facts:
+    provider: '{{ provider }}'
+    gather_subset: ['routing']
+    routing_filter:
+      virtual_router: 'default'
+      type: 'bgp'
+    routing_filename: '/tmp/routes.jsonl'
 """
 
 RETURN = """
@@ -196,7 +247,7 @@ ansible_net_virtual_systems:
             type: list
 ansible_net_routing_table:
     description: Routing Table information.
-    returned: When C(routing) is specified in C(gather_subset).
+    returned: When C(routing) is specified in C(gather_subset) and I(routing_filename) is not.
     type: complex
     contains:
         age:
@@ -223,15 +274,28 @@ ansible_net_routing_table:
         virtual_router:
             description: Virtual router the route belongs to.
             type: str
+ansible_net_routing_table_count:
+    description: Number of routes in the routing table.
+    returned: When C(routing) is specified in C(gather_subset).
+    type: int
+    version_added: 3.5.0
 """
 
+import json
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+
 from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.common.text.converters import to_text
 from ansible_collections.paloaltonetworks.panos.plugins.module_utils.panos import (
+    clone_device,
     get_connection,
+    xapi_stream,
 )
 
 try:
     from panos.device import Vsys
+    from panos.errors import PanDeviceError
     from panos.firewall import Firewall
     from panos.network import (
         AggregateInterface,
@@ -244,11 +308,11 @@ try:
         TunnelInterface,
         VirtualRouter,
         VlanInterface,
-        Zone,
     )
 except ImportError:
     try:
         from pandevice.device import Vsys
+        from pandevice.errors import PanDeviceError
         from pandevice.firewall import Firewall
         from pandevice.network import (
             AggregateInterface,
@@ -261,19 +325,43 @@ except ImportError:
             TunnelInterface,
             VirtualRouter,
             VlanInterface,
-            Zone,
         )
     except ImportError:
         pass
 
 
+# The config-backed facts are parsed from this subtree, retrieved once.
+DEVICE_CONFIG_XPATH = "/config/devices/entry[@name='localhost.localdomain']"
+
+
+def load_config(device):
+    return device.xapi.get(DEVICE_CONFIG_XPATH).find("./result/entry")
+
+
 class Factbase(object):
-    def __init__(self, module, parent):
+    # Set if the facts are parsed from the device config.
+    uses_config = False
+
+    def __init__(self, module, parent, config=None):
         self.module = module
         self.parent = parent
+        self.config = config
 
         self.facts = dict()
 
+    def refreshall(self, cls, path, refresh_children=True):
+        """Returns the cls objects at path in the device config."""
+        elm = self.config.result().find(path)
+        if elm is None:
+            return []
+
+        template = cls()
+        self.parent.add(template)
+        ans = template.refreshall_from_xml(elm, refresh_children=refresh_children)
+        self.parent.remove(template)
+
+        return ans
+
 
 class System(Factbase):
     def populate_facts(self):
@@ -334,28 +422,92 @@ class Session(Factbase):
 
 class Routing(Factbase):
     def populate_facts(self):
-        entries = self.parent.op("show routing route").findall("./result/entry")
-        routing_table = [
-            {route.tag.replace("-", "_"): route.text for route in entry}
-            for entry in entries
-        ]
-
-        self.facts.update({"routing_table": routing_table})
+        cmd = ET.Element("route")
+        for param, tag in (
+            ("virtual_router", "virtual-router"),
+            ("destination", "destination"),
+            ("type", "type"),
+            ("nexthop", "nexthop"),
+        ):
+            value = (self.module.params["routing_filter"] or {}).get(param)
+            if value is not None:
+                ET.SubElement(cmd, tag).text = value
+        cmd = "<show><routing>{0}</routing></show>".format(to_text(ET.tostring(cmd)))
+
+        filename = self.module.params["routing_filename"]
+        routing_table = []
+        count = 0
+        try:
+            if filename is None:
+                for route in self.iter_routes(cmd):
+                    routing_table.append(route)
+                    count += 1
+            else:
+                with open(filename, "w") as f:
+                    for route in self.iter_routes(cmd):
+                        f.write(json.dumps(route, separators=(",", ":")))
+                        f.write("\n")
+                        count += 1
+        except IOError as e:
+            self.module.fail_json(msg="{0}".format(e))
+
+        self.facts.update({"routing_table_count": count})
+        if filename is None:
+            self.facts.update({"routing_table": routing_table})
+
+    def iter_routes(self, cmd):
+        """Yields the routes of the op command as they are parsed.
+
+        The response is read with iterparse() straight from the API request,
+        and each entry is dropped once parsed, so memory stays flat however
+        large the routing table is.
+        """
+        try:
+            response = xapi_stream(self.parent.xapi, {"type": "op", "cmd": cmd})
+        except PanDeviceError as e:
+            self.module.fail_json(msg="{0}".format(e))
+
+        path = []
+        root = result = None
+        try:
+            for event, elm in ET.iterparse(response, events=("start", "end")):
+                if event == "start":
+                    path.append(elm.tag)
+                    if root is None:
+                        root = elm
+                    elif path == ["response", "result"]:
+                        result = elm
+                    continue
+
+                if path == ["response", "result", "entry"]:
+                    yield dict((x.tag.replace("-", "_"), x.text) for x in elm)
+                    result.remove(elm)
+                path.pop()
+        finally:
+            response.close()
+
+        if root.attrib.get("status") != "success":
+            self.module.fail_json(
+                msg=" ".join(x.strip() for x in root.itertext() if x.strip())
+                or "Failed show routing route",
+            )
 
 
 class Interfaces(Factbase):
+    uses_config = True
+
     def populate_facts(self):
         interfaces = []
         cls_types = (
-            AggregateInterface,
-            EthernetInterface,
-            VlanInterface,
-            LoopbackInterface,
-            TunnelInterface,
+            (AggregateInterface, "network/interface/aggregate-ethernet"),
+            (EthernetInterface, "network/interface/ethernet"),
+            (VlanInterface, "network/interface/vlan/units"),
+            (LoopbackInterface, "network/interface/loopback/units"),
+            (TunnelInterface, "network/interface/tunnel/units"),
         )
 
-        for cls_type in cls_types:
-            listing = cls_type.refreshall(self.parent, add=False)
+        for cls_type, path in cls_types:
+            listing = self.refreshall(cls_type, path)
             for elm in listing:
                 iface_info = {
                     "name": elm.name,
@@ -431,8 +583,10 @@ class PanoramaHa(Factbase):
 
 
 class Vr(Factbase):
+    uses_config = True
+
     def populate_facts(self):
-        listing = VirtualRouter.refreshall(self.parent, add=False)
+        listing = self.refreshall(VirtualRouter, "network/virtual-router")
 
         virtual_routers = []
         for vr in listing:
@@ -452,18 +606,22 @@ class Vr(Factbase):
 
 
 class VsysFacts(Factbase):
+    uses_config = True
+
     def populate_facts(self):
         # Get session usage XML
         session_root = self.parent.op("show session meter")
 
         # Loop through all VSYS
         virtual_systems = []
-        vsys_list = Vsys.refreshall(self.parent, name_only=True)
+        vsys_list = self.refreshall(Vsys, "vsys", refresh_children=False)
         for vsys in vsys_list:
-            for var in ("display_name", "interface", "virtual_routers"):
-                vsys.refresh_variable(var)
-
-            zones = [x.name for x in Zone.refreshall(vsys, name_only=True)]
+            zones = [
+                x.get("name")
+                for x in self.config.result().findall(
+                    "vsys/entry[@name='{0}']/zone/entry".format(vsys.name)
+                )
+            ]
             vsys_id = vsys.name[4:]
             vsys_sessions = session_root.find(".//entry/[vsys='" + vsys_id + "']")
             vsys_currentsessions = vsys_sessions.find(".//current").text
@@ -515,7 +673,18 @@ def main():
     helper = get_connection(
         with_classic_provider_spec=True,
         argument_spec=dict(
-            gather_subset=dict(default=["!config"], type="list", elements="str")
+            gather_subset=dict(default=["!config"], type="list", elements="str"),
+            routing_filter=dict(
+                type="dict",
+                options=dict(
+                    virtual_router=dict(),
+                    destination=dict(),
+                    type=dict(),
+                    nexthop=dict(),
+                ),
+            ),
+            routing_filename=dict(type="path"),
+            workers=dict(type="int", default=4),
         ),
     )
 
@@ -525,6 +694,9 @@ def main():
         required_one_of=helper.required_one_of,
     )
 
+    if module.params["workers"] < 1:
+        module.fail_json(msg="workers must be at least 1")
+
     parent = helper.get_pandevice_parent(module)
 
     gather_subset = module.params["gather_subset"]
@@ -573,19 +745,32 @@ def main():
     facts = dict()
     facts["gather_subset"] = list(runable_subsets)
 
+    if isinstance(parent, Firewall):
+        subsets = FIREWALL_SUBSETS
+    else:
+        subsets = PANORAMA_SUBSETS
+
+    # Each subset runs in the pool on its own copy of the device, and the
+    # config-backed subsets wait on the one retrieval of the device config.
+    pool = ThreadPoolExecutor(max_workers=module.params["workers"])
+    config = None
+    if any(subsets[key].uses_config for key in runable_subsets):
+        config = pool.submit(load_config, clone_device(parent))
+
     # Create instance classes, e.g. System, Session etc.
     instances = list()
 
     for key in runable_subsets:
-        if isinstance(parent, Firewall):
-            instances.append(FIREWALL_SUBSETS[key](module, parent))
-        else:
-            instances.append(PANORAMA_SUBSETS[key](module, parent))
+        inst = subsets[key](module, clone_device(parent), config)
+        instances.append((inst, pool.submit(inst.populate_facts)))
 
     # Populate facts for instances
-    for inst in instances:
-        inst.populate_facts()
-        facts.update(inst.facts)
+    try:
+        for inst, future in instances:
+            future.result()
+            facts.update(inst.facts)
+    finally:
+        pool.shutdown()
 
     ansible_facts = dict()
 
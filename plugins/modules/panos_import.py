@@ -131,6 +131,26 @@ options:
             - URL of the file that will be imported to device.
         type: str
         required: false
+    url_checksum:
+        description:
+            - Checksum of the file at I(url), as C(<algorithm>:<checksum>), such
+              as C(sha256:b1b6...).
+            - The downloaded file is verified against it, and it is used as the
+              name of the file in I(cache_dir).
+        type: str
+        version_added: 3.5.0
+    cache_dir:
+        description:
+            - Directory to download the file at I(url) to, where it is kept so
+              later tasks and the other hosts in the play reuse it instead of
+              downloading it again.
+            - Interrupted downloads are resumed where they left off.
+            - Without I(url_checksum), the file is cached by URL and is reused
+              as is, even if the file at I(url) changes.
+            - If this is not set, the file is downloaded to a temporary file
+              that is removed after the import.
+        type: path
+        version_added: 3.5.0
     verify:
         description:
             - If true, validates SSL certificates when importing files.
@@ -146,6 +166,14 @@ EXAMPLES = """
     category: software
     file: /tmp/paloaltonetworks.panos.panos_vm-10.0.1
 
+- name: Import software image from a URL, downloaded once for all firewalls
+  paloaltonetworks.panos.panos_import:
+    provider: '{{ provider }}'
+    category: software
+    url: 'https://downloads.example.com/PanOS_vm-10.2.4'
+    url_checksum: 'sha256:{{ image_sha256 }}'
+    cache_dir: /var/cache/panos
+
 - name: Import certificate
   paloaltonetworks.panos.panos_import:
     provider: '{{ device }}'
@@ -199,9 +227,10 @@ RETURN = """
 # Default return values
 """
 
+import fcntl
+import hashlib
 import os
 import os.path
-import shutil
 import tempfile
 import xml.etree
 
@@ -217,17 +246,44 @@ try:
 except ImportError:
     HAS_LIB = False
 
+try:
+    from requests_toolbelt import MultipartEncoder
+
+    HAS_TOOLBELT = True
+except ImportError:
+    HAS_TOOLBELT = False
+
+
+# Size of the chunks written to disk when downloading a file.
+CHUNK_SIZE = 1024 * 1024
+
+# Number of times an interrupted download is resumed before giving up.
+DOWNLOAD_ATTEMPTS = 3
+
 
 def import_file(module, xapi, filename, params, verify=False):
     params.update({"type": "import", "key": xapi.api_key})
 
     url = "https://{0}:{1}/api".format(xapi.hostname, xapi.port)
-    files = {"file": open(filename, "rb")}
 
-    try:
-        r = requests.post(url, params=params, files=files, verify=verify)
-    except requests.exceptions.SSLError:
-        module.fail_json(msg="SSL Verification failed, and 'verify' set to true.")
+    with open(filename, "rb") as fo:
+        # Stream the multipart body from the file instead of building it in
+        # memory, which matters for software images.
+        if HAS_TOOLBELT:
+            encoder = MultipartEncoder(
+                fields={"file": (os.path.basename(filename), fo)}
+            )
+            kwargs = {
+                "data": encoder,
+                "headers": {"Content-Type": encoder.content_type},
+            }
+        else:
+            kwargs = {"files": {"file": fo}}
+
+        try:
+            r = requests.post(url, params=params, verify=verify, **kwargs)
+        except requests.exceptions.SSLError:
+            module.fail_json(msg="SSL Verification failed, and 'verify' set to true.")
 
     response = xml.etree.ElementTree.fromstring(r.content)
 
@@ -235,13 +291,123 @@ def import_file(module, xapi, filename, params, verify=False):
         module.fail_json(msg=r.content)
 
 
-def download_file(url):
-    r = requests.get(url, stream=True)
+def parse_checksum(module, checksum):
+    """Splits "<algorithm>:<checksum>" into its algorithm and checksum."""
+    algorithm, _, value = checksum.partition(":")
+    algorithm = algorithm.lower()
+
+    if not value or algorithm not in hashlib.algorithms_available:
+        module.fail_json(
+            msg="url_checksum must be <algorithm>:<checksum>, such as sha256:<checksum>"
+        )
+
+    return algorithm, value.lower()
+
+
+def file_checksum(path, algorithm):
+    h = hashlib.new(algorithm)
+
+    with open(path, "rb") as fo:
+        for chunk in iter(lambda: fo.read(CHUNK_SIZE), b""):
+            h.update(chunk)
 
-    with tempfile.NamedTemporaryFile(prefix="ai", delete=False) as fo:
-        shutil.copyfileobj(r.raw, fo)
+    return h.hexdigest()
 
-    return fo.name
+
+def fetch_file(module, url, path, resume=False):
+    """
+    Downloads url to path.
+
+    Downloads interrupted during this call are resumed with a range request,
+    provided the server gave an ETag or Last-Modified validator to send as
+    If-Range, and restarted from scratch otherwise.  A partial file left at
+    path by an earlier run is only resumed if resume is True, meaning that
+    the file is verified against a checksum afterwards.
+    """
+    error = None
+    validator = None
+
+    for attempt in range(DOWNLOAD_ATTEMPTS):
+        offset = os.path.getsize(path) if os.path.exists(path) else 0
+        headers = {}
+        if offset and (validator is not None or (resume and attempt == 0)):
+            headers["Range"] = "bytes={0}-".format(offset)
+            if validator is not None:
+                headers["If-Range"] = validator
+
+        try:
+            r = requests.get(url, headers=headers, stream=True, timeout=60)
+
+            # The file was already fully downloaded.
+            if "Range" in headers and r.status_code == 416:
+                return
+
+            r.raise_for_status()
+            validator = r.headers.get("ETag") or r.headers.get("Last-Modified")
+
+            with open(path, "ab" if r.status_code == 206 else "wb") as fo:
+                for chunk in r.iter_content(CHUNK_SIZE):
+                    fo.write(chunk)
+
+            return
+        except requests.exceptions.RequestException as e:
+            error = e
+        except (IOError, OSError) as e:
+            module.fail_json(msg="Failed to write {0}: {1}".format(path, e))
+
+    module.fail_json(msg="Failed to download {0}: {1}".format(url, error))
+
+
+def download_file(module, url, cache_dir=None, checksum=None):
+    """
+    Downloads url, returning the local path of the file.
+
+    Without cache_dir, the file is downloaded to a temporary file.  With
+    cache_dir, it is downloaded there as the checksum (or the hash of the
+    url if there is no checksum), so later tasks and the other hosts of the
+    play reuse it.  A lock on the file makes concurrent tasks wait for the
+    first one to download it.
+    """
+    if cache_dir is None:
+        with tempfile.NamedTemporaryFile(prefix="ai", delete=False) as fo:
+            path = fo.name
+        fetch_file(module, url, path)
+        verify_file(module, path, checksum)
+        return path
+
+    if checksum is not None:
+        name = "{0}-{1}".format(*checksum)
+    else:
+        name = hashlib.sha256(url.encode("utf-8")).hexdigest()
+    path = os.path.join(cache_dir, name)
+
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(path + ".lock", "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+
+            if not os.path.exists(path):
+                fetch_file(module, url, path + ".part", checksum is not None)
+                verify_file(module, path + ".part", checksum)
+                os.rename(path + ".part", path)
+    except (IOError, OSError) as e:
+        module.fail_json(msg="Failed to cache {0}: {1}".format(url, e))
+
+    return path
+
+
+def verify_file(module, path, checksum):
+    if checksum is None:
+        return
+
+    actual = file_checksum(path, checksum[0])
+    if actual != checksum[1]:
+        delete_file(path)
+        module.fail_json(
+            msg="Checksum mismatch for downloaded file: {0} != {1}".format(
+                actual, checksum[1]
+            )
+        )
 
 
 def delete_file(path):
@@ -315,6 +481,8 @@ def main():
             profile_name=dict(type="str"),
             filename=dict(type="str", aliases=["file"]),
             url=dict(),
+            url_checksum=dict(type="str"),
+            cache_dir=dict(type="path"),
             verify=dict(type="bool", default=False),
         ),
     )
@@ -333,6 +501,7 @@ def main():
     filename = module.params["filename"]
 
     url = module.params["url"]
+    cache_dir = module.params["cache_dir"]
 
     # get_pandevice_parent will validate templates. The returned value, if a template, is not useable.
     parent = helper.get_pandevice_parent(module)
@@ -344,7 +513,10 @@ def main():
 
     # we can get file from URL or local storage
     if url is not None:
-        filename = download_file(url)
+        checksum = None
+        if module.params["url_checksum"] is not None:
+            checksum = parse_checksum(module, module.params["url_checksum"])
+        filename = download_file(module, url, cache_dir, checksum)
 
     params = {"category": module.params["category"]}
 
@@ -384,7 +556,7 @@ def main():
         module.fail_json(msg="Failed: {0}".format(e))
 
     # If the file was downloaded from a URL, clean up.
-    if url is not None:
+    if url is not None and cache_dir is None:
         delete_file(filename)
 
     module.exit_json(changed=changed, filename=filename, msg="okey dokey")
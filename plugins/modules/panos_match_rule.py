@@ -53,8 +53,8 @@ options:
     source_ip:
         description:
             - The source IP address.
+            - Required unless I(flows) is given.
         type: str
-        required: true
     source_port:
         description:
             - The source port.
@@ -74,13 +74,13 @@ options:
     destination_ip:
         description:
             - The destination IP address.
+            - Required unless I(flows) is given.
         type: str
-        required: true
     destination_port:
         description:
             - The destination port.
+            - Required unless I(flows) is given.
         type: int
-        required: true
     application:
         description:
             - The application.
@@ -88,12 +88,84 @@ options:
     protocol:
         description:
             - The IP protocol number from 1 to 255.
+            - Required unless I(flows) is given.
         type: int
-        required: true
     category:
         description:
             - URL category
         type: str
+    engine:
+        description:
+            - How to match the flows.
+            - With C(device), each flow is matched by the firewall with a
+              C(test security-policy-match) or C(test nat-policy-match).
+            - With C(local), the running config is retrieved once and flows are
+              matched in memory.  Flows that depend on App-ID, User-ID, URL
+              categories, HIP profiles, schedules, FQDN or dynamic addresses, or
+              application-default services are still matched by the firewall.
+        type: str
+        choices:
+            - device
+            - local
+        default: device
+        version_added: 3.5.0
+    flows:
+        description:
+            - Match a list of flows in one task, instead of the single flow given
+              by the top level params.
+            - The results are returned in I(matches).
+        type: list
+        elements: dict
+        version_added: 3.5.0
+        suboptions:
+            source_zone:
+                description:
+                    - The source zone.
+                type: str
+            source_ip:
+                description:
+                    - The source IP address.
+                type: str
+                required: true
+            source_port:
+                description:
+                    - The source port.
+                type: int
+            source_user:
+                description:
+                    - The source user or group.
+                type: str
+            to_interface:
+                description:
+                    - The inbound interface in a NAT rule.
+                type: str
+            destination_zone:
+                description:
+                    - The destination zone.
+                type: str
+            destination_ip:
+                description:
+                    - The destination IP address.
+                type: str
+                required: true
+            destination_port:
+                description:
+                    - The destination port.
+                type: int
+                required: true
+            application:
+                description:
+                    - The application.
+                type: str
+            protocol:
+                description:
+                    - The IP protocol number from 1 to 255.
+                type: int
+                required: true
+            category:
+                description:
+                    - URL category
+                type: str
     vsys_id:
         description:
             - B(Removed)
@@ -182,12 +254,28 @@ rulebase:
     description: Rule location; panorama-pre-rulebase, firewall-rulebase, or panorama-post-rulebase
     returned: always
     type: str
+engine:
+    description: Whether the flow was matched C(local) or by the C(device).
+    returned: when I(flows) is not given
+    type: str
+    version_added: 3.5.0
+matches:
+    description:
+        - The results of I(flows), in the same order.
+        - Each has the C(msg), C(rule), C(rulebase) and C(engine) of the flow,
+          where C(rule) and C(rulebase) are null if no rule matched.
+    returned: when I(flows) is given
+    type: list
+    elements: dict
+    version_added: 3.5.0
 """
 
 import json
 
 from ansible.module_utils.basic import AnsibleModule
 from ansible_collections.paloaltonetworks.panos.plugins.module_utils.panos import (
+    PolicyMatcher,
+    PolicyMatchUnknown,
     get_connection,
 )
 
@@ -212,125 +300,91 @@ except ImportError:
     HAS_LIB = False
 
 
-def main():
-    helper = get_connection(
-        vsys=True,
-        with_classic_provider_spec=True,
-        panorama_error="Panorama is not supported",
-        argument_spec=dict(
-            rule_type=dict(default="security", choices=["security", "nat"]),
-            source_zone=dict(),
-            source_ip=dict(required=True),
-            source_port=dict(type="int"),
-            source_user=dict(),
-            to_interface=dict(),
-            destination_zone=dict(),
-            destination_ip=dict(required=True),
-            destination_port=dict(required=True, type="int"),
-            application=dict(),
-            protocol=dict(required=True, type="int"),
-            category=dict(),
-            # TODO(gfreeman) - Remove this in the next role release.
-            vsys_id=dict(),
-            rulebase=dict(),
-        ),
-    )
-
-    module = AnsibleModule(
-        argument_spec=helper.argument_spec,
-        supports_check_mode=False,
-        required_one_of=helper.required_one_of,
-    )
-
-    # TODO(gfreeman) - Remove this in the next role release.
-    if not HAS_LIB:
-        module.fail_json(msg="Missing xmltodict library")
-    if module.params["vsys_id"] is not None:
-        module.fail_json(msg='Param "vsys_id" is removed; use vsys')
-    if module.params["rulebase"] is not None:
-        module.deprecate(
-            'Param "rulebase" is deprecated and may safely be removed from your playbook',
-            version="4.0.0",
-            collection_name="paloaltonetworks.panos",
-        )
-
-    parent = helper.get_pandevice_parent(module)
+FLOW_SPEC = dict(
+    source_zone=dict(),
+    source_ip=dict(required=True),
+    source_port=dict(type="int"),
+    source_user=dict(),
+    to_interface=dict(),
+    destination_zone=dict(),
+    destination_ip=dict(required=True),
+    destination_port=dict(required=True, type="int"),
+    application=dict(),
+    protocol=dict(required=True, type="int"),
+    category=dict(),
+)
 
-    params = (
-        (
-            "application",
-            "application",
-            [
-                "security",
-            ],
-        ),
-        (
-            "category",
-            "category",
-            [
-                "security",
-            ],
-        ),
-        ("destination_ip", "destination", ["security", "nat"]),
-        ("destination_port", "destination-port", ["security", "nat"]),
-        ("source_zone", "from", ["security", "nat"]),
-        ("protocol", "protocol", ["security", "nat"]),
-        ("source_ip", "source", ["security", "nat"]),
-        (
-            "source_user",
-            "source-user",
-            [
-                "security",
-            ],
-        ),
-        ("destination_zone", "to", ["security", "nat"]),
-        (
-            "to_interface",
-            "to-interface",
-            [
-                "nat",
-            ],
-        ),
-    )
+TEST_PARAMS = (
+    (
+        "application",
+        "application",
+        [
+            "security",
+        ],
+    ),
+    (
+        "category",
+        "category",
+        [
+            "security",
+        ],
+    ),
+    ("destination_ip", "destination", ["security", "nat"]),
+    ("destination_port", "destination-port", ["security", "nat"]),
+    ("source_zone", "from", ["security", "nat"]),
+    ("protocol", "protocol", ["security", "nat"]),
+    ("source_ip", "source", ["security", "nat"]),
+    (
+        "source_user",
+        "source-user",
+        [
+            "security",
+        ],
+    ),
+    ("destination_zone", "to", ["security", "nat"]),
+    (
+        "to_interface",
+        "to-interface",
+        [
+            "nat",
+        ],
+    ),
+)
 
-    cmd = []
-    rtype = module.params["rule_type"]
-    vsys = module.params["vsys"]
+# This module used to refreshall on either the security rules or the NAT
+# rules, however if the rule matched came from Panorama, then this module
+# failed.  To account for this, instead directly query the 3 path locations
+# where the rule could exist, and return that instead.  When pandevice
+# supports querying the firewall for the pushed down Panorama config, change
+# this back to using normal pandevice objects.
+RULE_LOCATIONS = (
+    (
+        "panorama-pre-rulebase",
+        "/config/panorama/vsys/entry[@name='{0}']/pre-rulebase",
+    ),
+    (
+        "firewall-rulebase",
+        "/config/devices/entry[@name='localhost.localdomain']/vsys/entry[@name='{0}']/rulebase",
+    ),
+    (
+        "panorama-post-rulebase",
+        "/config/panorama/vsys/entry[@name='{0}']/post-rulebase",
+    ),
+)
+RULE_SUFFIX = "/{0}/rules/entry[@name='{1}']"
 
-    # This module used to refreshall on either the security rules or the NAT
-    # rules, however if the rule matched came from Panorama, then this module
-    # failed.  To account for this, instead directly query the 3 path locations
-    # where the rule could exist, and return that instead.  When pandevice
-    # supports querying the firewall for the pushed down Panorama config, change
-    # this back to using normal pandevice objects.
-    rule_locations = (
-        (
-            "panorama-pre-rulebase",
-            "/config/panorama/vsys/entry[@name='{0}']/pre-rulebase",
-        ),
-        (
-            "firewall-rulebase",
-            "/config/devices/entry[@name='localhost.localdomain']/vsys/entry[@name='{0}']/rulebase",
-        ),
-        (
-            "panorama-post-rulebase",
-            "/config/panorama/vsys/entry[@name='{0}']/post-rulebase",
-        ),
-    )
-    suffix = "/{0}/rules/entry[@name='{1}']"
 
+def device_match(module, helper, parent, rtype, flow):
+    """Returns the rule name the device matches to the flow, or None."""
     if rtype == "security":
-        cmd.append("test security-policy-match")
-        obj = SecurityRule()
+        cmd = ["test security-policy-match"]
     else:
-        cmd.append("test nat-policy-match")
-        obj = NatRule()
-    parent.add(obj)
+        cmd = ["test nat-policy-match"]
 
-    for ansible_param, cmd_param, rule_types in params:
-        if rtype not in rule_types or module.params[ansible_param] is None:
+    for ansible_param, cmd_param, rule_types in TEST_PARAMS:
+        if rtype not in rule_types or flow[ansible_param] is None:
             continue
-        cmd.append('{0} "{1}"'.format(cmd_param, module.params[ansible_param]))
+        cmd.append('{0} "{1}"'.format(cmd_param, flow[ansible_param]))
 
     # Submit the op command with the appropriate test string
     test_string = " ".join(cmd)
@@ -374,7 +428,7 @@ def main():
             rtype,
             ET.tostring(response, encoding="utf-8"),
         )
-        module.exit_json(msg=msg, rule=[])
+        return None, msg
 
     """
     Example response (newlines after newlines to appease pycodestyle line length limitations):
@@ -388,31 +442,157 @@ def main():
     if len(tokens) == 2 and tokens[1].startswith(" index: "):
         rule_name = tokens[0]
 
+    return rule_name, test_string
+
+
+def find_rule(obj, vsys, rtype, rule_name):
+    """Returns the (rulebase, rule) of the named rule, probing each rulebase."""
     fw = obj.nearest_pandevice()
-    for rulebase, prefix in rule_locations:
-        xpath = prefix.format(vsys) + suffix.format(rtype, rule_name)
+    for rulebase, prefix in RULE_LOCATIONS:
+        xpath = prefix.format(vsys) + RULE_SUFFIX.format(rtype, rule_name)
         ans = fw.xapi.get(xpath)
         if ans is None:
             continue
         rules = obj.refreshall_from_xml(ans.find("./result"))
         if rules:
-            x = rules[0]
-            module.deprecate(
-                'The "stdout_lines" output is deprecated; use "rule" instead',
-                version="4.0.0",
-                collection_name="paloaltonetworks.panos",
-            )
-            module.exit_json(
-                stdout_lines=json.dumps(xmltodict.parse(x.element_str()), indent=2),
-                msg="Rule matched",
-                rule=x.about(),
-                rulebase=rulebase,
+            return rulebase, rules[0]
+
+    return None, None
+
+
+def match_flow(module, helper, parent, obj, matcher, found, flow):
+    """Matches one flow, returning a dict of msg, rule, rulebase and engine."""
+    rtype = module.params["rule_type"]
+    vsys = module.params["vsys"]
+
+    if matcher is not None:
+        try:
+            rulebase, rule = matcher.match(flow)
+        except PolicyMatchUnknown:
+            pass
+        except ValueError as e:
+            module.fail_json(msg="Invalid flow: {0}".format(e))
+        else:
+            if rule is None:
+                msg = "No matching {0} rule".format(rtype)
+            else:
+                msg = "Rule matched"
+            return dict(msg=msg, rule=rule, rulebase=rulebase, engine="local")
+
+    rule_name, test_string = device_match(module, helper, parent, rtype, flow)
+    if rule_name is None:
+        return dict(msg=test_string, rule=None, rulebase=None, engine="device")
+
+    if rule_name not in found:
+        if matcher is not None:
+            found[rule_name] = matcher.rules_by_name.get(rule_name, (None, None))
+        else:
+            found[rule_name] = find_rule(obj, vsys, rtype, rule_name)
+    rulebase, rule = found[rule_name]
+    if rule is None:
+        module.fail_json(
+            msg='Matched "{0}" with "{1}", but wasn\'t in any rulebase'.format(
+                rule_name, test_string
             )
+        )
+
+    return dict(msg="Rule matched", rule=rule, rulebase=rulebase, engine="device")
 
-    module.fail_json(
-        msg='Matched "{0}" with "{1}", but wasn\'t in any rulebase'.format(
-            rule_name, test_string
+
+def main():
+    helper = get_connection(
+        vsys=True,
+        with_classic_provider_spec=True,
+        panorama_error="Panorama is not supported",
+        argument_spec=dict(
+            rule_type=dict(default="security", choices=["security", "nat"]),
+            source_zone=dict(),
+            source_ip=dict(),
+            source_port=dict(type="int"),
+            source_user=dict(),
+            to_interface=dict(),
+            destination_zone=dict(),
+            destination_ip=dict(),
+            destination_port=dict(type="int"),
+            application=dict(),
+            protocol=dict(type="int"),
+            category=dict(),
+            engine=dict(default="device", choices=["device", "local"]),
+            flows=dict(type="list", elements="dict", options=FLOW_SPEC),
+            # TODO(gfreeman) - Remove this in the next role release.
+            vsys_id=dict(),
+            rulebase=dict(),
+        ),
+    )
+
+    required_one_of = list(helper.required_one_of)
+    for param in ("source_ip", "destination_ip", "destination_port", "protocol"):
+        required_one_of.append([param, "flows"])
+
+    module = AnsibleModule(
+        argument_spec=helper.argument_spec,
+        supports_check_mode=False,
+        required_one_of=required_one_of,
+        mutually_exclusive=[["flows", "source_ip"]],
+    )
+
+    # TODO(gfreeman) - Remove this in the next role release.
+    if not HAS_LIB:
+        module.fail_json(msg="Missing xmltodict library")
+    if module.params["vsys_id"] is not None:
+        module.fail_json(msg='Param "vsys_id" is removed; use vsys')
+    if module.params["rulebase"] is not None:
+        module.deprecate(
+            'Param "rulebase" is deprecated and may safely be removed from your playbook',
+            version="4.0.0",
+            collection_name="paloaltonetworks.panos",
         )
+
+    parent = helper.get_pandevice_parent(module)
+
+    if module.params["rule_type"] == "security":
+        obj = SecurityRule()
+    else:
+        obj = NatRule()
+    parent.add(obj)
+
+    # With the local engine, load the running config once.
+    matcher = None
+    if module.params["engine"] == "local":
+        try:
+            ans = obj.nearest_pandevice().xapi.show("/config")
+        except PanDeviceError as e:
+            module.fail_json(msg="Failed to get the running config: {0}".format(e))
+        matcher = PolicyMatcher(ans.find("./result/config"), module.params["vsys"], obj)
+
+    found = {}
+    flows = module.params["flows"]
+    if flows is not None:
+        matches = []
+        for flow in flows:
+            ans = match_flow(module, helper, parent, obj, matcher, found, flow)
+            if ans["rule"] is not None:
+                ans["rule"] = ans["rule"].about()
+            matches.append(ans)
+        module.exit_json(msg="Done", matches=matches)
+
+    flow = dict((k, module.params[k]) for k in FLOW_SPEC)
+    ans = match_flow(module, helper, parent, obj, matcher, found, flow)
+    if ans["rule"] is None:
+        module.exit_json(msg=ans["msg"], rule=[], engine=ans["engine"])
+
+    x = ans["rule"]
+    module.deprecate(
+        'The "stdout_lines" output is deprecated; use "rule" instead',
+        version="4.0.0",
+        collection_name="paloaltonetworks.panos",
+    )
+    module.exit_json(
+        stdout_lines=json.dumps(xmltodict.parse(x.element_str()), indent=2),
+        msg=ans["msg"],
+        rule=x.about(),
+        rulebase=ans["rulebase"],
+        engine=ans["engine"],
     )
 
 
@@ -41,7 +41,7 @@ notes:
     - Panorama is supported.
 extends_documentation_fragment:
     - paloaltonetworks.panos.fragments.transitional_provider
-    - paloaltonetworks.panos.fragments.network_resource_module_state
+    - paloaltonetworks.panos.fragments.rule_network_resource_module_state
     - paloaltonetworks.panos.fragments.gathered_filter
     - paloaltonetworks.panos.fragments.device_group
     - paloaltonetworks.panos.fragments.vsys
@@ -49,7 +49,9 @@ extends_documentation_fragment:
     - paloaltonetworks.panos.fragments.uuid
     - paloaltonetworks.panos.fragments.target
     - paloaltonetworks.panos.fragments.movement
+    - paloaltonetworks.panos.fragments.rule_order
     - paloaltonetworks.panos.fragments.audit_comment
+    - paloaltonetworks.panos.fragments.rulebase_config
 options:
     name:
         description:
@@ -249,6 +251,23 @@ EXAMPLES = """
     source_translation_type: 'dynamic-ip-and-port'
     source_translation_address_type: 'interface-address'
     source_translation_interface: 'ethernet1/1'
+
+- name: add or update several nat rules, in this order, at the top
+  paloaltonetworks.panos.panos_nat_rule2:
+    provider: '{{ provider }}'
+    location: 'top'
+    config:
+      - name: 'web-dnat'
+        from_zones: ['untrust']
+        to_zones: ['untrust']
+        destination_addresses: ['203.0.113.10']
+        destination_translated_address: '10.0.0.10'
+      - name: 'outbound-snat'
+        from_zones: ['trust']
+        to_zones: ['untrust']
+        source_translation_type: 'dynamic-ip-and-port'
+        source_translation_address_type: 'interface-address'
+        source_translation_interface: 'ethernet1/1'
 """
 
 RETURN = """
@@ -275,6 +294,7 @@ def main():
         with_target=True,
         with_movement=True,
         with_audit_comment=True,
+        with_bulk_config=True,
         sdk_cls=("policies", "NatRule"),
         sdk_params=dict(
             name=dict(required=True),
@@ -43,13 +43,42 @@ options:
     cmd:
         description:
             - The OP command to be performed.
+            - Mutually exclusive with I(cmds).
         type: str
-        required: true
+    cmds:
+        description:
+            - A list of OP commands to perform over the same connection, instead of I(cmd).
+            - The result of each command is returned in I(results), in the same order.
+            - The module fails if any of the commands failed, after running all of them.
+        type: list
+        elements: str
+        version_added: 3.5.0
+    workers:
+        description:
+            - How many of I(cmds) to run at the same time, each over its own API connection.
+            - Leave at 1 if the commands depend on each other.
+        type: int
+        default: 1
+        version_added: 3.5.0
     cmd_is_xml:
         description:
             - The cmd is already given in XML format, so don't convert it.
         type: bool
         default: false
+    output_format:
+        description:
+            - Which encodings of the output to return.
+            - With B(xml) only I(stdout_xml) is set, with B(json) only I(stdout).
+            - Returning just the one that is needed saves converting and passing large outputs twice.
+        type: str
+        choices: ['both', 'xml', 'json']
+        default: both
+        version_added: 3.5.0
+    dest:
+        description:
+            - Write the XML output of I(cmd) to this file instead of returning it.
+        type: path
+        version_added: 3.5.0
     ignore_disconnect:
         description:
             - Some op commands disconnect the client before returning a response.
@@ -85,6 +114,16 @@ EXAMPLES = """
     provider: '{{ provider }}'
     cmd: 'set serial-number "123456"'
     ignore_disconnect: true
+
+- name: show several things at once, as XML only
+  paloaltonetworks.panos.panos_op:
+    provider: '{{ provider }}'
+    cmds:
+      - 'show system info'
+      - 'show high-availability all'
+      - 'show routing route'
+    output_format: xml
+    workers: 3
 """
 
 RETURN = """
@@ -103,14 +142,45 @@ disconnected:
     returned: success
     type: bool
     sample: True
+results:
+    description: With I(cmds), the result of each command.
+    returned: when I(cmds) is set
+    type: list
+    elements: dict
+    version_added: 3.5.0
+    contains:
+        cmd:
+            description: The command.
+            type: str
+        changed:
+            description: If the command is one that may make changes.
+            type: bool
+        stdout:
+            description: Output of the command as JSON formatted string.
+            type: str
+        stdout_xml:
+            description: Output of the command as an XML formatted string.
+            type: str
+        disconnected:
+            description: If a disconnect was ignored or not.
+            type: bool
+        failed:
+            description: If the command failed.
+            type: bool
+        msg:
+            description: Why the command failed.
+            type: str
 """
 
 import json
-
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from http.client import RemoteDisconnected
 
 from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.common.text.converters import to_text
 from ansible_collections.paloaltonetworks.panos.plugins.module_utils.panos import (
+    clone_device,
     get_connection,
 )
 
@@ -128,32 +198,64 @@ except ImportError:
     pass
 
 
-def main():
-    helper = get_connection(
-        vsys=True,
-        with_classic_provider_spec=True,
-        argument_spec=dict(
-            cmd=dict(required=True),
-            cmd_is_xml=dict(default=False, type="bool"),
-            ignore_disconnect=dict(type="bool"),
-        ),
-    )
+# Commands, without their last token, whose last token has been found to
+# need quoting, so later commands of the same shape are quoted first.
+_QUOTED_SHAPES = set()
+_QUOTED_SHAPES_LOCK = threading.Lock()
 
-    module = AnsibleModule(
-        argument_spec=helper.argument_spec,
-        supports_check_mode=False,
-        required_one_of=helper.required_one_of,
-    )
 
-    parent = helper.get_pandevice_parent(module)
+class OpError(Exception):
+    pass
+
+
+def quote_last(cmd):
+    tokens = cmd.split()
+    tokens[-1] = '"{0}"'.format(tokens[-1])
+    return " ".join(tokens)
+
+
+def run_cmd(parent, cmd, cmd_is_xml, ignore_disconnect):
+    """
+    Runs one op command, returning its XML output.
+
+    A command in CLI syntax that fails is retried with its last token quoted,
+    unless its shape is known to need the quotes, in which case the quoted
+    form is tried first.
+    """
+    if cmd_is_xml:
+        attempts = [(cmd, False)]
+    else:
+        shape = tuple(cmd.split()[:-1])
+        attempts = [(cmd, True), (quote_last(cmd), True)]
+        if shape in _QUOTED_SHAPES:
+            attempts.reverse()
+
+    for idx, (attempt, cmd_xml) in enumerate(attempts):
+        try:
+            ans = parent.op(attempt, xml=True, cmd_xml=cmd_xml)
+        except RemoteDisconnected:
+            if not ignore_disconnect:
+                raise
+            return None
+        except PanDeviceError as e:
+            if cmd_is_xml:
+                raise OpError("Failed to run XML command : {0} : {1}".format(cmd, e))
+            elif idx == len(attempts) - 1:
+                raise OpError("Failed to run command : {0} : {1}".format(attempt, e))
+        else:
+            if not cmd_is_xml and attempt != cmd:
+                with _QUOTED_SHAPES_LOCK:
+                    _QUOTED_SHAPES.add(shape)
+            return ans
+
 
-    cmd = module.params["cmd"]
-    cmd_is_xml = module.params["cmd_is_xml"]
-    ignore_disconnect = module.params["ignore_disconnect"]
+def op_result(parent, cmd, params):
+    """Runs one op command, returning its result in the requested format."""
+    cmd_is_xml = params["cmd_is_xml"]
+    output_format = params["output_format"]
 
     resp = {
         "changed": True,
-        "msg": "Done",
         "stdout": "",
         "stdout_xml": "",
         "disconnected": False,
@@ -167,38 +269,101 @@ def main():
         resp["changed"] = False
 
     # Run the command.
-    try:
-        resp["stdout_xml"] = parent.op(cmd, xml=True, cmd_xml=(not cmd_is_xml))
-    except RemoteDisconnected:
+    ans = run_cmd(parent, cmd, cmd_is_xml, params["ignore_disconnect"])
+    if ans is None:
         resp["disconnected"] = True
-        if not ignore_disconnect:
-            raise
-    except PanDeviceError as e1:
-        if cmd_is_xml:
-            module.fail_json(
-                msg="Failed to run XML command : {0} : {1}".format(cmd, e1)
-            )
+        return resp
 
-        tokens = cmd.split()
-        tokens[-1] = '"{0}"'.format(tokens[-1])
-        cmd2 = " ".join(tokens)
-        try:
-            resp["stdout_xml"] = parent.op(cmd2, xml=True)
-        except RemoteDisconnected:
-            resp["disconnected"] = True
-            if not ignore_disconnect:
-                raise
-        except PanDeviceError as e2:
-            module.fail_json(msg="Failed to run command : {0} : {1}".format(cmd2, e2))
+    # The XML output may be bytes, depending on the pan-os-python version.
+    ans = to_text(ans)
 
-    if resp["stdout_xml"]:
+    if params.get("dest"):
+        with open(params["dest"], "w") as fd:
+            fd.write(ans)
+        return resp
+
+    if output_format != "json":
+        resp["stdout_xml"] = ans
+
+    if ans and output_format != "xml":
         try:
-            obj_dict = xmltodict.parse(resp["stdout_xml"])
+            obj_dict = xmltodict.parse(ans)
         except NameError:
             resp["stdout"] = "(install xmltodict to get output as JSON)"
         else:
             resp["stdout"] = json.dumps(obj_dict)
 
+    return resp
+
+
+def run_cmds(parent, params):
+    """Runs the cmds param, concurrently if workers is more than 1."""
+
+    def run(device, cmd):
+        try:
+            resp = op_result(device, cmd, params)
+        except OpError as e:
+            resp = dict(failed=True, msg="{0}".format(e))
+        else:
+            resp["failed"] = False
+        resp["cmd"] = cmd
+        return resp
+
+    cmds = params["cmds"]
+    if params["workers"] == 1:
+        return [run(parent, cmd) for cmd in cmds]
+
+    with ThreadPoolExecutor(max_workers=params["workers"]) as pool:
+        futures = [pool.submit(run, clone_device(parent), cmd) for cmd in cmds]
+        return [x.result() for x in futures]
+
+
+def main():
+    helper = get_connection(
+        vsys=True,
+        with_classic_provider_spec=True,
+        argument_spec=dict(
+            cmd=dict(),
+            cmds=dict(type="list", elements="str"),
+            workers=dict(type="int", default=1),
+            cmd_is_xml=dict(default=False, type="bool"),
+            ignore_disconnect=dict(type="bool"),
+            output_format=dict(default="both", choices=["both", "xml", "json"]),
+            dest=dict(type="path"),
+        ),
+        required_one_of=[["cmd", "cmds"]],
+    )
+
+    module = AnsibleModule(
+        argument_spec=helper.argument_spec,
+        supports_check_mode=False,
+        required_one_of=helper.required_one_of,
+        mutually_exclusive=[["cmd", "cmds"], ["cmds", "dest"]],
+    )
+
+    if module.params["workers"] < 1:
+        module.fail_json(msg="workers must be at least 1")
+
+    parent = helper.get_pandevice_parent(module)
+
+    if module.params["cmds"]:
+        results = run_cmds(parent, module.params)
+        changed = any(x.get("changed", False) for x in results)
+        failed = [x["cmd"] for x in results if x["failed"]]
+        if failed:
+            module.fail_json(
+                msg="Failed to run: {0}".format(", ".join(failed)),
+                changed=changed,
+                results=results,
+            )
+        module.exit_json(changed=changed, msg="Done", results=results)
+
+    try:
+        resp = op_result(parent, module.params["cmd"], module.params)
+    except OpError as e:
+        module.fail_json(msg="{0}".format(e))
+
+    resp["msg"] = "Done"
     module.exit_json(**resp)
 
 
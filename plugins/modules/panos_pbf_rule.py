@@ -44,6 +44,7 @@ extends_documentation_fragment:
     - paloaltonetworks.panos.fragments.uuid
     - paloaltonetworks.panos.fragments.target
     - paloaltonetworks.panos.fragments.movement
+    - paloaltonetworks.panos.fragments.rule_order
     - paloaltonetworks.panos.fragments.audit_comment
 options:
     name:
@@ -145,6 +145,11 @@ RETURN = """
 """
 
 from ansible.module_utils.basic import AnsibleModule
+from ansible_collections.paloaltonetworks.panos.plugins.module_utils.panos import (
+    IntervalSet,
+    ip_range,
+    port_ranges,
+)
 
 try:
     from panos import base, firewall, objects, panorama, policies
@@ -190,116 +195,111 @@ def get_rulebase(device, devicegroup):
     return rulebase
 
 
-def get_object(device, dev_group, obj_name):
-    # Search global address objects
-    match = device.find(obj_name, objects.AddressObject)
-    if match:
-        return match
-
-    # Search global address groups
-    match = device.find(obj_name, objects.AddressGroup)
-    if match:
-        return match
-
-    # Search Panorama device group
-    if isinstance(device, panorama.Panorama):
-        # Search device group address objects
-        match = dev_group.find(obj_name, objects.AddressObject)
-        if match:
-            return match
-
-        # Search device group address groups
-        match = dev_group.find(obj_name, objects.AddressGroup)
-        if match:
-            return match
-    return False
-
-
-def addr_in_obj(addr, obj):
-    ip = ipaddress.ip_address(addr)
-    # Process address objects
-    if isinstance(obj, objects.AddressObject):
-        if obj.type == "ip-netmask":
-            net = ipaddress.ip_network(obj.value)
-            if ip in net:
-                return True
-        if obj.type == "ip-range":
-            ip_range = obj.value.split("-")
-            lower = ipaddress.ip_address(ip_range[0])
-            upper = ipaddress.ip_address(ip_range[1])
-            if lower < ip < upper:
-                return True
-    return False
-
-
-def get_services(device, dev_group, svc_list, obj_list):
-    for svc in svc_list:
-
-        # Search global address objects
-        global_obj_match = device.find(svc, objects.ServiceObject)
-        if global_obj_match:
-            obj_list.append(global_obj_match)
-
-        # Search global address groups
-        global_grp_match = device.find(svc, objects.ServiceGroup)
-        if global_grp_match:
-            get_services(device, dev_group, global_grp_match.value, obj_list)
-
-        # Search Panorama device group
-        if isinstance(device, panorama.Panorama):
-
-            # Search device group address objects
-            dg_obj_match = dev_group.find(svc, objects.ServiceObject)
-            if dg_obj_match:
-                obj_list.append(dg_obj_match)
-
-            # Search device group address groups
-            dg_grp_match = dev_group.find(svc, objects.ServiceGroup)
-            if dg_grp_match:
-                get_services(device, dev_group, dg_grp_match.value, obj_list)
-
-    return obj_list
-
-
-def port_in_svc(orientation, port, protocol, obj):
-    # Process address objects
-    if orientation == "source":
-        for x in obj.source_port.split(","):
-            if "-" in x:
-                port_range = x.split("-")
-                lower = int(port_range[0])
-                upper = int(port_range[1])
-                if (lower <= int(port) <= upper) and (obj.protocol == protocol):
-                    return True
-            else:
-                if port == x and obj.protocol == protocol:
-                    return True
-    elif orientation == "destination":
-        for x in obj.destination_port.split(","):
-            if "-" in x:
-                port_range = x.split("-")
-                lower = int(port_range[0])
-                upper = int(port_range[1])
-                if (lower <= int(port) <= upper) and (obj.protocol == protocol):
-                    return True
-            else:
-                if port == x and obj.protocol == protocol:
-                    return True
-    return False
-
-
-def get_tag(device, dev_group, tag_name):
-    # Search global address objects
-    match = device.find(tag_name, objects.Tag)
-    if match:
-        return match
-    # Search Panorama device group
-    if isinstance(device, panorama.Panorama):
-        # Search device group address objects
-        match = dev_group.find(tag_name, objects.Tag)
-        if match:
-            return match
-    return False
+class Resolver(object):
+    """Resolves address and service names into interval sets.
+
+    The objects of the device (and the device group on Panorama) are indexed
+    by name once, and each distinct list of names from the rules is flattened,
+    through nested groups, into de-duplicated IP and port interval sets once.
+    """
+
+    def __init__(self, device, dev_group):
+        scopes = [device]
+        if isinstance(device, panorama.Panorama) and dev_group:
+            scopes.append(dev_group)
+
+        self.addresses = {}
+        self.services = {}
+        self.tags = set()
+        for scope in scopes:
+            for child in scope.children:
+                if isinstance(child, (objects.AddressObject, objects.AddressGroup)):
+                    self.addresses.setdefault(child.uid, child)
+                elif isinstance(child, (objects.ServiceObject, objects.ServiceGroup)):
+                    self.services.setdefault(child.uid, child)
+                elif isinstance(child, objects.Tag):
+                    self.tags.add(child.uid)
+        self._address_cache = {}
+        self._service_cache = {}
+
+    def address_sets(self, names):
+        """Returns the IP version to IntervalSet of a list of address names."""
+        key = tuple(names)
+        ans = self._address_cache.get(key)
+        if ans is None:
+            ranges = {}
+            seen = set()
+            for name in names:
+                self._add_address(name, ranges, seen)
+            ans = dict((k, IntervalSet(v)) for k, v in ranges.items())
+            self._address_cache[key] = ans
+
+        return ans
+
+    def _add_address(self, name, ranges, seen):
+        if name in seen:
+            return
+        seen.add(name)
+
+        obj = self.addresses.get(name)
+        if obj is None:
+            value = name
+        elif isinstance(obj, objects.AddressGroup):
+            for member in obj.static_value or []:
+                self._add_address(member, ranges, seen)
+            return
+        elif obj.type in ("ip-netmask", "ip-range"):
+            value = obj.value
+        else:
+            return
+
+        ans = ip_range(value)
+        if ans is not None:
+            ranges.setdefault(ans[0], []).append(ans[1:])
+
+    def port_sets(self, names):
+        """Returns the (orientation, protocol) to IntervalSet of service names."""
+        key = tuple(names)
+        ans = self._service_cache.get(key)
+        if ans is None:
+            ranges = {}
+            seen = set()
+            for name in names:
+                self._add_service(name, ranges, seen)
+            ans = dict((k, IntervalSet(v)) for k, v in ranges.items())
+            self._service_cache[key] = ans
+
+        return ans
+
+    def _add_service(self, name, ranges, seen):
+        if name in seen:
+            return
+        seen.add(name)
+
+        obj = self.services.get(name)
+        if isinstance(obj, objects.ServiceGroup):
+            for member in obj.value or []:
+                self._add_service(member, ranges, seen)
+        elif obj is not None:
+            for orientation, value in (
+                ("source", obj.source_port),
+                ("destination", obj.destination_port),
+            ):
+                ports = port_ranges(value)
+                # A service without a source port matches any source port.
+                if not ports and orientation == "source":
+                    ports = [(0, 65535)]
+                ranges.setdefault((orientation, obj.protocol), []).extend(ports)
+
+
+def addr_in_rule(resolver, ip, names):
+    sets = resolver.address_sets(names)
+    return ip.version in sets and int(ip) in sets[ip.version]
+
+
+def port_in_rule(resolver, orientation, port, protocol, names):
+    ports = resolver.port_sets(names).get((orientation, protocol))
+    return ports is not None and int(port) in ports
 
 
 def main():
@@ -384,6 +384,11 @@ def main():
     rulelist = rulebase.children
     hitbase = policies.Rulebase()
     loose_match = True
+    resolver = Resolver(device, dev_group)
+    if source_ip:
+        source_addr = ipaddress.ip_address(source_ip)
+    if destination_ip:
+        destination_addr = ipaddress.ip_address(destination_ip)
 
     # Process each rule
     for rule in rulelist:
@@ -394,9 +399,7 @@ def main():
             if loose_match and "any" in rule.fromzone:
                 source_zone_match = True
             else:
-                for object_string in rule.fromzone:
-                    if object_string == source_zone:
-                        source_zone_match = True
+                source_zone_match = source_zone in rule.fromzone
             hitlist.append(source_zone_match)
 
         if destination_zone:
@@ -404,9 +407,7 @@ def main():
             if loose_match and "any" in rule.tozone:
                 destination_zone_match = True
             else:
-                for object_string in rule.tozone:
-                    if object_string == destination_zone:
-                        destination_zone_match = True
+                destination_zone_match = destination_zone in rule.tozone
             hitlist.append(destination_zone_match)
 
         if source_ip:
@@ -414,30 +415,7 @@ def main():
             if loose_match and "any" in rule.source:
                 source_ip_match = True
             else:
-                for object_string in rule.source:
-                    # Get a valid AddressObject or AddressGroup
-                    obj = get_object(device, dev_group, object_string)
-                    # Otherwise the object_string is not an object and should be handled differently
-                    if obj is False:
-                        if "-" in object_string:
-                            obj = ipaddress.ip_address(source_ip)
-                            source_range = object_string.split("-")
-                            source_lower = ipaddress.ip_address(source_range[0])
-                            source_upper = ipaddress.ip_address(source_range[1])
-                            if source_lower <= obj <= source_upper:
-                                source_ip_match = True
-                        else:
-                            if source_ip == object_string:
-                                source_ip_match = True
-                    if isinstance(obj, objects.AddressObject) and addr_in_obj(
-                        source_ip, obj
-                    ):
-                        source_ip_match = True
-                    elif isinstance(obj, objects.AddressGroup) and obj.static_value:
-                        for member_string in obj.static_value:
-                            member = get_object(device, dev_group, member_string)
-                            if addr_in_obj(source_ip, member):
-                                source_ip_match = True
+                source_ip_match = addr_in_rule(resolver, source_addr, rule.source)
             hitlist.append(source_ip_match)
 
         if destination_ip:
@@ -445,79 +423,38 @@ def main():
             if loose_match and "any" in rule.destination:
                 destination_ip_match = True
             else:
-                for object_string in rule.destination:
-                    # Get a valid AddressObject or AddressGroup
-                    obj = get_object(device, dev_group, object_string)
-                    # Otherwise the object_string is not an object and should be handled differently
-                    if obj is False:
-                        if "-" in object_string:
-                            obj = ipaddress.ip_address(destination_ip)
-                            destination_range = object_string.split("-")
-                            destination_lower = ipaddress.ip_address(
-                                destination_range[0]
-                            )
-                            destination_upper = ipaddress.ip_address(
-                                destination_range[1]
-                            )
-                            if destination_lower <= obj <= destination_upper:
-                                destination_ip_match = True
-                        else:
-                            if destination_ip == object_string:
-                                destination_ip_match = True
-                    if isinstance(obj, objects.AddressObject) and addr_in_obj(
-                        destination_ip, obj
-                    ):
-                        destination_ip_match = True
-                    elif isinstance(obj, objects.AddressGroup) and obj.static_value:
-                        for member_string in obj.static_value:
-                            member = get_object(device, dev_group, member_string)
-                            if addr_in_obj(destination_ip, member):
-                                destination_ip_match = True
+                destination_ip_match = addr_in_rule(
+                    resolver, destination_addr, rule.destination
+                )
             hitlist.append(destination_ip_match)
 
         if source_port:
             source_port_match = False
-            orientation = "source"
             if loose_match and (rule.service[0] == "any"):
                 source_port_match = True
             elif rule.service[0] == "application-default":
                 source_port_match = False  # Fix this once apps are supported
             else:
-                service_list = []
-                service_list = get_services(
-                    device, dev_group, rule.service, service_list
+                source_port_match = port_in_rule(
+                    resolver, "source", source_port, protocol, rule.service
                 )
-                for obj in service_list:
-                    if port_in_svc(orientation, source_port, protocol, obj):
-                        source_port_match = True
-                        break
             hitlist.append(source_port_match)
 
         if destination_port:
             destination_port_match = False
-            orientation = "destination"
             if loose_match and (rule.service[0] == "any"):
                 destination_port_match = True
             elif rule.service[0] == "application-default":
                 destination_port_match = False  # Fix this once apps are supported
             else:
-                service_list = []
-                service_list = get_services(
-                    device, dev_group, rule.service, service_list
+                destination_port_match = port_in_rule(
+                    resolver, "destination", destination_port, protocol, rule.service
                 )
-                for obj in service_list:
-                    if port_in_svc(orientation, destination_port, protocol, obj):
-                        destination_port_match = True
-                        break
             hitlist.append(destination_port_match)
 
         if tag_name:
-            tag_match = False
-            if rule.tag:
-                for object_string in rule.tag:
-                    obj = get_tag(device, dev_group, object_string)
-                    if obj and (obj.name == tag_name):
-                        tag_match = True
+            tag_match = bool(rule.tag) and tag_name in rule.tag
+            tag_match = tag_match and tag_name in resolver.tags
             hitlist.append(tag_match)
 
         # Add to hit rulebase
@@ -64,6 +64,15 @@ options:
             - Use with caution only when you actually use different, English based locales but you do not have B(en_US.UTF-8) installed.
         type: bool
         default: false
+    workers:
+        description:
+            - How many checks to run at the same time, each over its own API connection.
+            - Op commands needed by more than one check, such as B(show system info), are run only once and their
+              result is shared between the checks.
+            - Set to 1 to run the checks one after another.
+        type: int
+        default: 4
+        version_added: 3.5.0
 """
 
 EXAMPLES = """
@@ -137,10 +146,27 @@ response:
                 - Meaningful only for failed tests as the ones succeeded are self explanatory.
             type: str
             returned: always
+timings:
+    description:
+        - The time each check took to run, in seconds, keyed by check name.
+        - Includes all checks that were run, regardless of I(force_fail).
+    type: dict
+    returned: always
+    version_added: 3.5.0
+    sample:
+        candidate_config: 0.412
+        content_version: 3.871
+        free_disk_space: 0.395
 """
 
+import copy
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
 from ansible.module_utils.basic import AnsibleModule
 from ansible_collections.paloaltonetworks.panos.plugins.module_utils.panos import (
+    clone_device,
     get_connection,
 )
 
@@ -150,10 +176,63 @@ try:
     from panos_upgrade_assurance.check_firewall import CheckFirewall
     from panos_upgrade_assurance.exceptions import UpdateServerConnectivityException
     from panos_upgrade_assurance.firewall_proxy import FirewallProxy
+    from panos_upgrade_assurance.utils import ConfigParser
 except ImportError:
     pass
 
 
+class OpCache(object):
+    """
+    Op command results shared by the checks running in all threads.
+
+    The first check to need a command runs it, any others needing it at the
+    same time wait for that result instead of running it again.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.results = {}
+
+    def get(self, key, fetch):
+        with self.lock:
+            future = self.results.get(key)
+            owner = future is None
+            if owner:
+                future = self.results[key] = Future()
+
+        if owner:
+            try:
+                future.set_result(fetch())
+            except Exception as e:
+                future.set_exception(e)
+
+        # Checks may modify what they are given.
+        return copy.deepcopy(future.result())
+
+    def share(self, firewall):
+        """Makes the FirewallProxy run its op commands through the cache."""
+        op_parser = firewall.op_parser
+
+        def cached_op_parser(cmd, cmd_in_xml=False, return_xml=False):
+            return self.get(
+                (cmd, cmd_in_xml, return_xml),
+                lambda: op_parser(cmd, cmd_in_xml=cmd_in_xml, return_xml=return_xml),
+            )
+
+        firewall.op_parser = cached_op_parser
+
+
+def run_check(parent, cache, check, skip_force_locale):
+    """Runs a single check over its own connection, returning it and its time."""
+    firewall = FirewallProxy(firewall=clone_device(parent))
+    cache.share(firewall)
+    checks = CheckFirewall(node=firewall, skip_force_locale=skip_force_locale)
+
+    start = time.time()
+    result = checks.run_readiness_checks(checks_configuration=[check])
+    return result, time.time() - start
+
+
 def main():
     results = dict()
 
@@ -165,6 +244,7 @@ def main():
             checks=dict(type="list", default=["all"], elements="raw"),
             force_fail=dict(type="bool", default=False),
             skip_force_locale=dict(type="bool", default=False),
+            workers=dict(type="int", default=4),
         ),
         panorama_error="This is a firewall only module",
     )
@@ -174,19 +254,44 @@ def main():
         supports_check_mode=False,
     )
     results = dict()
+    timings = dict()
     module_failed = False
 
-    firewall = FirewallProxy(firewall=helper.get_pandevice_parent(module))
+    if module.params["workers"] < 1:
+        module.fail_json(msg="workers must be at least 1")
 
+    parent = helper.get_pandevice_parent(module)
+
+    # Expand "all" and exclusions the same way run_readiness_checks() does.
     checks = CheckFirewall(
-        node=firewall, skip_force_locale=module.params["skip_force_locale"]
+        node=FirewallProxy(firewall=parent),
+        skip_force_locale=module.params["skip_force_locale"],
     )
+    checks_configuration = ConfigParser(
+        valid_elements=set(checks._check_method_mapping.keys()),
+        requested_config=module.params["checks"],
+    ).prepare_config()
 
+    cache = OpCache()
     try:
-        results = checks.run_readiness_checks(
-            checks_configuration=module.params["checks"]
-        )
+        with ThreadPoolExecutor(max_workers=module.params["workers"]) as pool:
+            futures = [
+                pool.submit(
+                    run_check,
+                    parent,
+                    cache,
+                    check,
+                    module.params["skip_force_locale"],
+                )
+                for check in checks_configuration
+            ]
+            for future in futures:
+                result, elapsed = future.result()
+                results.update(result)
+                for name in result:
+                    timings[name] = round(elapsed, 3)
     except UpdateServerConnectivityException as exc:
+        results = dict()
         results["active_support"] = {
             "state": False,
             "reason": getattr(exc, "message", repr(exc)),
@@ -200,7 +305,9 @@ def main():
                 else:
                     module_failed = True
 
-    module.exit_json(changed=False, response=results, failed=module_failed)
+    module.exit_json(
+        changed=False, response=results, timings=timings, failed=module_failed
+    )
 
 
 if __name__ == "__main__":
@@ -97,6 +97,8 @@ results:
     sample: { '1.1.1.1': ['First_Tag', 'Second_Tag'] }
 """
 
+import xml.etree.ElementTree as ET
+
 from ansible.module_utils.basic import AnsibleModule
 from ansible_collections.paloaltonetworks.panos.plugins.module_utils.panos import (
     get_connection,
@@ -111,6 +113,47 @@ except ImportError:
         pass
 
 
+# Max size of a single uid-message, leaving room for URL encoding under the
+# 5MB XML API request limit.
+UID_MESSAGE_MAX_SIZE = int(1.5e6)
+
+
+def uid_messages(action, delta):
+    """
+    Builds the uid-messages registering or unregistering tags in bulk.
+
+    Each message is kept under UID_MESSAGE_MAX_SIZE, so a large delta is
+    split into as few API calls as possible.
+
+    :param action: "register" or "unregister".
+    :param delta: Dict of IP address to the tags to (un)register.
+    """
+    messages = []
+    root = entries = None
+    size = 0
+
+    for ip, tags in delta.items():
+        entry = ET.Element("entry", {"ip": ip})
+        tag = ET.SubElement(entry, "tag")
+        for name in sorted(tags):
+            ET.SubElement(tag, "member").text = name
+        entry_size = len(ET.tostring(entry))
+
+        if root is None or size + entry_size > UID_MESSAGE_MAX_SIZE:
+            root = ET.fromstring(
+                "<uid-message><version>1.0</version><type>update</type>"
+                "<payload/></uid-message>"
+            )
+            entries = ET.SubElement(root.find("payload"), action)
+            messages.append(root)
+            size = 0
+
+        entries.append(entry)
+        size += entry_size
+
+    return messages
+
+
 def main():
     helper = get_connection(
         vsys=True,
@@ -131,43 +174,45 @@ def main():
     # Verify libs are present, get parent object.
     device = helper.get_pandevice_parent(module)
 
-    ips = module.params["ips"]
+    # Remove duplicates, keeping the order.
+    ips = list(dict.fromkeys(module.params["ips"]))
     tags = module.params["tags"]
     state = module.params["state"]
 
     changed = False
 
     try:
-        registered_ips = device.userid.get_registered_ip(ips, tags=tags)
+        # One snapshot of the current tags, the result is computed from it.
+        registered_ips = device.userid.get_registered_ip(ips)
 
+        delta = {}
         for ip in ips:
-            if state == "present":
-                if registered_ips.get(ip):
-                    registered = set(registered_ips.get(ip))
-                else:
-                    registered = set()
-
-                to_register = set(tags) - registered
+            registered = set(registered_ips.get(ip, []))
 
-                if len(to_register) > 0:
-                    if not module.check_mode:
-                        device.userid.register(ip, tags=to_register)
-                    changed = True
-
-            elif state == "absent":
-                if registered_ips.get(ip):
-                    registered = set(registered_ips.get(ip))
-                else:
-                    registered = set()
+            if state == "present":
+                tags_delta = set(tags) - registered
+            else:
+                tags_delta = registered & set(tags)
 
-                to_unregister = registered & set(tags)
+            if tags_delta:
+                delta[ip] = tags_delta
 
-                if len(to_unregister) > 0:
-                    if not module.check_mode:
-                        device.userid.unregister(ip, tags=to_unregister)
-                    changed = True
+        if delta:
+            changed = True
+            action = "register" if state == "present" else "unregister"
+            if not module.check_mode:
+                for message in uid_messages(action, delta):
+                    device.userid.send(message)
 
-        registered_ips = device.userid.get_registered_ip(ips)
+        for ip, tags_delta in delta.items():
+            if state == "present":
+                registered_ips[ip] = registered_ips.get(ip, []) + sorted(tags_delta)
+            else:
+                registered_ips[ip] = [
+                    x for x in registered_ips[ip] if x not in tags_delta
+                ]
+                if not registered_ips[ip]:
+                    del registered_ips[ip]
 
     except PanDeviceError as e:
         module.fail_json(msg="Failed register/unregister: {0}".format(e))
@@ -49,7 +49,7 @@ notes:
     - Panorama is supported.
 extends_documentation_fragment:
     - paloaltonetworks.panos.fragments.transitional_provider
-    - paloaltonetworks.panos.fragments.network_resource_module_state
+    - paloaltonetworks.panos.fragments.rule_network_resource_module_state
     - paloaltonetworks.panos.fragments.gathered_filter
     - paloaltonetworks.panos.fragments.device_group
     - paloaltonetworks.panos.fragments.vsys
@@ -58,7 +58,9 @@ extends_documentation_fragment:
     - paloaltonetworks.panos.fragments.uuid
     - paloaltonetworks.panos.fragments.target
     - paloaltonetworks.panos.fragments.movement
+    - paloaltonetworks.panos.fragments.rule_order
     - paloaltonetworks.panos.fragments.audit_comment
+    - paloaltonetworks.panos.fragments.rulebase_config
 options:
     rule_name:
         description:
@@ -328,6 +330,26 @@ EXAMPLES = """
     action: 'allow'
     location: 'before'
     existing_rule: 'Allow MySQL'
+
+- name: put several rules in order at the top of the rulebase
+  paloaltonetworks.panos.panos_security_rule:
+    provider: '{{ provider }}'
+    rule_order: ['SSH permit', 'Allow HTTP', 'Allow MySQL']
+    location: 'top'
+
+- name: set the whole rulebase, in order, in one task
+  paloaltonetworks.panos.panos_security_rule:
+    provider: '{{ provider }}'
+    state: 'overridden'
+    config:
+      - rule_name: 'SSH permit'
+        source_zone: ['untrust']
+        destination_zone: ['trust']
+        destination_ip: ['1.1.1.1']
+        application: ['ssh']
+        action: 'allow'
+      - rule_name: 'Deny all'
+        action: 'deny'
 """
 
 RETURN = """
@@ -359,7 +381,7 @@ class Helper(ConnectionHelper):
             module.params["device_group"] = module.params["devicegroup"]
 
     def spec_handling(self, spec, module):
-        if module.params["state"] not in ("present", "replaced"):
+        if module.params["state"] not in ("present", "replaced", "overridden"):
             return
 
         # The hip-profiles was removed somewhere in PAN-OS v10, either
@@ -390,6 +412,7 @@ def main():
         with_target=True,
         with_movement=True,
         with_audit_comment=True,
+        with_bulk_config=True,
         sdk_cls=("policies", "SecurityRule"),
         sdk_params=dict(
             rule_name=dict(required=True, sdk_param="name"),
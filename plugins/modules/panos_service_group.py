@@ -39,6 +39,7 @@ extends_documentation_fragment:
     - paloaltonetworks.panos.fragments.device_group
     - paloaltonetworks.panos.fragments.network_resource_module_state
     - paloaltonetworks.panos.fragments.gathered_filter
+    - paloaltonetworks.panos.fragments.bulk_config
     - paloaltonetworks.panos.fragments.deprecated_commit
 options:
     name:
@@ -89,6 +90,7 @@ def main():
         with_classic_provider_spec=True,
         with_network_resource_module_state=True,
         with_gathered_filter=True,
+        with_bulk_config=True,
         with_commit=True,
         sdk_cls=("objects", "ServiceGroup"),
         sdk_params=dict(
@@ -39,6 +39,7 @@ extends_documentation_fragment:
     - paloaltonetworks.panos.fragments.device_group
     - paloaltonetworks.panos.fragments.network_resource_module_state
     - paloaltonetworks.panos.fragments.gathered_filter
+    - paloaltonetworks.panos.fragments.bulk_config
     - paloaltonetworks.panos.fragments.deprecated_commit
 options:
     name:
@@ -133,6 +134,7 @@ def main():
         with_classic_provider_spec=True,
         with_network_resource_module_state=True,
         with_gathered_filter=True,
+        with_bulk_config=True,
         with_commit=True,
         min_pandevice_version=(1, 7, 3),
         sdk_cls=("objects", "ServiceObject"),
@@ -42,15 +42,21 @@ requirements:
 notes:
     - This is an offline module, no device connection is made.
     - Check mode is not supported.
+    - When a snapshot is given as a handle to a snapshot store, each state area is loaded from the store only when it is
+      compared, so only one area of each snapshot is held in memory at a time.
 options:
     left_snapshot:
-        description: One of the snapshots to compare. It can be any snapshot taken in any time, but normally, in an upgrade scenario,
-                     you would think about it as the pre-upgrade snapshot.
+        description:
+            - One of the snapshots to compare. It can be any snapshot taken in any time, but normally, in an upgrade scenario,
+              you would think about it as the pre-upgrade snapshot.
+            - This is either the I(response) or the I(snapshot) handle returned by M(paloaltonetworks.panos.panos_state_snapshot).
         type: dict
         required: true
     right_snapshot:
-        description: One of the snapshots to compare. It can be any snapshot taken in any time, but normally, in an upgrade scenario,
-                     you would think about it as the post-upgrade snapshot.
+        description:
+            - One of the snapshots to compare. It can be any snapshot taken in any time, but normally, in an upgrade scenario,
+              you would think about it as the post-upgrade snapshot.
+            - This is either the I(response) or the I(snapshot) handle returned by M(paloaltonetworks.panos.panos_state_snapshot).
         type: dict
         required: true
     reports:
@@ -76,6 +82,11 @@ EXAMPLES = """
           properties:
             - '!serial'
     register: report
+- name: Compare two snapshots saved to a snapshot store
+  panos_snapshot_report:
+    left_snapshot: '{{ pre_upgrade.snapshot }}'
+    right_snapshot: '{{ post_upgrade.snapshot }}'
+  register: report
 - name: Print the report to stdout
   ansible.builtin.debug:
     var: report.response
@@ -160,6 +171,9 @@ response:
 """
 
 from ansible.module_utils.basic import AnsibleModule
+from ansible_collections.paloaltonetworks.panos.plugins.module_utils.panos import (
+    SnapshotStore,
+)
 import sys
 
 PUA_AVAILABLE = True
@@ -167,6 +181,7 @@ try:
     import panos_upgrade_assurance
     from panos_upgrade_assurance.snapshot_compare import SnapshotCompare
     from panos_upgrade_assurance.exceptions import SnapshotSchemeMismatchException
+    from panos_upgrade_assurance.utils import ConfigParser
 except ImportError:
     PUA_AVAILABLE = False
     pass
@@ -174,6 +189,63 @@ except ImportError:
 MIN_PUA_VER = (2, 0, 0)
 
 
+class Snapshot(object):
+    """The state areas of a snapshot, given in full or as a store handle."""
+
+    def __init__(self, snapshot):
+        if SnapshotStore.is_handle(snapshot):
+            self.store = SnapshotStore.open(snapshot)
+            self.digests = snapshot["areas"]
+        else:
+            self.store = None
+            self.data = snapshot
+
+    @property
+    def areas(self):
+        if self.store is None:
+            return list(self.data)
+        return list(self.digests)
+
+    def digest(self, area):
+        if self.store is None:
+            return None
+        return self.digests.get(area)
+
+    def load(self, area):
+        """Returns a snapshot of just the area, or an empty one if it's missing."""
+        if self.store is None:
+            if area in self.data:
+                return {area: self.data[area]}
+        elif area in self.digests:
+            return {area: self.store.get(self.digests[area])}
+        return {}
+
+
+def compare_areas(left, right, reports):
+    """Compares two snapshots one state area at a time."""
+    areas = set(left.areas) | set(right.areas)
+    results = {}
+    for report in ConfigParser(
+        valid_elements=areas, requested_config=reports
+    ).prepare_config():
+        area = next(iter(report)) if isinstance(report, dict) else report
+
+        left_snap = left.load(area)
+        if left.digest(area) is not None and left.digest(area) == right.digest(area):
+            right_snap = left_snap
+        else:
+            right_snap = right.load(area)
+
+        results.update(
+            SnapshotCompare(
+                left_snapshot=left_snap,
+                right_snapshot=right_snap,
+            ).compare_snapshots(reports=[report])
+        )
+
+    return results
+
+
 def main():
     module = AnsibleModule(
         argument_spec=dict(
@@ -199,13 +271,21 @@ def main():
             )
         )
 
+    left = Snapshot(module.params["left_snapshot"])
+    right = Snapshot(module.params["right_snapshot"])
+
     try:
-        results = SnapshotCompare(
-            left_snapshot=module.params["left_snapshot"],
-            right_snapshot=module.params["right_snapshot"],
-        ).compare_snapshots(reports=module.params["reports"])
+        if left.store is None and right.store is None:
+            results = SnapshotCompare(
+                left_snapshot=module.params["left_snapshot"],
+                right_snapshot=module.params["right_snapshot"],
+            ).compare_snapshots(reports=module.params["reports"])
+        else:
+            results = compare_areas(left, right, module.params["reports"])
     except SnapshotSchemeMismatchException as exc:
         module.fail_json(msg=getattr(exc, "message", repr(exc)))
+    except (IOError, OSError) as e:
+        module.fail_json(msg="Failed to load snapshot: {0}".format(e))
 
     module.exit_json(changed=False, response=results)
 
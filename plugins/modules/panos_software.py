@@ -86,6 +86,33 @@ options:
             - Do a software check before doing the upgrade.
         type: bool
         default: True
+    devices:
+        description:
+            - Serial numbers of firewalls managed by Panorama to bring to I(version), instead of the device connected to.
+            - The provider must be a Panorama, with each firewall reached through it.
+            - One software check is done per model family, and each firewall only checks for itself if its own
+              list of available versions does not yet have the needed images.
+            - Images are downloaded and installed on up to I(workers) firewalls at a time. Restarts happen in waves of
+              up to I(batch_size) firewalls once each member is installed, with the next wave started only after every
+              firewall in the current one is back up with an autocommit done, as M(paloaltonetworks.panos.panos_check) does.
+            - The members of an HA pair are never in the same wave, and the passive member is restarted first.
+            - No more waves are started after a firewall fails.
+            - I(sync_to_peer) is ignored, as each firewall downloads its own images.
+        type: list
+        elements: str
+        version_added: 3.5.0
+    workers:
+        description:
+            - With I(devices), how many firewalls to check, download to and install on at the same time.
+        type: int
+        default: 4
+        version_added: 3.5.0
+    batch_size:
+        description:
+            - With I(devices), how many firewalls to restart at the same time in each wave.
+        type: int
+        default: 1
+        version_added: 3.5.0
 """
 
 EXAMPLES = """
@@ -117,6 +144,17 @@ EXAMPLES = """
     named_config: '9.1.10_backup_named_config.xml'
     install: true
     restart: true
+
+- name: Upgrade firewalls managed by Panorama, two at a time
+  paloaltonetworks.panos.panos_software:
+    provider: '{{ panorama_provider }}'
+    version: '11.1.4'
+    devices:
+      - '007951000012345'
+      - '007951000012346'
+      - '007951000012347'
+    restart: true
+    batch_size: 2
 """
 
 RETURN = """
@@ -124,20 +162,64 @@ version:
     description: After performing the software install, returns the version installed on the device.
     type: str
     returned: on success
+devices:
+    description: With I(devices), the result per firewall, keyed by serial number.
+    type: dict
+    returned: when I(devices) is set
+    version_added: 3.5.0
+    contains:
+        version:
+            description: The version running on the firewall.
+            type: str
+        changed:
+            description: If anything was done to the firewall.
+            type: bool
+        downloaded:
+            description: The images downloaded.
+            type: list
+            elements: str
+        installed:
+            description: If I(version) was installed.
+            type: bool
+        restarted:
+            description: If the firewall was restarted.
+            type: bool
+        failed:
+            description: If upgrading the firewall failed.
+            type: bool
+        msg:
+            description: Why upgrading the firewall failed.
+            type: str
+    sample:
+        "007951000012345":
+            version: 11.1.4
+            changed: true
+            downloaded: [11.1.0, 11.1.4]
+            installed: true
+            restarted: true
+            failed: false
 """
 
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 from ansible.module_utils.basic import AnsibleModule
 from ansible_collections.paloaltonetworks.panos.plugins.module_utils.panos import (
+    check_autocommit,
     get_connection,
+    poll_intervals,
 )
 
 try:
     from panos import PanOSVersion
     from panos.errors import PanDeviceError
+    from panos.firewall import Firewall
 except ImportError:
     try:
         from pandevice import PanOSVersion
         from pandevice.errors import PanDeviceError
+        from pandevice.firewall import Firewall
     except ImportError:
         pass
 
@@ -148,12 +230,41 @@ BASE_IMAGE_OVERRIDES = {
 }
 
 
+# HA states restarted in the first wave, before their peer.
+PASSIVE_STATES = ("passive", "active-secondary")
+
+
 def needs_download(device, version):
     device.software.info()
 
     return not device.software.versions[str(version)]["downloaded"]
 
 
+def images_for(current, target):
+    """Returns the images to download to go from current to target."""
+    images = []
+    if (current.major != target.major) or (current.minor != target.minor):
+        base_str = BASE_IMAGE_OVERRIDES.get(
+            (target.major, target.minor),
+            "{0}.{1}.0".format(target.major, target.minor),
+        )
+        images.append(PanOSVersion(base_str))
+
+    if target not in images:
+        images.append(target)
+
+    return images
+
+
+def check_named_config(device, named_config):
+    """Raises PanDeviceError if the named config does not exist."""
+    device.op(
+        "<show><config><saved>" + named_config + "</saved></config></show>",
+        xml=True,
+        cmd_xml=False,
+    )
+
+
 def is_valid_sequence(current, target):
     # PAN-OS version sequence for Skip Software Version Upgrade supported from 10.1
     # It is recommended to skip at most 2 major/minor release from 10.1 and 3 major/minor release from 11.0
@@ -234,6 +345,253 @@ def is_valid_sequence(current, target):
     return False
 
 
+def fleet_inventory(panorama):
+    """Returns the firewalls connected to Panorama, by serial number."""
+    ans = panorama.op("show devices connected")
+
+    inventory = {}
+    for entry in ans.findall(".//devices/entry"):
+        serial = entry.findtext("serial") or entry.get("name")
+        inventory[serial] = dict(
+            version=entry.findtext("sw-version"),
+            family=entry.findtext("family") or entry.findtext("model"),
+            ha_state=entry.findtext("ha/state"),
+            peer=entry.findtext("ha/peer/serial"),
+        )
+
+    return inventory
+
+
+def restart_waves(serials, inventory, batch_size):
+    """
+    Groups firewalls into waves to restart one after the other.
+
+    Passive HA members are placed first, and each firewall goes in the first
+    wave with room after its peer's, so both members of an HA pair are never
+    down at the same time.
+    """
+    order = sorted(
+        serials, key=lambda x: inventory[x]["ha_state"] not in PASSIVE_STATES
+    )
+    waves = []
+    placed = {}
+    for serial in order:
+        idx = placed.get(inventory[serial]["peer"], -1) + 1
+        while idx < len(waves) and len(waves[idx]) >= batch_size:
+            idx += 1
+        if idx == len(waves):
+            waves.append([])
+        waves[idx].append(serial)
+        placed[serial] = idx
+
+    return waves
+
+
+def uptime(device):
+    """Returns the seconds since the firewall booted, or None if unknown."""
+    text = device.op("show system info").findtext(".//system/uptime") or ""
+    match = re.search(r"(?:(\d+) days?, )?(\d+):(\d+):(\d+)", text)
+    if match is None:
+        return None
+
+    days, hours, minutes, seconds = (int(x or 0) for x in match.groups())
+    return ((days * 24 + hours) * 60 + minutes) * 60 + seconds
+
+
+def wait_ready(device, version, timeout, started):
+    """
+    Waits for a restarted firewall to run the version with autocommit done.
+
+    Until the firewall is seen to go down, or to have booted since the
+    restart was requested at the started time, its version and jobs may
+    still be those from before the restart.
+    """
+    end_time = time.time() + timeout
+    went_down = False
+    for delay in poll_intervals(max_interval=10):
+        try:
+            device.refresh_system_info()
+            if not went_down:
+                booted = uptime(device)
+                went_down = booted is not None and booted < time.time() - started
+            jobs = device.op("show jobs all").findall(".//job")
+        except PanDeviceError:
+            went_down = True
+        else:
+            if went_down and check_autocommit(jobs):
+                return PanOSVersion(device.version) == version
+
+        if time.time() > end_time:
+            raise PanDeviceError("Timeout waiting for the firewall to be ready")
+        time.sleep(delay)
+
+
+def prepare_device(device, current, target, params, check_mode):
+    """Downloads the images to a firewall and installs the target."""
+    result = dict(
+        version=str(current),
+        changed=False,
+        downloaded=[],
+        installed=False,
+        restarted=False,
+        failed=False,
+    )
+    if target == current:
+        return result
+
+    if params["install"] and not is_valid_sequence(current, target):
+        result.update(
+            failed=True,
+            msg="Version Sequence is invalid: {0} -> {1}".format(current, target),
+        )
+        return result
+
+    try:
+        if params["named_config"]:
+            check_named_config(device, params["named_config"])
+
+        if params["download"]:
+            images = images_for(current, target)
+            device.software.info()
+            if any(str(x) not in device.software.versions for x in images):
+                device.software.check()
+
+            for image in images:
+                if str(image) not in device.software.versions:
+                    raise PanDeviceError("Version {0} is not available".format(image))
+
+                if not device.software.versions[str(image)]["downloaded"]:
+                    if not check_mode:
+                        device.software.download(image, sync=True)
+                    result["downloaded"].append(str(image))
+                    result["changed"] = True
+
+        if params["install"]:
+            if not check_mode:
+                if params["named_config"]:
+                    device.software.install(
+                        version=target, load_config=params["named_config"], sync=True
+                    )
+                else:
+                    device.software.install(version=target, sync=True)
+            result["installed"] = True
+            result["changed"] = True
+    except PanDeviceError as e:
+        result.update(failed=True, msg=e.message)
+
+    return result
+
+
+def restart_device(device, result, target, timeout, check_mode):
+    """Restarts a firewall and waits for it to be ready."""
+    result["restarted"] = True
+    result["changed"] = True
+    if check_mode:
+        return result
+
+    expected = target if result["installed"] else PanOSVersion(result["version"])
+    try:
+        started = time.time()
+        device.restart()
+        if not wait_ready(device, expected, timeout, started):
+            raise PanDeviceError(
+                "Firewall is running {0} after restart, not {1}".format(
+                    device.version, expected
+                )
+            )
+    except PanDeviceError as e:
+        result.update(failed=True, msg=e.message)
+    else:
+        result["version"] = device.version
+
+    return result
+
+
+def upgrade_fleet(module, panorama, target):
+    """Brings the firewalls in the devices param to the target version."""
+    params = module.params
+    serials = params["devices"]
+
+    inventory = fleet_inventory(panorama)
+    missing = [x for x in serials if x not in inventory]
+    if missing:
+        module.fail_json(
+            msg="Not connected to Panorama: {0}".format(", ".join(missing))
+        )
+
+    devices = {}
+    for serial in serials:
+        fw = Firewall(serial=serial)
+        fw.timeout = params["timeout"]
+        panorama.add(fw)
+        devices[serial] = fw
+
+    results = {}
+    restarter = ThreadPoolExecutor(max_workers=params["batch_size"])
+    with restarter, ThreadPoolExecutor(max_workers=params["workers"]) as pool:
+        # Only the first firewall of each model family asks the update
+        # server, the others check for themselves only if their own list of
+        # versions is missing the images.
+        if params["perform_software_check"]:
+            families = {}
+            for serial in serials:
+                families.setdefault(inventory[serial]["family"], serial)
+            checks = dict(
+                (serial, pool.submit(devices[serial].software.check))
+                for serial in families.values()
+            )
+            for serial, future in checks.items():
+                try:
+                    future.result()
+                except PanDeviceError as e:
+                    module.fail_json(
+                        msg="Software check failed on {0}: {1}".format(
+                            serial, e.message
+                        )
+                    )
+
+        prepared = dict(
+            (
+                serial,
+                pool.submit(
+                    prepare_device,
+                    devices[serial],
+                    PanOSVersion(inventory[serial]["version"]),
+                    target,
+                    params,
+                    module.check_mode,
+                ),
+            )
+            for serial in serials
+        )
+
+        stopped = False
+        for wave in restart_waves(serials, inventory, params["batch_size"]):
+            restarts = []
+            for serial in wave:
+                results[serial] = prepared[serial].result()
+                if not params["restart"] or results[serial]["failed"] or stopped:
+                    continue
+                elif results[serial]["version"] == str(target):
+                    continue
+                restarts.append(
+                    restarter.submit(
+                        restart_device,
+                        devices[serial],
+                        results[serial],
+                        target,
+                        params["timeout"],
+                        module.check_mode,
+                    )
+                )
+
+            for future in restarts:
+                if future.result()["failed"]:
+                    stopped = True
+
+    return results
+
+
 def main():
     helper = get_connection(
         with_classic_provider_spec=True,
@@ -246,6 +604,9 @@ def main():
             restart=dict(type="bool", default=False),
             timeout=dict(type="int", default=1200),
             perform_software_check=dict(type="bool", default=True),
+            devices=dict(type="list", elements="str"),
+            workers=dict(type="int", default=4),
+            batch_size=dict(type="int", default=1),
         ),
     )
 
@@ -255,11 +616,35 @@ def main():
         supports_check_mode=True,
     )
 
+    if module.params["workers"] < 1:
+        module.fail_json(msg="workers must be at least 1")
+    if module.params["batch_size"] < 1:
+        module.fail_json(msg="batch_size must be at least 1")
+
     # Verify libs are present, get parent object.
     device = helper.get_pandevice_parent(module)
 
     # Module params.
     target = PanOSVersion(module.params["version"])
+
+    if module.params["devices"]:
+        if not hasattr(device, "refresh_devices"):
+            module.fail_json(msg="devices requires a Panorama provider")
+
+        try:
+            results = upgrade_fleet(module, device, target)
+        except PanDeviceError as e:
+            module.fail_json(msg=e.message)
+
+        changed = any(x["changed"] for x in results.values())
+        failed = sorted(k for k, v in results.items() if v["failed"])
+        if failed:
+            module.fail_json(
+                msg="Failed on {0}".format(", ".join(failed)),
+                changed=changed,
+                devices=results,
+            )
+        module.exit_json(changed=changed, version=str(target), devices=results)
     sync_to_peer = module.params["sync_to_peer"]
     named_config = module.params.get("named_config", None)
     download = module.params["download"]
@@ -289,13 +674,7 @@ def main():
             # in case it does not, the module will simply fail
             if named_config:
                 try:
-                    device.op(
-                        "<show><config><saved>"
-                        + named_config
-                        + "</saved></config></show>",
-                        xml=True,
-                        cmd_xml=False,
-                    )
+                    check_named_config(device, named_config)
                 except PanDeviceError as e1:
                     module.fail_json(
                         msg="Error fetching specified named configuration, file {0}".format(
@@ -303,27 +682,14 @@ def main():
                         )
                     )
 
-            # Download new base version if needed.
-            if download and (
-                (current.major != target.major) or (current.minor != target.minor)
-            ):
-
-                base_str = BASE_IMAGE_OVERRIDES.get(
-                    (target.major, target.minor),
-                    "{0}.{1}.0".format(target.major, target.minor),
-                )
-                base = PanOSVersion(base_str)
-
-                if needs_download(device, base) and not module.check_mode:
-                    device.software.download(base, sync_to_peer, sync=True)
-                    changed = True
-
+            # Download new base version if needed, then the target.
             if download:
-                if needs_download(device, target) and not module.check_mode:
-                    device.software.download(
-                        target, sync_to_peer=sync_to_peer, sync=True
-                    )
-                    changed = True
+                for image in images_for(current, target):
+                    if needs_download(device, image) and not module.check_mode:
+                        device.software.download(
+                            image, sync_to_peer=sync_to_peer, sync=True
+                        )
+                        changed = True
 
             if install:
                 if not module.check_mode:
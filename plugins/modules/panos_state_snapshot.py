@@ -55,6 +55,16 @@ options:
         type: list
         elements: raw
         default: ["all"]
+    store_path:
+        description:
+            - Directory of a local snapshot store to save the snapshot to, instead of returning it.
+            - Each state area is saved compressed and named by the hash of its content, so areas that did not change
+              since an earlier snapshot in the same store take no extra space.
+            - Only a small handle, I(snapshot), is returned, which can be passed to M(paloaltonetworks.panos.panos_snapshot_report)
+              in place of the full snapshot.
+            - The directory is on the host the module runs on.
+        type: path
+        version_added: 3.5.0
 """
 
 EXAMPLES = """
@@ -64,6 +74,12 @@ EXAMPLES = """
     state_areas:
       - '!session_stats'
     register: snapshot
+
+- name: Save a snapshot of all areas to a local store
+  panos_state_snapshot:
+    provider: '{{ device }}'
+    store_path: '{{ playbook_dir }}/snapshots'
+  register: pre_upgrade
 """
 
 RETURN = """
@@ -73,7 +89,7 @@ response:
         - Values contain the snapshot data. Type and structure differs per state area. Please refer to
           L(package documentation, https://pan.dev/panos/docs/panos-upgrade-assurance/configuration-details/#state-snapshots) for details.
     type: dict
-    returned: always
+    returned: when I(store_path) is not set
     sample:
         arp_table: {}
         content_version:
@@ -113,10 +129,23 @@ response:
             kbps: "0"
             max-pending-mcast: "0"
             num-active: "0"
+snapshot:
+    description:
+        - The handle of the snapshot saved to I(store_path).
+        - I(areas) maps each state area to the hash of its content in the store.
+    type: dict
+    returned: when I(store_path) is set
+    version_added: 3.5.0
+    sample:
+        store: /home/user/playbooks/snapshots
+        areas:
+            arp_table: 44136fa355b3678a1146ad16f7e8649e94fb4fc21fe77e8310c060f61caaff8a
+            content_version: 9a3d27f5c40e2d9a6b0ed1b8f7b86d3e6e4b39e0cbd7d1e1f2b3e4a3a2c4d5e6
 """
 
 from ansible.module_utils.basic import AnsibleModule
 from ansible_collections.paloaltonetworks.panos.plugins.module_utils.panos import (
+    SnapshotStore,
     get_connection,
 )
 
@@ -137,7 +166,8 @@ def main():
         with_classic_provider_spec=True,
         min_panos_upgrade_assurance_version=MIN_PUA_VER,
         argument_spec=dict(
-            state_areas=dict(type="list", default=["all"], elements="raw")
+            state_areas=dict(type="list", default=["all"], elements="raw"),
+            store_path=dict(type="path"),
         ),
         panorama_error="This is a firewall only module",
     )
@@ -150,6 +180,13 @@ def main():
     checks = CheckFirewall(firewall)
     results = checks.run_snapshots(module.params["state_areas"])
 
+    if module.params["store_path"]:
+        try:
+            handle = SnapshotStore(module.params["store_path"]).save(results)
+        except (IOError, OSError) as e:
+            module.fail_json(msg="Failed to save snapshot: {0}".format(e))
+        module.exit_json(changed=False, snapshot=handle)
+
     module.exit_json(changed=False, response=results)
 
 
@@ -40,6 +40,7 @@ extends_documentation_fragment:
     - paloaltonetworks.panos.fragments.network_resource_module_state
     - paloaltonetworks.panos.fragments.deprecated_commit
     - paloaltonetworks.panos.fragments.gathered_filter
+    - paloaltonetworks.panos.fragments.bulk_config
 options:
     name:
         description:
@@ -55,6 +56,7 @@ options:
             - Color for the tag.
             - Mutually exclusive with I(color_value).
             - NOTE that this param is not available for I(gathered_filter) as it is a meta-param.
+            - NOTE that this param is not available for I(config) items, use I(color_value) there.
         type: str
         choices:
             - red
@@ -231,6 +233,7 @@ def main():
         device_group=True,
         with_network_resource_module_state=True,
         with_gathered_filter=True,
+        with_bulk_config=True,
         with_classic_provider_spec=True,
         with_commit=True,
         sdk_cls=("objects", "Tag"),
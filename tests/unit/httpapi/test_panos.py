@@ -12,6 +12,7 @@ from ansible.module_utils.six.moves import urllib
 from ansible_collections.mrichardson03.panos.plugins.httpapi.panos import (
     HttpApi,
     PanOSAPIError,
+    _xpaths_overlap,
 )
 
 GOOD_KEYGEN = """
@@ -38,7 +39,12 @@ class FakeHttpApiPlugin(HttpApi):
     def __init__(self, connection):
         super().__init__(connection)
 
-        self.hostvars = {"api_key": None}
+        self.hostvars = {
+            "api_key": None,
+            "config_cache": False,
+            "config_cache_ttl": 300,
+            "defer_writes": False,
+        }
 
     def get_option(self, var):
         return self.hostvars[var]
@@ -385,6 +391,225 @@ class TestPanosHttpApi:
 
         assert "too large" in str(e.value)
 
+    @pytest.mark.parametrize(
+        "content_type,disposition,body,encoding,expected",
+        [
+            (
+                "application/xml; charset=UTF-8",
+                None,
+                "<response status='success'/>",
+                "text",
+                "<response status='success'/>",
+            ),
+            (
+                "application/octet-stream",
+                "attachment; filename=running-config.xml",
+                "\x00binary",
+                "base64",
+                "AGJpbmFyeQ==",
+            ),
+        ],
+    )
+    def test_xapi_request(self, content_type, disposition, body, encoding, expected):
+        response_mock, response_data = self._send_response(200, body)
+        response_mock.headers = {
+            "Content-Type": content_type,
+            "Content-Disposition": disposition,
+        }
+        self.connection_mock.send.return_value = (response_mock, response_data)
+
+        ans = self.plugin.xapi_request("type=op")
+
+        assert ans["code"] == 200
+        assert ans["content_type"] == content_type
+        assert ans["content_disposition"] == disposition
+        assert ans["encoding"] == encoding
+        assert ans["body"] == expected
+
+    def test_xapi_request_config_cache(self):
+        self.plugin.set_option("config_cache", True)
+        response_mock, _ = self._send_response(200, "")
+        response_mock.headers = {"Content-Type": "application/xml"}
+        self.connection_mock.send.side_effect = lambda *args, **kwargs: (
+            response_mock,
+            BytesIO(b'<response status="success"><result/></response>'),
+        )
+        xpath = "/config/devices/entry/vsys/entry[@name='vsys1']/address"
+        get = urllib.parse.urlencode(
+            {"type": "config", "action": "get", "xpath": xpath + "/entry[@name='a']"}
+        )
+
+        self.plugin.xapi_request(get)
+        self.plugin.xapi_request(get)
+        assert self.connection_mock.send.call_count == 1
+
+        # A write elsewhere keeps the cached entry.
+        self.plugin.xapi_request(
+            urllib.parse.urlencode(
+                {
+                    "type": "config",
+                    "action": "set",
+                    "xpath": xpath + "/entry[@name='b']",
+                }
+            )
+        )
+        self.plugin.xapi_request(get)
+        assert self.connection_mock.send.call_count == 2
+
+        # A write to the same object evicts it.
+        self.plugin.xapi_request(
+            urllib.parse.urlencode(
+                {
+                    "type": "config",
+                    "action": "edit",
+                    "xpath": xpath + "/entry[@name='a']",
+                }
+            )
+        )
+        self.plugin.xapi_request(get)
+        assert self.connection_mock.send.call_count == 4
+
+        # Non-show op commands clear the cache.
+        self.plugin.xapi_request(
+            urllib.parse.urlencode({"type": "op", "cmd": "<load><config/></load>"})
+        )
+        self.plugin.xapi_request(get)
+        assert self.connection_mock.send.call_count == 6
+
+    def test_xapi_request_defer_writes(self):
+        self.plugin.set_option("defer_writes", True)
+        self.plugin._api_key = "foo"
+        self.plugin._device_info = {"sw-version": "10.1.3-h2"}
+        response_mock, _ = self._send_response(200, "")
+        response_mock.headers = {"Content-Type": "application/xml"}
+        self.connection_mock.send.side_effect = lambda *args, **kwargs: (
+            response_mock,
+            BytesIO(b'<response status="success"><result/></response>'),
+        )
+        xpath = "/config/devices/entry/vsys/entry[@name='vsys1']/address"
+
+        for name in ("a", "b"):
+            ans = self.plugin.xapi_request(
+                urllib.parse.urlencode(
+                    {
+                        "type": "config",
+                        "action": "set",
+                        "xpath": xpath,
+                        "element": "<entry name='{0}'/>".format(name),
+                    }
+                )
+            )
+            assert 'status="success"' in ans["body"]
+        assert ans["deferred"] == 2
+        self.plugin.xapi_request(
+            urllib.parse.urlencode(
+                {
+                    "type": "config",
+                    "action": "delete",
+                    "xpath": xpath + "/entry[@name='c']",
+                }
+            )
+        )
+        assert self.plugin.pending_changes() == 3
+
+        # Reads elsewhere and show commands leave the changes queued.
+        self.plugin.xapi_request(
+            urllib.parse.urlencode(
+                {"type": "config", "action": "get", "xpath": "/config/shared/service"}
+            )
+        )
+        self.plugin.xapi_request(
+            urllib.parse.urlencode({"type": "op", "cmd": "<show><jobs/></show>"})
+        )
+        assert self.plugin.pending_changes() == 3
+        assert self.connection_mock.send.call_count == 2
+
+        # A read of a changed xpath sends them first, in one request.
+        self.plugin.xapi_request(
+            urllib.parse.urlencode(
+                {
+                    "type": "config",
+                    "action": "get",
+                    "xpath": xpath + "/entry[@name='a']",
+                }
+            )
+        )
+        assert self.plugin.pending_changes() == 0
+        assert self.connection_mock.send.call_count == 4
+
+        query = urllib.parse.parse_qs(self.connection_mock.send.call_args_list[2][0][1])
+        assert query["action"] == ["multi-config"]
+        assert query["element"] == [
+            "<multi-config>"
+            '<set id="1" xpath="{0}"><entry name=\'a\'/></set>'
+            '<set id="2" xpath="{0}"><entry name=\'b\'/></set>'
+            '<delete id="3" xpath="{0}/entry[@name=\'c\']"/>'
+            "</multi-config>".format(xpath)
+        ]
+
+    def test_flush_changes_error(self):
+        self.plugin._api_key = "foo"
+        self.plugin._changes = [("delete", "/config/shared/address", "")]
+        response_mock, response_data = self._send_response(
+            200,
+            '<response status="error" code="7"><msg><line>x</line></msg></response>',
+        )
+        self.connection_mock.send.return_value = (response_mock, response_data)
+
+        with pytest.raises(ConnectionError, match="Failed to apply 1 deferred"):
+            self.plugin.flush_changes()
+        assert self.plugin.pending_changes() == 0
+
+    def test_xapi_request_defer_writes_old_version(self):
+        self.plugin.set_option("defer_writes", True)
+        self.plugin._api_key = "foo"
+        self.plugin._device_info = {"sw-version": "9.1.14"}
+        data = urllib.parse.urlencode(
+            {"type": "config", "action": "delete", "xpath": "/config/shared/address"}
+        )
+
+        with pytest.raises(ConnectionError, match="requires PAN-OS 10.0"):
+            self.plugin.xapi_request(data)
+        assert self.plugin.pending_changes() == 0
+
+    def test_logout_discards_changes(self):
+        self.plugin._changes = [("delete", "/config/shared/address", "")]
+
+        with patch(HttpApi.__module__ + ".display") as mock_display:
+            self.plugin.logout()
+
+        assert self.plugin.pending_changes() == 0
+        assert self.connection_mock.send.call_count == 0
+        assert "Discarded 1 deferred" in mock_display.warning.call_args[0][0]
+
+    @pytest.mark.parametrize(
+        "first,second,expected",
+        [
+            ("/config/shared/address", "/config/shared/address/entry[@name='a']", True),
+            ("/config/shared/address/entry[@name='a']", "/config/shared/address", True),
+            (
+                "/config/shared/address/entry[@name='a']",
+                "/config/shared/address/entry[@name='b']",
+                False,
+            ),
+            (
+                "/config/shared/address/entry[@name='a']",
+                "/config/shared/address/entry[@name='a' or @name='b']",
+                True,
+            ),
+            ("/config/shared/address", "/config/shared/service", False),
+            (
+                "/config/devices/entry/network/interface/entry[@name='ethernet1/1']",
+                "/config/devices/entry/network/interface/entry[@name='ethernet1/2']",
+                False,
+            ),
+            ("/config/devices/entry/template/entry/@name", "/config/devices", True),
+            ("/config//address", "/config/shared/address", True),
+        ],
+    )
+    def test_xpaths_overlap(self, first, second, expected):
+        assert _xpaths_overlap(first, second) is expected
+
     @staticmethod
     def _send_response(status_code, response):
         response_mock = mock.Mock()
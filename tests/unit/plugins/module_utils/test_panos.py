@@ -17,18 +17,45 @@ from __future__ import absolute_import, division, print_function
 
 __metaclass__ = type
 
+import socket
+import xml.etree.ElementTree as ET
 from unittest.mock import MagicMock, PropertyMock, patch
 
 import pytest
 from ansible.module_utils.basic import AnsibleModule
 from ansible_collections.paloaltonetworks.panos.plugins.module_utils.panos import (
+    ConnectionHelper,
+    GatheredFilter,
+    HttpApiXapi,
+    JobPoller,
+    JobTimeoutError,
+    PolicyMatcher,
+    PolicyMatchUnknown,
+    ShellExpect,
+    ShellTimeoutError,
+    SnapshotStore,
+    check_autocommit,
+    clone_device,
     get_connection,
+    plan_moves,
+    poll_intervals,
+    push_devices,
+    show_jobs,
+    wait_for_push,
+    xapi_stream,
 )
 
 from panos.errors import PanDeviceError
+from panos.objects import AddressObject
 from panos.firewall import Firewall
 from panos.panorama import DeviceGroup, Panorama, Template, TemplateStack
-from panos.policies import PostRulebase, PreRulebase, Rulebase
+from panos.policies import (
+    NatRule,
+    PostRulebase,
+    PreRulebase,
+    Rulebase,
+    SecurityRule,
+)
 
 
 # Run all tests with mocked firewall unless specified.
@@ -168,6 +195,164 @@ def test_no_provider(module_mock):
     assert e.match("Provider params are required")
 
 
+# Without provider params, the httpapi persistent connection is used instead of
+# connecting to the device with pan-os-python.
+@pytest.mark.parametrize(
+    "model,device_cls", [("PA-VM", Firewall), ("Panorama", Panorama)]
+)
+def test_httpapi_connection(mocker, module_mock, model, device_cls):
+    create_from_device_mock = mocker.patch("panos.base.PanDevice.create_from_device")
+    conn = MagicMock()
+    conn.version.return_value = {
+        "sw-version": "10.1.3",
+        "multi-vsys": "off",
+        "model": model,
+        "serial": "007000001222",
+    }
+    conn.api_key.return_value = "API_KEY"
+    conn.get_option.side_effect = {"host": "192.168.1.1", "port": 8443}.get
+    conn.xapi_request.return_value = {
+        "code": 200,
+        "content_type": "application/xml; charset=UTF-8",
+        "content_disposition": None,
+        "encoding": "text",
+        "body": "<response status='success'><result>done</result></response>",
+    }
+    mocker.patch(
+        "ansible_collections.paloaltonetworks.panos.plugins.module_utils.panos.Connection",
+        return_value=conn,
+    )
+    module_mock.params.update({"provider": None})
+    module_mock._socket_path = "/tmp/socket"
+
+    helper = get_connection(argument_spec=dict())
+    parent = helper.get_pandevice_parent(module_mock)
+
+    assert isinstance(parent, device_cls)
+    assert parent._version_info == (10, 1, 3)
+    assert parent.xapi.hostname == "192.168.1.1"
+    assert parent.xapi.port == 8443
+    assert create_from_device_mock.call_count == 0
+
+    ans = parent.op("show system info")
+
+    assert ans.findtext("./result") == "done"
+    assert conn.xapi_request.call_count == 1
+    assert "type=op" in conn.xapi_request.call_args[0][0]
+
+
+# A provider serial number without ip_address targets the firewall through the
+# Panorama httpapi connection.
+def test_httpapi_connection_serial(mocker, module_mock):
+    conn = MagicMock()
+    conn.version.return_value = {
+        "sw-version": "10.1.3",
+        "multi-vsys": "off",
+        "model": "Panorama",
+        "serial": "007000001222",
+    }
+    conn.api_key.return_value = "API_KEY"
+    conn.get_option.side_effect = {"host": "192.168.1.1", "port": 8443}.get
+    conn.xapi_request.return_value = {
+        "code": 200,
+        "content_type": "application/xml; charset=UTF-8",
+        "content_disposition": None,
+        "encoding": "text",
+        "body": "<response status='success'><result>done</result></response>",
+    }
+    mocker.patch(
+        "ansible_collections.paloaltonetworks.panos.plugins.module_utils.panos.Connection",
+        return_value=conn,
+    )
+    module_mock.params["provider"].update(
+        {"ip_address": None, "serial_number": "007000009999"}
+    )
+    module_mock._socket_path = "/tmp/socket"
+
+    helper = get_connection(argument_spec=dict())
+    parent = helper.get_pandevice_parent(module_mock)
+
+    assert isinstance(parent, Firewall)
+    assert parent.serial == "007000009999"
+    assert isinstance(parent.parent, Panorama)
+
+    parent.op("show system info")
+
+    assert conn.xapi_request.call_count == 1
+    assert "target=007000009999" in conn.xapi_request.call_args[0][0]
+
+
+# Config writes queued by the connection's defer_writes warn the task once.
+def test_httpapi_deferred_write_warns(mocker):
+    mu = "ansible_collections.paloaltonetworks.panos.plugins.module_utils.panos"
+    mocker.patch(mu + "._DEFERRED_WARNING_SENT", [])
+    warn_mock = mocker.patch(mu + ".warn")
+    conn = MagicMock()
+    conn.xapi_request.side_effect = [
+        {
+            "code": 200,
+            "content_type": "application/xml; charset=UTF-8",
+            "content_disposition": None,
+            "encoding": "text",
+            "body": '<response status="success" code="20"></response>',
+            "deferred": num,
+        }
+        for num in (1, 2)
+    ]
+    fw = Firewall("192.168.1.1", api_key="API_KEY")
+    fw._xapi_private = HttpApiXapi(
+        api_key="API_KEY", hostname="192.168.1.1", pan_device=fw, connection=conn
+    )
+
+    fw.xapi.set("/config/shared/address", "<entry name='a'/>")
+    fw.xapi.delete("/config/shared/address/entry[@name='b']")
+
+    assert warn_mock.call_count == 1
+    assert "1 pending" in warn_mock.call_args[0][0]
+
+
+# xapi_stream() returns the response unread, adding the key and target.
+def test_xapi_stream(mocker):
+    conn = MagicMock()
+    conn.xapi_request.return_value = {
+        "code": 200,
+        "content_type": "application/octet-stream",
+        "content_disposition": "attachment; filename=ts.tgz",
+        "encoding": "base64",
+        "body": "AAEC",
+    }
+    fw = Firewall("192.168.1.1", api_key="API_KEY", serial="007000001222")
+    fw._xapi_private = HttpApiXapi(
+        api_key="API_KEY",
+        hostname="192.168.1.1",
+        serial="007000001222",
+        pan_device=fw,
+        connection=conn,
+    )
+
+    response = xapi_stream(fw.xapi, {"type": "export", "category": "tech-support"})
+
+    assert response.read(2) == b"\x00\x01"
+    assert response.read() == b"\x02"
+    query = conn.xapi_request.call_args[0][0]
+    assert "key=API_KEY" in query
+    assert "target=007000001222" in query
+    assert "category=tech-support" in query
+
+
+# xapi_stream() raises the transport error.
+def test_xapi_stream_error(mocker):
+    conn = MagicMock()
+    conn.xapi_request.return_value = {"code": 500}
+    fw = Firewall("192.168.1.1", api_key="API_KEY")
+    fw._xapi_private = HttpApiXapi(
+        api_key="API_KEY", hostname="192.168.1.1", pan_device=fw, connection=conn
+    )
+
+    with pytest.raises(PanDeviceError, match="code: 500"):
+        xapi_stream(fw.xapi, {"type": "op", "cmd": "<show/>"})
+
+
 # Error if bad values for timeout are given.
 @pytest.mark.parametrize(
     "timeout,msg", [("blah", "must be an int"), (-1, "greater than or equal to 0")]
@@ -188,11 +373,52 @@ def test_bad_timeout(module_mock, timeout, msg):
 )
 def test_connection_timeout(create_from_device_mock, module_mock, timeout, msg):
     helper = get_connection(argument_spec=dict())
+    module_mock.fail_json = MagicMock(side_effect=fail_json_exception)
 
     with pytest.raises(AnsibleFailJson) as e:
         parent = helper.get_pandevice_parent(module_mock, timeout=timeout)
 
     assert e.match(msg)
+    kwargs = module_mock.fail_json.call_args[1]
+    assert kwargs["connection_attempts"] == helper.connection_attempts
+    assert "connection_elapsed" in kwargs
+
+
+# Retries back off exponentially, probing the API port first, and the attempts
+# are recorded on the helper.
+def test_connection_retry_backoff(mocker, module_mock, firewall_mock):
+    mocker.patch(
+        "panos.base.PanDevice.create_from_device",
+        side_effect=[PanDeviceError(), PanDeviceError(), firewall_mock],
+    )
+    probe_mock = mocker.patch("socket.create_connection")
+    sleep_mock = mocker.patch("time.sleep")
+    helper = get_connection(argument_spec=dict())
+
+    parent = helper.get_pandevice_parent(module_mock, timeout=60)
+
+    assert parent == firewall_mock
+    assert helper.connection_attempts == 3
+    assert probe_mock.call_count == 2
+    assert probe_mock.call_args[0][0] == ("192.168.1.1", 443)
+    delays = [x[0][0] for x in sleep_mock.call_args_list]
+    assert 0.5 <= delays[0] <= 1
+    assert 1 <= delays[1] <= 2
+
+
+# Error once the max number of connection attempts is reached.
+@patch("panos.base.PanDevice.create_from_device", side_effect=PanDeviceError())
+def test_connection_max_attempts(create_from_device_mock, mocker, module_mock):
+    mocker.patch("socket.create_connection", side_effect=socket.timeout("timed out"))
+    mocker.patch("time.sleep")
+    helper = get_connection(argument_spec=dict())
+
+    with pytest.raises(AnsibleFailJson) as e:
+        parent = helper.get_pandevice_parent(module_mock, timeout=60, max_attempts=3)
+
+    assert e.match("after 3 attempts: timed out")
+    assert create_from_device_mock.call_count == 1
+    assert helper.connection_attempts == 3
 
 
 # Error if the version of PAN-OS is too low to run the module against.
@@ -442,3 +668,987 @@ def test_firewall_error(module_mock):
         parent = helper.get_pandevice_parent(module_mock)
 
     assert e.match("FIREWALL ERROR")
+
+
+# apply_bulk_state()
+
+
+@pytest.fixture
+def bulk_helper():
+    return get_connection(
+        vsys=True,
+        with_bulk_config=True,
+        with_network_resource_module_state=True,
+        sdk_cls=("objects", "AddressObject"),
+        sdk_params=dict(
+            name=dict(required=True),
+            value=dict(),
+            address_type=dict(
+                default="ip-netmask",
+                choices=["ip-netmask", "ip-range", "fqdn"],
+                sdk_param="type",
+            ),
+            tag=dict(type="list", elements="str"),
+        ),
+    )
+
+
+@pytest.fixture
+def bulk_listing(mocker):
+    return mocker.patch(
+        "panos.objects.AddressObject.refreshall",
+        return_value=[
+            AddressObject("same", "1.1.1.1"),
+            AddressObject("changed", "2.2.2.2", tag=["a"]),
+        ],
+    )
+
+
+# The "config" param replaces the required object params.
+def test_bulk_config_spec(bulk_helper):
+    assert bulk_helper.argument_spec["config"]["type"] == "list"
+    assert bulk_helper.argument_spec["name"]["required"] is False
+    assert ["config", "name"] in bulk_helper.required_one_of
+    assert bulk_helper.bulk_config_spec["name"]["required"] is True
+
+
+# New objects are sent in one set, changed objects are replaced, and the
+# listing is only retrieved once.
+def test_bulk_present(module_mock, firewall_mock, bulk_helper, bulk_listing):
+    module_mock.check_mode = False
+    module_mock.params.update(
+        {
+            "vsys": "vsys1",
+            "state": "present",
+            "config": [
+                {"name": "same", "value": "1.1.1.1"},
+                {"name": "changed", "value": "3.3.3.3"},
+                {"name": "new1", "value": "4.4.4.4"},
+                {"name": "new2", "value": "foo.example.com", "address_type": "fqdn"},
+            ],
+        }
+    )
+    firewall_mock._xapi_private = MagicMock()
+    parent = bulk_helper.get_pandevice_parent(module_mock)
+    result = {}
+
+    bulk_helper.apply_bulk_state(parent, module_mock, result)
+
+    assert bulk_listing.call_count == 1
+    assert result["changed"]
+    assert result["created"] == ["new1", "new2"]
+    assert result["updated"] == ["changed"]
+    assert result["deleted"] == []
+    assert firewall_mock.xapi.set.call_count == 1
+    element = firewall_mock.xapi.set.call_args[0][1]
+    assert b'<entry name="new1">' in element
+    assert b'<entry name="new2">' in element
+    assert firewall_mock.xapi.edit.call_count == 1
+
+
+# Merged items only add to the existing config, in the same set as new items.
+def test_bulk_merged(module_mock, firewall_mock, bulk_helper, bulk_listing):
+    module_mock.check_mode = False
+    module_mock.params.update(
+        {
+            "vsys": "vsys1",
+            "state": "merged",
+            "config": [
+                {"name": "changed", "tag": ["b"]},
+                {"name": "new1", "value": "4.4.4.4"},
+            ],
+        }
+    )
+    firewall_mock._xapi_private = MagicMock()
+    parent = bulk_helper.get_pandevice_parent(module_mock)
+    result = {}
+
+    bulk_helper.apply_bulk_state(parent, module_mock, result)
+
+    assert result["updated"] == ["changed"]
+    assert result["after"][0]["tag"] == ["a", "b"]
+    assert result["after"][0]["value"] == "2.2.2.2"
+    assert firewall_mock.xapi.set.call_count == 1
+    assert firewall_mock.xapi.edit.call_count == 0
+
+
+# Merging copies the existing object without its parent tree and device.
+def test_bulk_merged_copies_object_only(
+    mocker, module_mock, firewall_mock, bulk_helper
+):
+    def refreshall(parent, add=True):
+        item = AddressObject("changed", "2.2.2.2", tag=["a"])
+        item.parent = parent
+        return [item]
+
+    listing = mocker.patch(
+        "panos.objects.AddressObject.refreshall", side_effect=refreshall
+    )
+    module_mock.check_mode = False
+    module_mock.params.update(
+        {
+            "vsys": "vsys1",
+            "state": "merged",
+            "config": [{"name": "changed", "tag": ["b"]}],
+        }
+    )
+    firewall_mock._xapi_private = MagicMock()
+    firewall_mock.__deepcopy__ = MagicMock(side_effect=TypeError("SSLContext"))
+    parent = bulk_helper.get_pandevice_parent(module_mock)
+    result = {}
+
+    bulk_helper.apply_bulk_state(parent, module_mock, result)
+
+    assert listing.call_count == 1
+    assert result["updated"] == ["changed"]
+    assert firewall_mock.__deepcopy__.call_count == 0
+    assert firewall_mock.xapi.set.call_count == 1
+    assert "vsys1" in firewall_mock.xapi.set.call_args[0][0]
+
+
+# Only objects that exist are deleted, and check mode changes nothing.
+@pytest.mark.parametrize("check_mode", [True, False])
+def test_bulk_absent(module_mock, firewall_mock, bulk_helper, bulk_listing, check_mode):
+    module_mock.check_mode = check_mode
+    module_mock.params.update(
+        {
+            "vsys": "vsys1",
+            "state": "absent",
+            "config": [{"name": "same"}, {"name": "missing"}],
+        }
+    )
+    firewall_mock._xapi_private = MagicMock()
+    parent = bulk_helper.get_pandevice_parent(module_mock)
+    result = {}
+
+    bulk_helper.apply_bulk_state(parent, module_mock, result)
+
+    assert result["deleted"] == ["same"]
+    assert firewall_mock.xapi.delete.call_count == (0 if check_mode else 1)
+
+
+# The per object hooks run for each item, seeing the item's params and the
+# before / after of the item only.
+def test_bulk_item_hooks(module_mock, firewall_mock, bulk_listing):
+    class Helper(ConnectionHelper):
+        def spec_handling(self, spec, module):
+            if module.params["state"] == "present" and module.params["tag"] is None:
+                spec["tag"] = [module.params["name"]]
+
+        def post_state_handling(self, obj, result, module):
+            if result["after"] is not None:
+                result["after"]["seen"] = module.params["name"]
+
+    helper = get_connection(
+        helper_cls=Helper,
+        vsys=True,
+        with_bulk_config=True,
+        with_network_resource_module_state=True,
+        sdk_cls=("objects", "AddressObject"),
+        sdk_params=dict(
+            name=dict(required=True),
+            value=dict(),
+            tag=dict(type="list", elements="str"),
+        ),
+    )
+    module_mock.check_mode = True
+    module_mock.params.update(
+        {
+            "vsys": "vsys1",
+            "state": "present",
+            "name": "ignored",
+            "tag": ["ignored"],
+            "config": [
+                {"name": "changed", "value": "2.2.2.2", "tag": ["a"]},
+                {"name": "new", "value": "4.4.4.4"},
+            ],
+        }
+    )
+    parent = helper.get_pandevice_parent(module_mock)
+    result = {}
+
+    helper.apply_bulk_state(parent, module_mock, result)
+
+    assert result["created"] == ["new"]
+    assert result["updated"] == []
+    assert len(result["after"]) == 1
+    assert result["after"][0]["tag"] == ["new"]
+    assert result["after"][0]["seen"] == "new"
+
+
+# Error if a config item is invalid.
+def test_bulk_invalid_item(module_mock, bulk_helper, bulk_listing):
+    module_mock.params.update(
+        {"vsys": "vsys1", "state": "present", "config": [{"value": "1.1.1.1"}]}
+    )
+    parent = bulk_helper.get_pandevice_parent(module_mock)
+
+    with pytest.raises(AnsibleFailJson) as e:
+        bulk_helper.apply_bulk_state(parent, module_mock, {})
+
+    assert e.match(r"config\[0\]: missing required arguments: name")
+
+
+@pytest.fixture
+def rulebase_helper():
+    return get_connection(
+        rulebase=True,
+        with_bulk_config=True,
+        with_movement=True,
+        with_uuid=True,
+        with_network_resource_module_state=True,
+        sdk_cls=("policies", "SecurityRule"),
+        sdk_params=dict(
+            rule_name=dict(required=True, sdk_param="name"),
+            source_ip=dict(type="list", elements="str", sdk_param="source"),
+            action=dict(),
+        ),
+        preset_values=dict(source_ip=["any"]),
+    )
+
+
+# The rulebase is planned from one listing: unlisted rules are deleted, then
+# the new rule is set, the changed rules edited in one multi-config request,
+# and only the rule out of place is moved.
+@pytest.mark.parametrize("check_mode", [True, False])
+def test_bulk_overridden(mocker, module_mock, rulebase_helper, check_mode):
+    module_mock.check_mode = check_mode
+    module_mock.params.update(
+        {
+            "state": "overridden",
+            "location": None,
+            "existing_rule": None,
+            "config": [
+                {"rule_name": "d", "action": "allow"},
+                {"rule_name": "a", "action": "deny"},
+                {"rule_name": "b", "action": "deny"},
+                {"rule_name": "c", "action": "allow"},
+            ],
+        }
+    )
+    refreshall = mocker.patch(
+        "panos.policies.SecurityRule.refreshall",
+        return_value=[
+            SecurityRule("a", action="allow"),
+            SecurityRule("x", action="allow"),
+            SecurityRule("b", action="allow"),
+            SecurityRule("c", action="allow"),
+        ],
+    )
+    fw = Firewall()
+    fw._version_info = (10, 1, 0)
+    fw._xapi_private = MagicMock()
+    rulebase = Rulebase()
+    fw.add(rulebase)
+    result = {}
+
+    rulebase_helper.apply_bulk_state(rulebase, module_mock, result)
+
+    assert refreshall.call_count == 1
+    assert result["created"] == ["d"]
+    assert result["updated"] == ["a", "b"]
+    assert result["deleted"] == ["x"]
+    assert result["moved"] == ["d"]
+    assert result["moves_saved"] == 3
+    if check_mode:
+        assert not fw.xapi.method_calls
+        return
+    assert [x[0] for x in fw.xapi.method_calls] == ["delete", "set", "edit", "move"]
+    assert fw.xapi.edit.call_args[1]["extra_qs"] == {"action": "multi-config"}
+    ops = ET.fromstring(fw.xapi.edit.call_args[1]["element"])
+    assert [x.find("entry").get("name") for x in ops] == ["a", "b"]
+    assert fw.xapi.move.call_args[0][1:] == ("top", None)
+
+
+# Merges that only add members are set, while merges replacing a preset value
+# such as "any" are edited, so the device ends up with what is reported.
+def test_bulk_merged_replaces_preset(mocker, module_mock, rulebase_helper):
+    module_mock.check_mode = False
+    module_mock.params.update(
+        {
+            "state": "merged",
+            "location": None,
+            "existing_rule": None,
+            "config": [
+                {"rule_name": "a", "source_ip": ["10.0.0.1"]},
+                {"rule_name": "b", "source_ip": ["10.0.0.2"]},
+                {"rule_name": "c", "source_ip": ["10.0.0.3"]},
+            ],
+        }
+    )
+    mocker.patch(
+        "panos.policies.SecurityRule.refreshall",
+        return_value=[
+            SecurityRule("a", source=["any"]),
+            SecurityRule("b", source=["any"]),
+            SecurityRule("c", source=["10.0.0.1"]),
+        ],
+    )
+    fw = Firewall()
+    fw._version_info = (10, 1, 0)
+    fw._xapi_private = MagicMock()
+    rulebase = Rulebase()
+    fw.add(rulebase)
+    result = {}
+
+    rulebase_helper.apply_bulk_state(rulebase, module_mock, result)
+
+    assert result["updated"] == ["a", "b", "c"]
+    assert result["after"][0]["source_ip"] == ["10.0.0.1"]
+    assert fw.xapi.set.call_count == 1
+    element = ET.fromstring(fw.xapi.set.call_args[0][1])
+    assert [x.get("name") for x in element] == ["c"]
+    assert [x.text for x in element.findall("entry/source/member")] == [
+        "10.0.0.1",
+        "10.0.0.3",
+    ]
+    assert fw.xapi.edit.call_count == 1
+    ops = ET.fromstring(fw.xapi.edit.call_args[1]["element"])
+    assert [(x.tag, x.get("xpath").rsplit("/", 2)[-2:]) for x in ops] == [
+        ("edit", ["entry[@name='a']", "source"]),
+        ("edit", ["entry[@name='b']", "source"]),
+    ]
+    assert [[y.text for y in x.findall("source/member")] for x in ops] == [
+        ["10.0.0.1"],
+        ["10.0.0.2"],
+    ]
+
+
+# Without overridden, the config rules are placed as a block at the location
+# and the other rules are left alone.
+def test_bulk_rulebase_location(mocker, module_mock, rulebase_helper):
+    module_mock.check_mode = True
+    module_mock.params.update(
+        {
+            "state": "present",
+            "location": "bottom",
+            "existing_rule": None,
+            "config": [{"rule_name": "b"}, {"rule_name": "new"}],
+        }
+    )
+    mocker.patch(
+        "panos.policies.SecurityRule.refreshall",
+        return_value=[SecurityRule(x) for x in "abc"],
+    )
+    result = {}
+
+    rulebase_helper.apply_bulk_state(Rulebase(), module_mock, result)
+
+    assert result["created"] == ["new"]
+    assert result["deleted"] == []
+    assert result["changed"]
+    assert len(result["moved"]) == 1
+    assert result["moves_saved"] == 1
+
+
+# Rule ordering
+
+
+def _apply_moves(current, moves):
+    ans = list(current)
+    for uid, location, ref in moves:
+        ans.remove(uid)
+        ans.insert(0 if location == "top" else ans.index(ref) + 1, uid)
+    return ans
+
+
+# The fewest moves are planned, and replaying them gives the desired order.
+@pytest.mark.parametrize(
+    "current,desired,num_moves",
+    [
+        ("abcde", "abcde", 0),
+        ("abcde", "eabcd", 1),
+        ("abcde", "bcdea", 1),
+        ("abcde", "edcba", 4),
+        ("abcdef", "acbdfe", 2),
+        ("", "", 0),
+    ],
+)
+def test_plan_moves(current, desired, num_moves):
+    moves = plan_moves(list(current), list(desired))
+
+    assert len(moves) == num_moves
+    assert _apply_moves(current, moves) == list(desired)
+
+
+@pytest.mark.parametrize(
+    "location,existing_rule,order,saved",
+    [
+        (None, None, "abcde", 2),
+        (None, None, "adcbe", 0),
+        ("top", None, "dbace", 0),
+        ("after", "e", "acedb", 0),
+        ("bottom", None, "acedb", 0),
+    ],
+)
+def test_apply_rule_order(mocker, module_mock, location, existing_rule, order, saved):
+    module_mock.check_mode = False
+    rule_order = ["b", "d"] if order == "abcde" else ["d", "b"]
+    rulebase = Rulebase()
+    rules = [SecurityRule(x) for x in "abcde"]
+    rulebase.extend(rules)
+    refreshall = mocker.patch(
+        "panos.policies.SecurityRule.refreshall", return_value=rules
+    )
+    move = mocker.patch("panos.policies.SecurityRule.move", autospec=True)
+    helper = get_connection(with_movement=True, argument_spec=dict())
+    result = {}
+
+    changed = helper.apply_rule_order(
+        SecurityRule, rulebase, rule_order, location, existing_rule, module_mock, result
+    )
+
+    moves = [(x[0][0].uid,) + x[0][1:] for x in move.call_args_list]
+    assert refreshall.call_count == 1
+    assert changed == bool(result["moved"])
+    assert len(result["moved"]) == len(rule_order) - saved
+    assert "".join(_apply_moves("abcde", moves)) == order
+
+
+def test_apply_rule_order_missing(mocker, module_mock):
+    mocker.patch(
+        "panos.policies.SecurityRule.refreshall", return_value=[SecurityRule("a")]
+    )
+    helper = get_connection(with_movement=True, argument_spec=dict())
+
+    with pytest.raises(AnsibleFailJson) as e:
+        helper.apply_rule_order(
+            SecurityRule, Rulebase(), ["a", "x"], None, None, module_mock, {}
+        )
+
+    assert e.match("Rules not present for move: x")
+
+
+# Audit comments are added to the rules changed, and to the rules only moved
+# unless audit_comment_moved is false.
+@pytest.mark.parametrize("comment_moved", [True, False])
+def test_bulk_audit_comment(mocker, module_mock, firewall_mock, comment_moved):
+    helper = get_connection(
+        rulebase=True,
+        with_bulk_config=True,
+        with_movement=True,
+        with_audit_comment=True,
+        with_network_resource_module_state=True,
+        sdk_cls=("policies", "SecurityRule"),
+        sdk_params=dict(
+            rule_name=dict(required=True, sdk_param="name"),
+            action=dict(),
+        ),
+    )
+    module_mock.check_mode = False
+    module_mock.params.update(
+        {
+            "state": "present",
+            "location": None,
+            "existing_rule": None,
+            "audit_comment": "ticket 42",
+            "audit_comment_moved": comment_moved,
+            "config": [
+                {"rule_name": "c", "action": "allow"},
+                {"rule_name": "a", "action": "deny"},
+                {"rule_name": "b", "action": "allow"},
+            ],
+        }
+    )
+    mocker.patch(
+        "panos.policies.SecurityRule.refreshall",
+        return_value=[SecurityRule(x, action="allow") for x in "abc"],
+    )
+    fw = Firewall()
+    fw._version_info = (10, 1, 0)
+    fw._xapi_private = MagicMock()
+    rulebase = Rulebase()
+    fw.add(rulebase)
+    mocker.patch.object(helper, "get_pandevice_parent", return_value=rulebase)
+    update = mocker.patch("panos.policies.RuleAuditComment.update", autospec=True)
+
+    helper.process(module_mock)
+
+    result = module_mock.exit_json.call_args[1]
+    assert result["updated"] == ["a"]
+    assert result["moved"] == ["c"]
+    commented = [x[0][0].obj.uid for x in update.call_args_list]
+    assert commented == (["a", "c"] if comment_moved else ["a"])
+
+
+# gathered_filter
+
+
+# Fields are read by their module name, and the logic keeps python precedence.
+@pytest.mark.parametrize(
+    "logic,expected",
+    [
+        ("*", [True, True]),
+        ("name == same", [True, False]),
+        ("address_type == ip-netmask and tag contains a", [False, True]),
+        ("name == same or name == changed and tag is-none", [True, False]),
+        ("(name == same or name == changed) and tag is-none", [True, False]),
+        ("!(tag is-none)", [False, True]),
+        ("not (value starts-with 1. or tag is-not-none)", [False, False]),
+        ("tag contains-regex '^[a-c]$' && value matches-regex '\\.2$'", [False, True]),
+        ("(value ends-with .1) || false", [True, False]),
+    ],
+)
+def test_gathered_filter(bulk_helper, logic, expected):
+    items = [
+        AddressObject("same", "1.1.1.1"),
+        AddressObject("changed", "2.2.2.2", tag=["a"]),
+    ]
+
+    assert [bulk_helper.matches_gathered_filter(x, logic) for x in items] == expected
+
+
+# Malformed logic is rejected when compiled, unknown fields when matched.
+@pytest.mark.parametrize(
+    "logic,msg",
+    [
+        ("", "no logic given"),
+        ("(name == same", "Parenthesis depth is inequal: 1"),
+        ("name == same)", "Improperly formatted logic string"),
+        ("name ==", "Improperly formatted logic string"),
+        ("name == same name == other", "Improperly formatted logic string"),
+        ("name is-like same", "Unknown operator: is-like"),
+    ],
+)
+def test_gathered_filter_invalid(logic, msg):
+    with pytest.raises(Exception) as e:
+        GatheredFilter(logic)
+
+    assert str(e.value) == msg
+
+
+def test_gathered_filter_no_field(bulk_helper):
+    with pytest.raises(Exception) as e:
+        bulk_helper.matches_gathered_filter(AddressObject("a"), "type == fqdn")
+
+    assert str(e.value) == "No field named type"
+
+
+# JobPoller
+
+
+def _jobs_response(*jobs):
+    return ET.fromstring(
+        "<response status='success'><result>{0}</result></response>".format(
+            "".join(
+                "<job><id>{0}</id><status>{1}</status><progress>{2}</progress></job>".format(
+                    *x
+                )
+                for x in jobs
+            )
+        )
+    )
+
+
+# Poll intervals start small and back off up to the max.
+def test_poll_intervals():
+    intervals = poll_intervals(min_interval=1, max_interval=5, backoff=2)
+
+    assert [next(intervals) for x in range(5)] == [1, 2, 4, 5, 5]
+
+
+# Several jobs are polled with a single "show jobs all", and jobs no longer
+# listed there are looked up by ID.
+def test_job_poller_show_jobs_all(mocker):
+    sleep_mock = mocker.patch("time.sleep")
+    op = MagicMock(
+        side_effect=[
+            _jobs_response((1, "ACT", 50), (2, "FIN", 100)),
+            _jobs_response((3, "FIN", 100)),
+            _jobs_response((1, "FIN", 100)),
+        ]
+    )
+    done = []
+
+    ans = JobPoller(show_jobs(op)).wait([1, 2, 3], lambda x, job: done.append(x))
+
+    assert sorted(ans) == ["1", "2", "3"]
+    assert done == ["2", "3", "1"]
+    assert [x[0][0] for x in op.call_args_list] == [
+        "<show><jobs><all/></jobs></show>",
+        "<show><jobs><id>3</id></jobs></show>",
+        "<show><jobs><id>1</id></jobs></show>",
+    ]
+    assert sleep_mock.call_count == 1
+
+
+# The job's progress is used to time the next poll.
+def test_job_poller_progress(mocker):
+    mocker.patch("time.time", side_effect=[0, 0, 10, 10, 20, 20])
+    sleep_mock = mocker.patch("time.sleep")
+    op = MagicMock(
+        side_effect=[
+            _jobs_response((1, "ACT", 10)),
+            _jobs_response((1, "ACT", 20)),
+            _jobs_response((1, "FIN", 100)),
+        ]
+    )
+
+    JobPoller(show_jobs(op), max_interval=120).wait([1])
+
+    assert sleep_mock.call_args_list[0][0][0] == 0.5
+    # 10% per 10 seconds, with 80% left.
+    assert sleep_mock.call_args_list[1][0][0] == 80
+
+
+# Error if the jobs are not finished before the timeout.
+def test_job_poller_timeout(mocker):
+    mocker.patch("time.sleep")
+    op = MagicMock(return_value=_jobs_response((1, "ACT", 0)))
+
+    with pytest.raises(JobTimeoutError) as e:
+        JobPoller(show_jobs(op), timeout=0).wait([1])
+
+    assert e.value.pending == ["1"]
+
+
+def _push_response(status, *devices):
+    return ET.fromstring(
+        "<response status='success'><result><job><id>7</id><status>{0}</status>"
+        "<result>PEND</result><devices>{1}</devices></job></result></response>".format(
+            status,
+            "".join(
+                "<entry><serial-no>{0}</serial-no><devicename>fw{0}</devicename>"
+                "<result>{1}</result><details><msg><errors><line>{2}</line>"
+                "</errors></msg></details></entry>".format(*x)
+                for x in devices
+            ),
+        )
+    )
+
+
+# A push is done once the job is finished and no device is pending anymore.
+def test_wait_for_push(mocker):
+    mocker.patch("time.sleep")
+    pano = MagicMock()
+    pano.op.side_effect = [
+        _push_response("ACT", (1, "PEND", ""), (2, "PEND", "")),
+        _push_response("FIN", (1, "OK", ""), (2, "PEND", "")),
+        _push_response("FIN", (1, "OK", ""), (2, "OK", "")),
+    ]
+
+    finished, job = wait_for_push(pano, 7)
+
+    assert finished
+    assert pano.op.call_count == 3
+    assert [x["result"] for x in push_devices(job).values()] == ["OK", "OK"]
+
+
+# With fail_fast, stop waiting at the first device that fails.
+def test_wait_for_push_fail_fast(mocker):
+    mocker.patch("time.sleep")
+    pano = MagicMock()
+    pano.op.side_effect = [
+        _push_response("ACT", (1, "PEND", ""), (2, "PEND", "")),
+        _push_response("ACT", (1, "FAIL", "bad rule"), (2, "PEND", "")),
+    ]
+
+    finished, job = wait_for_push(pano, 7, fail_fast=True)
+    devices = push_devices(job)
+
+    assert finished
+    assert devices["1"]["result"] == "FAIL"
+    assert devices["1"]["messages"] == ["bad rule"]
+    assert devices["2"]["result"] == "PEND"
+
+
+# ShellExpect
+
+
+# Prompts are matched at the end of the output, across reads.
+def test_shell_expect():
+    shell, device = socket.socketpair()
+    expect = ShellExpect(shell, timeout=5)
+
+    device.sendall(b"Welcome\r\nadmin@PA-VM> ")
+    assert expect.expect(ShellExpect.prompt(">")) == "Welcome\r\nadmin@PA-VM> "
+
+    expect.send(b"configure\n")
+    assert device.recv(64) == b"configure\n"
+    device.sendall(b"Entering configuration mode\r\n")
+    device.sendall(b"[edit]\r\nadmin@PA-VM# ")
+    assert expect.expect(r"# $").endswith("[edit]\r\nadmin@PA-VM# ")
+    assert expect.output.startswith("Welcome")
+
+    shell.close()
+    device.close()
+
+
+def test_shell_expect_timeout():
+    shell, device = socket.socketpair()
+    expect = ShellExpect(shell)
+
+    device.sendall(b"Configuration committed successfully\r\n")
+    with pytest.raises(ShellTimeoutError) as e:
+        expect.expect(ShellExpect.prompt("#"), timeout=0.2)
+
+    assert e.value.output == "Configuration committed successfully\r\n"
+
+    device.close()
+    with pytest.raises(EOFError):
+        expect.expect(ShellExpect.prompt("#"), timeout=5)
+    shell.close()
+
+
+# PolicyMatcher
+
+_POLICY_CONFIG = """<config>
+<shared>
+  <address>
+    <entry name="net-10"><ip-netmask>10.0.0.0/8</ip-netmask></entry>
+    <entry name="bad-range"><ip-range>203.0.113.1-203.0.113.20</ip-range></entry>
+    <entry name="example"><fqdn>www.example.com</fqdn></entry>
+  </address>
+  <service>
+    <entry name="tcp-80"><protocol><tcp><port>80</port></tcp></protocol></entry>
+  </service>
+</shared>
+<devices><entry name="localhost.localdomain"><vsys><entry name="vsys1">
+  <address-group>
+    <entry name="private"><static><member>net-10</member>
+      <member>172.16.0.0/12</member></static></entry>
+  </address-group>
+  <service-group>
+    <entry name="web"><members><member>tcp-80</member>
+      <member>service-https</member></members></entry>
+  </service-group>
+  <rulebase>
+    <security><rules>
+      <entry name="off"><from><member>any</member></from><to><member>any</member></to>
+        <source><member>any</member></source><destination><member>any</member></destination>
+        <service><member>any</member></service><application><member>any</member></application>
+        <disabled>yes</disabled></entry>
+      <entry name="web"><from><member>trust</member></from><to><member>untrust</member></to>
+        <source><member>private</member></source><destination><member>any</member></destination>
+        <service><member>web</member></service><application><member>any</member></application></entry>
+      <entry name="dns"><from><member>any</member></from><to><member>any</member></to>
+        <source><member>172.16.0.0/12</member></source><destination><member>any</member></destination>
+        <service><member>application-default</member></service>
+        <application><member>dns</member></application></entry>
+      <entry name="to-example"><from><member>any</member></from><to><member>any</member></to>
+        <source><member>192.168.0.0/16</member></source>
+        <destination><member>example</member></destination>
+        <service><member>any</member></service><application><member>any</member></application></entry>
+    </rules></security>
+    <nat><rules>
+      <entry name="snat"><from><member>trust</member></from><to><member>untrust</member></to>
+        <to-interface>ethernet1/1</to-interface>
+        <source><member>net-10</member></source><destination><member>any</member></destination>
+        <service>tcp-80</service></entry>
+    </rules></nat>
+  </rulebase>
+</entry></vsys></entry></devices>
+<panorama><vsys><entry name="vsys1">
+  <pre-rulebase><security><rules>
+    <entry name="block-bad"><from><member>any</member></from><to><member>any</member></to>
+      <source><member>any</member></source><destination><member>bad-range</member></destination>
+      <service><member>any</member></service><application><member>any</member></application></entry>
+  </rules></security></pre-rulebase>
+  <post-rulebase><security><rules>
+    <entry name="catch-all"><from><member>any</member></from><to><member>any</member></to>
+      <source><member>any</member></source><destination><member>any</member></destination>
+      <service><member>any</member></service><application><member>any</member></application></entry>
+  </rules></security></post-rulebase>
+</entry></vsys></panorama>
+</config>"""
+
+
+def _flow(source_ip, destination_ip, destination_port, protocol=6, **kwargs):
+    ans = dict(
+        source_zone="trust",
+        destination_zone="untrust",
+        source_ip=source_ip,
+        source_port=None,
+        source_user=None,
+        to_interface=None,
+        destination_ip=destination_ip,
+        destination_port=destination_port,
+        application=None,
+        protocol=protocol,
+        category=None,
+    )
+    ans.update(kwargs)
+    return ans
+
+
+@pytest.fixture
+def policy_matcher(firewall_mock):
+    rule = SecurityRule()
+    firewall_mock.add(rule)
+    return PolicyMatcher(ET.fromstring(_POLICY_CONFIG), "vsys1", rule)
+
+
+# Rules are matched in pre, firewall then post rulebase order, with groups,
+# ranges and predefined services resolved locally.
+@pytest.mark.parametrize(
+    "flow,rulebase,rule",
+    [
+        (_flow("10.1.1.1", "8.8.8.8", 443), "firewall-rulebase", "web"),
+        (_flow("172.16.0.1", "8.8.8.8", 80), "firewall-rulebase", "web"),
+        (_flow("10.1.1.1", "203.0.113.5", 80), "panorama-pre-rulebase", "block-bad"),
+        (_flow("10.1.1.1", "8.8.8.8", 8080), "panorama-post-rulebase", "catch-all"),
+        (
+            _flow("10.1.1.1", "8.8.8.8", 80, protocol=17),
+            "panorama-post-rulebase",
+            "catch-all",
+        ),
+        (
+            _flow("10.1.1.1", "8.8.8.8", 443, source_zone="dmz"),
+            "panorama-post-rulebase",
+            "catch-all",
+        ),
+    ],
+)
+def test_policy_matcher(policy_matcher, flow, rulebase, rule):
+    ans = policy_matcher.match(flow)
+
+    assert (ans[0], ans[1].uid) == (rulebase, rule)
+
+
+# Flows that depend on App-ID or unresolved addresses are left to the device.
+@pytest.mark.parametrize(
+    "flow",
+    [
+        _flow("172.16.0.1", "8.8.8.8", 53, protocol=17),
+        _flow("172.16.0.1", "8.8.8.8", 53, protocol=17, application="dns"),
+        _flow("192.168.1.1", "8.8.8.8", 443),
+    ],
+)
+def test_policy_matcher_unknown(policy_matcher, flow):
+    with pytest.raises(PolicyMatchUnknown):
+        policy_matcher.match(flow)
+
+
+def test_policy_matcher_nat(firewall_mock):
+    rule = NatRule()
+    firewall_mock.add(rule)
+    matcher = PolicyMatcher(ET.fromstring(_POLICY_CONFIG), "vsys1", rule)
+
+    rulebase, rule = matcher.match(
+        _flow("10.1.1.1", "8.8.8.8", 80, to_interface="ethernet1/1")
+    )
+    assert (rulebase, rule.uid) == ("firewall-rulebase", "snat")
+    assert matcher.match(_flow("10.1.1.1", "8.8.8.8", 443)) == (None, None)
+    with pytest.raises(PolicyMatchUnknown):
+        matcher.match(_flow("10.1.1.1", "8.8.8.8", 80))
+
+
+def test_snapshot_store(tmp_path):
+    store = SnapshotStore(str(tmp_path))
+    first = store.save({"arp_table": {}, "content_version": {"version": "8635-7675"}})
+    second = store.save({"arp_table": {}, "content_version": {"version": "8647-7730"}})
+
+    assert SnapshotStore.is_handle(first)
+    assert not SnapshotStore.is_handle({"arp_table": {}})
+    assert first["areas"]["arp_table"] == second["areas"]["arp_table"]
+    assert first["areas"]["content_version"] != second["areas"]["content_version"]
+    assert len(list(tmp_path.glob("*/*.json.gz"))) == 3
+
+    store = SnapshotStore.open(second)
+    assert store.get(second["areas"]["content_version"]) == {"version": "8647-7730"}
+
+
+@pytest.mark.parametrize(
+    "jobs,ready",
+    [
+        ("", False),
+        ("<job><type>AutoCom</type><result>OK</result></job>", True),
+        ("<job><type>AutoCom</type><result>PEND</result></job>", False),
+        ("<job><type>Commit</type></job>", False),
+        ("<job><type>Commit</type><result>OK</result></job>", True),
+    ],
+)
+def test_check_autocommit(jobs, ready):
+    elm = ET.fromstring("<result>{0}</result>".format(jobs))
+
+    assert check_autocommit(elm.findall("job")) is ready
+
+
+def test_object_handling_defaults(mocker, module_mock):
+    helper = get_connection(
+        sdk_cls=("objects", "AddressObject"),
+        sdk_params=dict(
+            name=dict(required=True),
+            value=dict(),
+            address_type=dict(sdk_param="type"),
+            description=dict(),
+            tag=dict(type="list", elements="str"),
+        ),
+        default_values=dict(description="default", tag=["default"]),
+    )
+    init = mocker.spy(AddressObject, "__init__")
+
+    objs = [AddressObject("a"), AddressObject("b", tag=["x"])]
+    init.reset_mock()
+    for obj in objs:
+        helper.object_handling(obj, module_mock)
+
+    assert init.call_count == 1
+    assert [x.description for x in objs] == ["default", "default"]
+    assert [x.tag for x in objs] == [["default"], ["x"]]
+    assert objs[0].tag is not helper._get_default_value(objs[0], "tag")
+    assert helper.describe(objs[0])["address_type"] == "ip-netmask"
+
+
+def test_update_params():
+    helper = get_connection(
+        sdk_cls=("objects", "AddressObject"),
+        sdk_params=dict(name=dict(required=True), value=dict(), tag=dict()),
+    )
+    fw = Firewall()
+    fw._version_info = (10, 1, 0)
+    fw._xapi_private = MagicMock()
+    item = AddressObject("a", "1.1.1.1", tag=["x", "y"])
+    fw.add(item)
+
+    helper.update_params(item, {"value", "tag", "description"})
+
+    assert fw.xapi.edit.call_count == 1
+    kwargs = fw.xapi.edit.call_args[1]
+    assert kwargs["extra_qs"] == {"action": "multi-config"}
+    ops = ET.fromstring(kwargs["element"])
+    assert [(x.tag, x.get("id")) for x in ops] == [
+        ("delete", "1"),
+        ("edit", "2"),
+        ("edit", "3"),
+    ]
+    assert ops[0].get("xpath").endswith("entry[@name='a']/description")
+    assert [x.text for x in ops[1].findall("tag/member")] == ["x", "y"]
+    assert ops[2].find("ip-netmask").text == "1.1.1.1"
+
+
+# One param, or a firewall via Panorama of unknown version, falls back to
+# item.update().
+@pytest.mark.parametrize(
+    "params,version",
+    [({"value"}, (10, 1, 0)), ({"value", "tag"}, None)],
+)
+def test_update_params_single(mocker, params, version):
+    helper = get_connection(argument_spec=dict())
+    fw = Firewall()
+    fw._version_info = version
+    fw._xapi_private = MagicMock()
+    item = AddressObject("a", "1.1.1.1")
+    fw.add(item)
+    update = mocker.patch.object(item, "update")
+
+    helper.update_params(item, params)
+
+    assert sorted(x[0][0] for x in update.call_args_list) == sorted(params)
+    assert fw.xapi.edit.call_count == 0
+
+
+# A firewall reached through Panorama keeps proxying through a copy of it.
+def test_clone_device_serial():
+    pano = Panorama("192.168.2.1", api_key="API_KEY")
+    fw = Firewall(serial="007000009999")
+    pano.add(fw)
+
+    ans = clone_device(fw)
+
+    assert ans is not fw
+    assert isinstance(ans.parent, Panorama)
+    assert ans.parent is not pano
+    assert pano.children == [fw]
+    assert ans.xapi.hostname == "192.168.2.1"
+    assert ans.xapi.serial == "007000009999"
@@ -20,6 +20,9 @@ def set_module_args(**args):
 
     args = json.dumps({"ANSIBLE_MODULE_ARGS": args})
     basic._ANSIBLE_ARGS = to_bytes(args)
+    # ansible-core 2.19+ also needs the serialization profile of the args.
+    if hasattr(basic, "_ANSIBLE_PROFILE"):
+        basic._ANSIBLE_PROFILE = "legacy"
 
 
 class AnsibleExitJson(Exception):
@@ -0,0 +1,52 @@
+from __future__ import absolute_import, division, print_function
+
+__metaclass__ = type
+
+from unittest.mock import MagicMock
+
+import pytest
+
+from ansible_collections.paloaltonetworks.panos.plugins.modules import (
+    panos_commit_push,
+)
+from ansible_collections.paloaltonetworks.panos.tests.unit.plugins.modules.common.utils import (
+    ModuleTestCase,
+)
+
+from panos.panorama import Panorama
+
+
+class TestPanosCommitPush(ModuleTestCase):
+    module = panos_commit_push
+
+    # Log collector group pushes return a result instead of a job ID.
+    @pytest.mark.parametrize("success", [True, False])
+    def test_log_collector_group(self, mocker, success):
+        pano = Panorama("192.168.2.1", api_key="API_KEY")
+        pano._version_info = (10, 1, 0)
+        pano.commit = MagicMock(
+            return_value={
+                "success": success,
+                "result": "Ok",
+                "jobid": "0",
+                "messages": ["Generated config and committed to connected collectors"],
+            }
+        )
+        mocker.patch("panos.base.PanDevice.create_from_device", return_value=pano)
+        op = mocker.patch.object(pano, "op")
+
+        args = {
+            "provider": {"ip_address": "192.168.2.1", "api_key": "API_KEY"},
+            "style": "log collector group",
+            "name": "lcg",
+        }
+        if success:
+            result = self._run_module(args)
+        else:
+            result = self._run_module_fail(args)
+
+        assert result["changed"]
+        assert result.get("failed", False) is not success
+        assert result["finished"]
+        assert result["jobid"] == 0
+        assert op.call_count == 0
@@ -0,0 +1,54 @@
+from __future__ import absolute_import, division, print_function
+
+__metaclass__ = type
+
+from unittest.mock import MagicMock
+
+from ansible_collections.paloaltonetworks.panos.plugins.modules import panos_op
+from ansible_collections.paloaltonetworks.panos.tests.unit.plugins.modules.common.utils import (
+    ModuleTestCase,
+)
+
+from panos.firewall import Firewall
+
+XML = b"<response status='success'><result><system><hostname>fw</hostname></system></result></response>"
+
+
+class TestPanosOp(ModuleTestCase):
+    module = panos_op
+
+    def _firewall(self, mocker):
+        fw = Firewall("192.168.1.1", api_key="API_KEY")
+        fw._version_info = (10, 1, 0)
+        fw.op = MagicMock(return_value=XML)
+        mocker.patch("panos.base.PanDevice.create_from_device", return_value=fw)
+        return fw
+
+    def test_dest(self, mocker, tmp_path):
+        self._firewall(mocker)
+        dest = tmp_path / "out.xml"
+
+        result = self._run_module(
+            {
+                "provider": {"ip_address": "192.168.1.1", "api_key": "API_KEY"},
+                "cmd": "show system info",
+                "dest": str(dest),
+            }
+        )
+
+        assert not result["changed"]
+        assert result["stdout_xml"] == ""
+        assert dest.read_bytes() == XML
+
+    def test_bytes_output(self, mocker):
+        self._firewall(mocker)
+
+        result = self._run_module(
+            {
+                "provider": {"ip_address": "192.168.1.1", "api_key": "API_KEY"},
+                "cmd": "show system info",
+            }
+        )
+
+        assert result["stdout_xml"] == XML.decode()
+        assert "fw" in result["stdout"]